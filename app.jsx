@@ -333,6 +333,43 @@ function HomeView({ state, setState }) {
   );
 }
 
+// Fleet heatmap: each /v1/heatmap/{z}/{x}/{y} tile is a size x size grid of
+// little-endian uint32 counts (base64), drawn straight onto a canvas.
+function drawHeatTile(canvas, data) {
+  const bytes = Uint8Array.from(atob(data.counts), (c) => c.charCodeAt(0));
+  const counts = new Uint32Array(bytes.buffer);
+  const ctx = canvas.getContext('2d');
+  const cell = canvas.width / data.size;
+  const logMax = Math.log1p(data.max);
+  for (let i = 0; i < counts.length; i++) {
+    if (!counts[i]) continue;
+    const t = Math.log1p(counts[i]) / logMax;
+    ctx.fillStyle = `rgba(239, ${Math.round(180 * (1 - t))}, 68, ${(0.25 + 0.6 * t).toFixed(2)})`;
+    ctx.fillRect((i % data.size) * cell, Math.floor(i / data.size) * cell, cell, cell);
+  }
+}
+
+function createHeatmapLayer() {
+  const HeatLayer = L.GridLayer.extend({
+    createTile(coords, done) {
+      const tile = document.createElement('canvas');
+      const size = this.getTileSize();
+      tile.width = size.x;
+      tile.height = size.y;
+      fetch(`${API_BASE}/v1/heatmap/${coords.z}/${coords.x}/${coords.y}`)
+        .then((r) => (r.ok ? r.json() : null))
+        .then((data) => {
+          if (data && data.counts) drawHeatTile(tile, data);
+          done(null, tile);
+        })
+        .catch((e) => done(e, tile));
+      return tile;
+    }
+  });
+  // Server aggregates up to z14; Leaflet scales those tiles when zoomed in further
+  return new HeatLayer({ maxNativeZoom: 14, maxZoom: 19 });
+}
+
 function MapView({ state, setState }) {
   const setText = (id, text) => { const el = document.getElementById(id); if (el) el.textContent = text; };
   useEffect(() => {
@@ -346,6 +383,7 @@ function MapView({ state, setState }) {
             maxZoom: 19,
             attribution: '&copy; OpenStreetMap contributors'
           }).addTo(map);
+          L.control.layers(null, { 'Fleet heatmap': createHeatmapLayer() }).addTo(map);
         }
         map.setView(center, 15);
         const latlngs = state.breadcrumbs.filter(p => p.lat && p.lng).map(p => [p.lat, p.lng]);
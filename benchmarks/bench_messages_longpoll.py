@@ -0,0 +1,84 @@
+"""Benchmark: thousands of open message long-polls in a single worker.
+
+Opens ``--polls`` concurrent ``GET /messages?watchToken=...&waitFor=...``
+requests (one per user) against the ASGI app in-process, waits until all are
+parked on the notifier, then posts one message per user and measures how long
+each poll takes to return.
+
+    python benchmarks/bench_messages_longpoll.py --polls 5000
+"""
+import argparse
+import asyncio
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _setup_db() -> str:
+    path = os.path.join(tempfile.mkdtemp(prefix='tg-bench-'), 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite+pysqlite:///{path}'
+    return path
+
+
+async def run(polls: int, wait_for: float) -> None:
+    import httpx
+    from trailguard_api import models
+    from trailguard_api.database import Base, SessionLocal, engine
+    from trailguard_api.main import app
+    from trailguard_api.routers.messages import message_notifier
+
+    Base.metadata.create_all(bind=engine)
+    user_ids = [f'bench-{i}' for i in range(polls)]
+    db = SessionLocal()
+    db.add_all(models.User(id=u) for u in user_ids)
+    db.commit()
+    db.close()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=wait_for + 30) as client:
+        first = await client.get(f'/v1/users/{user_ids[0]}/messages')
+        token = first.json()['watchToken']
+        returned = {}
+
+        async def poll(user_id: str):
+            r = await client.get(f'/v1/users/{user_id}/messages', params={'watchToken': token, 'waitFor': wait_for})
+            returned[user_id] = (time.perf_counter(), len(r.json()['messages']))
+
+        t0 = time.perf_counter()
+        tasks = [asyncio.create_task(poll(u)) for u in user_ids]
+        while message_notifier.waiting() < polls:
+            await asyncio.sleep(0.05)
+        parked = time.perf_counter() - t0
+        rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+        sent = {}
+        for u in user_ids:
+            sent[u] = time.perf_counter()
+            await client.post(f'/v1/users/{u}/messages', json={'message': {'text': 'wake'}})
+        await asyncio.gather(*tasks)
+
+    latencies = sorted((returned[u][0] - sent[u]) * 1000 for u in user_ids)
+    delivered = sum(1 for u in user_ids if returned[u][1] == 1)
+    print(f'open long-polls        : {polls}')
+    print(f'time to park all polls : {parked:.2f}s')
+    print(f'max RSS while parked   : {rss_mb:.1f} MB')
+    print(f'delivered              : {delivered}/{polls}')
+    print(f'wake latency p50/p99   : {statistics.median(latencies):.2f} / {latencies[int(len(latencies) * 0.99) - 1]:.2f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--polls', type=int, default=2000)
+    parser.add_argument('--wait-for', type=float, default=60)
+    args = parser.parse_args()
+    _setup_db()
+    asyncio.run(run(args.polls, args.wait_for))
+
+
+if __name__ == '__main__':
+    main()
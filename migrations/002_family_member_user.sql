@@ -0,0 +1,11 @@
+-- Link family members to the TrailGuard user they represent so the family
+-- dashboard can join their devices and SOS sessions.
+
+BEGIN;
+
+ALTER TABLE family_members
+  ADD COLUMN IF NOT EXISTS member_user_id UUID REFERENCES users(id) ON DELETE SET NULL;
+
+CREATE INDEX IF NOT EXISTS idx_family_members_member_user ON family_members(member_user_id);
+
+COMMIT;
@@ -0,0 +1,14 @@
+-- Version counter for the in-memory active-SOS index. Every SOS activate or
+-- cancel bumps it in the same transaction so each API worker can detect
+-- writes made by other workers and rebuild its index.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS sos_index_version (
+  id INT PRIMARY KEY,
+  version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO sos_index_version (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING;
+
+COMMIT;
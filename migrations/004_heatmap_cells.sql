@@ -0,0 +1,14 @@
+-- Breadcrumb counts per heatmap cell. A cell at zoom z is the slippy-map tile
+-- at that zoom; quadkey is the Morton interleave of its x/y, so the cells of
+-- any coarser tile form one contiguous primary-key range.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS heatmap_cells (
+  zoom SMALLINT NOT NULL,
+  quadkey BIGINT NOT NULL,
+  count BIGINT NOT NULL DEFAULT 0,
+  PRIMARY KEY (zoom, quadkey)
+);
+
+COMMIT;
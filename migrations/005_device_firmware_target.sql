@@ -0,0 +1,11 @@
+-- Firmware rollouts: the version a device has been asked to install, and an
+-- index for listing a user's devices by installed version.
+
+BEGIN;
+
+ALTER TABLE devices
+  ADD COLUMN IF NOT EXISTS firmware_target_version TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_devices_user_firmware ON devices(user_id, firmware_version);
+
+COMMIT;
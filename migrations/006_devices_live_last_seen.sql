@@ -0,0 +1,10 @@
+-- Lets the stale-device sweeper find live devices that stopped sending
+-- heartbeats without scanning OFFLINE ones, which are the vast majority.
+
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS idx_devices_live_last_seen
+  ON devices(last_seen_time)
+  WHERE connection_state IN ('ONLINE', 'DEGRADED');
+
+COMMIT;
@@ -0,0 +1,10 @@
+-- The time by which a user promised to check in again. Only the newest
+-- check-in per user matters; the overdue monitor reads it through
+-- idx_check_ins_user_time.
+
+BEGIN;
+
+ALTER TABLE check_ins
+  ADD COLUMN IF NOT EXISTS next_due_time TIMESTAMPTZ;
+
+COMMIT;
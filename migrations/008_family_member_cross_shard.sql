@@ -0,0 +1,9 @@
+-- A family member can be a user on another shard, where this shard's users
+-- table has no row for them, so member_user_id can't be a foreign key.
+
+BEGIN;
+
+ALTER TABLE family_members
+  DROP CONSTRAINT IF EXISTS family_members_member_user_id_fkey;
+
+COMMIT;
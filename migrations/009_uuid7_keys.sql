@@ -0,0 +1,25 @@
+-- Time-ordered UUIDv7 defaults for the append-heavy tables, so rows inserted
+-- outside the API also land at the right edge of the primary-key index rather
+-- than on a random page. The API generates the same ids itself
+-- (models.uuid7_str). Existing keys are left as they are.
+
+BEGIN;
+
+-- 48-bit Unix milliseconds over gen_random_uuid(), with the version nibble set to 7
+CREATE OR REPLACE FUNCTION trailguard_uuid7() RETURNS UUID AS $$
+  SELECT encode(
+    set_bit(
+      set_bit(
+        overlay(uuid_send(gen_random_uuid())
+                placing substring(int8send(floor(extract(epoch FROM clock_timestamp()) * 1000)::BIGINT) FROM 3)
+                FROM 1 FOR 6),
+        52, 1),
+      53, 1),
+    'hex')::UUID;
+$$ LANGUAGE SQL VOLATILE;
+
+ALTER TABLE breadcrumbs ALTER COLUMN id SET DEFAULT trailguard_uuid7();
+ALTER TABLE check_ins ALTER COLUMN id SET DEFAULT trailguard_uuid7();
+ALTER TABLE messages ALTER COLUMN id SET DEFAULT trailguard_uuid7();
+
+COMMIT;
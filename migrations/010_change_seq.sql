@@ -0,0 +1,35 @@
+-- Per-user change sequence for delta sync (GET /v1/users/{user_id}:sync).
+-- Each synced row carries the sequence of the write that last touched it;
+-- deletions leave tombstones. Existing rows get 0, which only a full sync
+-- (no token) returns.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS user_change_seqs (
+  user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+  seq BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS change_tombstones (
+  id UUID PRIMARY KEY DEFAULT trailguard_uuid7(),
+  user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  seq BIGINT NOT NULL,
+  name TEXT NOT NULL,
+  delete_time TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_change_tombstones_user_seq ON change_tombstones(user_id, seq);
+
+-- A constant default doesn't rewrite the table (PostgreSQL 11+)
+ALTER TABLE devices ADD COLUMN IF NOT EXISTS change_seq BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE check_ins ADD COLUMN IF NOT EXISTS change_seq BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE family_members ADD COLUMN IF NOT EXISTS change_seq BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE user_settings ADD COLUMN IF NOT EXISTS change_seq BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE breadcrumbs ADD COLUMN IF NOT EXISTS change_seq BIGINT NOT NULL DEFAULT 0;
+
+CREATE INDEX IF NOT EXISTS idx_devices_user_change ON devices(user_id, change_seq);
+CREATE INDEX IF NOT EXISTS idx_check_ins_user_change ON check_ins(user_id, change_seq);
+CREATE INDEX IF NOT EXISTS idx_family_members_user_change ON family_members(user_id, change_seq);
+CREATE INDEX IF NOT EXISTS idx_breadcrumbs_device_change ON breadcrumbs(device_id, change_seq, id);
+
+COMMIT;
@@ -0,0 +1,25 @@
+-- GPX/KML import jobs (POST .../breadcrumbs:import). The API process updates
+-- the row after every inserted chunk so GET .../breadcrumbImports/{id} can
+-- report progress.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS breadcrumb_imports (
+  id UUID PRIMARY KEY DEFAULT trailguard_uuid7(),
+  user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  device_id UUID NOT NULL REFERENCES devices(id) ON DELETE CASCADE,
+  format TEXT NOT NULL,
+  state TEXT NOT NULL DEFAULT 'RUNNING',
+  total_bytes BIGINT NOT NULL DEFAULT 0,
+  bytes_read BIGINT NOT NULL DEFAULT 0,
+  points_parsed BIGINT NOT NULL DEFAULT 0,
+  created_count BIGINT NOT NULL DEFAULT 0,
+  dropped_count BIGINT NOT NULL DEFAULT 0,
+  error TEXT,
+  create_time TIMESTAMPTZ DEFAULT now(),
+  update_time TIMESTAMPTZ DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_breadcrumb_imports_device ON breadcrumb_imports(device_id, create_time DESC);
+
+COMMIT;
@@ -0,0 +1,10 @@
+-- Message watches follow the per-user change sequence (user_change_seqs)
+-- instead of create_time, which is stamped before commit and can commit out
+-- of order. Existing messages get 0 and are only returned by listings.
+
+BEGIN;
+
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS change_seq BIGINT NOT NULL DEFAULT 0;
+CREATE INDEX IF NOT EXISTS idx_messages_user_change ON messages(user_id, change_seq, id);
+
+COMMIT;
@@ -0,0 +1,12 @@
+-- Per-device low-water mark for breadcrumb downsampling: each retention pass
+-- scans only [downsampled_before, cutoff) instead of the device's whole
+-- thinned history. Ingest lowers the mark when it writes older points.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS breadcrumb_retention_marks (
+  device_id UUID PRIMARY KEY REFERENCES devices(id) ON DELETE CASCADE,
+  downsampled_before TIMESTAMPTZ NOT NULL
+);
+
+COMMIT;
@@ -0,0 +1,30 @@
+-- Current check-in deadline per user, with the time it alerted. The overdue
+-- monitor claims an alert by setting alert_time, so it goes out once however
+-- many workers hold the deadline, and a restart reloads only deadlines that
+-- haven't alerted. GET /v1/overdueCheckIns lists the alerted ones.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS check_in_deadlines (
+  user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+  check_in_id UUID NOT NULL REFERENCES check_ins(id) ON DELETE CASCADE,
+  due_time TIMESTAMPTZ NOT NULL,
+  alert_time TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS idx_check_in_deadlines_pending ON check_in_deadlines(due_time) WHERE alert_time IS NULL;
+CREATE INDEX IF NOT EXISTS idx_check_in_deadlines_alerted ON check_in_deadlines(due_time) WHERE alert_time IS NOT NULL;
+
+-- One-time backfill from each user's newest check-in; deadlines already
+-- past count as alerted so the deploy doesn't page for them again
+INSERT INTO check_in_deadlines (user_id, check_in_id, due_time, alert_time)
+SELECT user_id, id, next_due_time, CASE WHEN next_due_time <= now() THEN next_due_time END
+FROM (
+  SELECT DISTINCT ON (user_id) user_id, id, next_due_time
+  FROM check_ins
+  ORDER BY user_id, create_time DESC
+) newest
+WHERE next_due_time IS NOT NULL
+ON CONFLICT (user_id) DO NOTHING;
+
+COMMIT;
@@ -0,0 +1,11 @@
+-- listFirmwareUpdates filters on user_id and pages in id order, so
+-- (user_id, firmware_version) served neither; (user_id, id) returns a user's
+-- devices already in page order and resumes straight at the page token.
+
+BEGIN;
+
+DROP INDEX IF EXISTS idx_devices_user_firmware;
+
+CREATE INDEX IF NOT EXISTS idx_devices_user_id ON devices(user_id, id);
+
+COMMIT;
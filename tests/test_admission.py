@@ -0,0 +1,104 @@
+import os
+
+os.environ['DATABASE_URL'] = 'sqlite+pysqlite:///:memory:'
+
+from fastapi.testclient import TestClient
+
+from trailguard_api.main import app
+from trailguard_api import admission, models
+from trailguard_api.admission import LimitConfig, Limiter
+from trailguard_api.database import Base, engine, SessionLocal
+
+Base.metadata.create_all(bind=engine)
+client = TestClient(app)
+
+
+def create_device(user_id: str) -> str:
+    db = SessionLocal()
+    db.add(models.User(id=user_id))
+    device = models.Device(user_id=user_id, pairing_code=f'ADM-{user_id}')
+    db.add(device)
+    db.commit()
+    device_id = device.id
+    db.close()
+    return device_id
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_refills_and_caps_concurrency():
+    clock = FakeClock()
+    limiter = Limiter(LimitConfig(rate=2, burst=3, concurrency=2), clock=clock)
+    assert limiter.try_acquire('k') is None
+    assert limiter.try_acquire('k') is None
+    # Two in flight: the third is refused even though a token remains
+    assert limiter.try_acquire('k') == 1.0
+    limiter.release('k')
+    limiter.release('k')
+    assert limiter.try_acquire('k') is None
+    limiter.release('k')
+    retry = limiter.try_acquire('k')
+    assert retry is not None and 0 < retry <= 0.5
+    clock.now += 0.5
+    assert limiter.try_acquire('k') is None
+
+
+def test_idle_keys_are_evicted():
+    clock = FakeClock()
+    limiter = Limiter(LimitConfig(rate=10, burst=10), clock=clock)
+    for i in range(100):
+        limiter.try_acquire(f'dev-{i}')
+        limiter.release(f'dev-{i}')
+    assert len(limiter) == 100
+    clock.now += limiter.idle_seconds + 1
+    for i in range(60):
+        limiter.try_acquire('hot')
+        limiter.release('hot')
+    # Each call evicts a bounded number of idle keys, so memory drains steadily
+    assert len(limiter) < 100
+    for _ in range(100):
+        limiter.try_acquire('hot')
+        limiter.release('hot')
+    assert len(limiter) == 1
+
+
+def test_ingest_burst_is_shed_but_sos_is_admitted():
+    user_id = 'user_admission'
+    device_id = create_device(user_id)
+    saved = dict(admission._limiters['breadcrumbs.batchCreate'])
+    admission.configure('breadcrumbs.batchCreate', device=LimitConfig(rate=0.1, burst=2), user=None)
+    try:
+        body = {'breadcrumbs': [{'position': {'latitude': 1.0, 'longitude': 2.0}}]}
+        url = f'/v1/users/{user_id}/devices/{device_id}/breadcrumbs:batchCreate'
+        codes = [client.post(url, json=body).status_code for _ in range(4)]
+        assert codes == [200, 200, 429, 429]
+        resp = client.post(url, json=body)
+        assert resp.status_code == 429
+        assert int(resp.headers['Retry-After']) >= 1
+
+        resp = client.post(f'/v1/users/{user_id}/sos:activate', json={'message': 'storm'})
+        assert resp.status_code == 200
+        assert resp.json()['active'] is True
+        client.post(f'/v1/users/{user_id}/sos:cancel')
+    finally:
+        admission._limiters['breadcrumbs.batchCreate'] = saved
+
+
+def test_sos_in_a_device_id_does_not_bypass_limits():
+    user_id = 'user_admission_sos_id'
+    create_device(user_id)
+    saved = dict(admission._limiters['breadcrumbs.batchCreate'])
+    admission.configure('breadcrumbs.batchCreate', device=LimitConfig(rate=0.1, burst=1), user=None)
+    try:
+        url = f'/v1/users/{user_id}/devices/sos-beacon/breadcrumbs:batchCreate'
+        body = {'breadcrumbs': [{'position': {'latitude': 1.0, 'longitude': 2.0}}]}
+        codes = [client.post(url, json=body).status_code for _ in range(2)]
+        assert codes == [404, 429]
+    finally:
+        admission._limiters['breadcrumbs.batchCreate'] = saved
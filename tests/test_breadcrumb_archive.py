@@ -0,0 +1,147 @@
+import os
+import uuid
+from datetime import datetime, timedelta
+
+os.environ['DATABASE_URL'] = 'sqlite+pysqlite:///:memory:'
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from trailguard_api.main import app
+from trailguard_api import archive, models
+from trailguard_api.database import Base, engine, SessionLocal
+
+Base.metadata.create_all(bind=engine)
+client = TestClient(app)
+
+
+def create_device(user_id: str) -> str:
+    db = SessionLocal()
+    db.add(models.User(id=user_id))
+    device = models.Device(user_id=user_id, pairing_code=f'ARCH-{user_id}')
+    db.add(device)
+    db.commit()
+    device_id = device.id
+    db.close()
+    return device_id
+
+
+def seed_breadcrumbs(device_id: str, start: datetime, count: int, step: timedelta):
+    db = SessionLocal()
+    for i in range(count):
+        t = start + step * i
+        db.add(
+            models.Breadcrumb(
+                device_id=device_id,
+                recorded_at=t,
+                create_time=t,
+                lat=10 + i * 0.001,
+                lng=20 + i * 0.001,
+                accuracy_meters=None if i % 2 else 4.5,
+            )
+        )
+    db.commit()
+    db.close()
+
+
+def list_all(user_id: str, device_id: str, page_size: int):
+    out, token = [], None
+    while True:
+        params = {'pageSize': page_size}
+        if token:
+            params['pageToken'] = token
+        resp = client.get(f'/v1/users/{user_id}/devices/{device_id}/breadcrumbs', params=params)
+        assert resp.status_code == 200
+        data = resp.json()
+        out.extend(data['breadcrumbs'])
+        token = data['nextPageToken']
+        if not token:
+            return out
+
+
+def test_archived_breadcrumbs_read_back_transparently(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, 'ARCHIVE_DIR', str(tmp_path))
+    monkeypatch.setattr(archive, '_INDEX_STRIDE', 8)
+    user_id = 'user_archive'
+    device_id = create_device(user_id)
+    now = datetime.utcnow()
+    seed_breadcrumbs(device_id, now - timedelta(days=200), 50, timedelta(hours=1))
+    seed_breadcrumbs(device_id, now - timedelta(days=1), 10, timedelta(minutes=5))
+
+    before = list_all(user_id, device_id, 7)
+    assert len(before) == 60
+
+    db = SessionLocal()
+    moved = archive.archive_breadcrumbs(db, timedelta(days=90))
+    remaining = db.query(models.Breadcrumb).filter(models.Breadcrumb.device_id == device_id).count()
+    db.close()
+    assert moved == 50
+    assert remaining == 10
+    assert list((tmp_path / device_id).glob('*.tgbc'))
+
+    # Same pages, same names and values whether rows are hot or cold
+    assert list_all(user_id, device_id, 7) == before
+    assert list_all(user_id, device_id, 1000) == before
+
+
+def test_segment_search_uses_time_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, '_INDEX_STRIDE', 4)
+    t = [0, 10, 10, 20, 30, 30, 30, 40, 50, 60]
+    path = tmp_path / 'seg.tgbc'
+    archive.write_segment(path, t, t, [0.0] * 10, [0.0] * 10, [1.0] * 10, [bytes(16)] * 10)
+    seg = archive.Segment(path)
+    for value in (-5, 0, 10, 15, 30, 35, 60, 70):
+        for side in ('left', 'right'):
+            assert seg.search(value, side) == int(np.searchsorted(t, value, side=side))
+
+
+def test_segment_ids_round_trip_with_trailing_zero_bytes(tmp_path):
+    ids = [uuid.UUID('12345678-1234-4678-9234-567812345600'), uuid.UUID(int=0)]
+    path = tmp_path / 'ids.tgbc'
+    archive.write_segment(path, [1, 2], [1, 2], [0.0, 0.0], [0.0, 0.0], [1.0, 1.0], [u.bytes for u in ids])
+    rows = archive.Segment(path).rows(0, 2, aware=False)
+    assert [r.id for r in rows] == [str(u) for u in ids]
+
+
+def write_span(directory, times):
+    ids = [uuid.uuid4() for _ in times]
+    path = directory / f'{times[0]:020d}-{times[-1]:020d}-{uuid.uuid4().hex[:8]}.tgbc'
+    archive.write_segment(path, times, times, [0.0] * len(times), [0.0] * len(times), [1.0] * len(times), [u.bytes for u in ids])
+
+
+def test_cold_page_stops_at_the_newest_segments(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, 'ARCHIVE_DIR', str(tmp_path))
+    monkeypatch.setattr(archive, '_segments', archive._SegmentCache())
+    monkeypatch.setattr(archive, 'open_segment', archive._segments.open)
+    device_dir = tmp_path / 'dev-cold'
+    device_dir.mkdir()
+    for start in range(0, 100, 10):
+        write_span(device_dir, list(range(start, start + 10)))
+    # A late import: old rows plus one newer than every other segment
+    write_span(device_dir, [5, 500])
+    mapped = []
+    segment = archive.Segment
+    monkeypatch.setattr(archive, 'Segment', lambda path: mapped.append(path) or segment(path))
+
+    rows = archive.cold_page('dev-cold', 3)
+    assert [archive.to_micros(r.recorded_at) for r in rows] == [500, 99, 98]
+    assert len(mapped) == 2
+
+    rows = archive.cold_page('dev-cold', 4, before=(rows[-1].recorded_at, rows[-1].id))
+    assert [archive.to_micros(r.recorded_at) for r in rows] == [97, 96, 95, 94]
+
+
+def test_evicted_segments_are_unmapped(tmp_path):
+    cache = archive._SegmentCache(maxsize=1)
+    write_span(tmp_path, [1, 2])
+    write_span(tmp_path, [3, 4])
+    first, second = sorted(tmp_path.glob('*.tgbc'))
+    with cache.open(first) as a:
+        with cache.open(second) as b:
+            # Still being read, so evicted but not yet unmapped
+            assert not a._mm.closed and a.count == 2
+        assert not b._mm.closed
+    assert a._mm.closed
+    with cache.open(first):
+        pass
+    assert b._mm.closed
@@ -0,0 +1,148 @@
+import os
+from datetime import datetime
+
+os.environ['DATABASE_URL'] = 'sqlite+pysqlite:///:memory:'
+
+from fastapi.testclient import TestClient
+
+from trailguard_api.main import app
+import numpy as np
+
+from trailguard_api import ingest, models
+from trailguard_api.database import Base, engine, SessionLocal
+
+Base.metadata.create_all(bind=engine)
+client = TestClient(app)
+
+
+def create_device(user_id: str) -> str:
+    db = SessionLocal()
+    db.add(models.User(id=user_id))
+    d = models.Device(user_id=user_id, pairing_code=f'pair-{user_id}')
+    db.add(d)
+    db.commit()
+    device_id = d.id
+    db.close()
+    return device_id
+
+
+def stored(device_id: str):
+    db = SessionLocal()
+    rows = (
+        db.query(models.Breadcrumb)
+        .filter(models.Breadcrumb.device_id == device_id)
+        .order_by(models.Breadcrumb.recorded_at)
+        .all()
+    )
+    db.close()
+    return rows
+
+
+def test_columnar_batch_is_stored_with_times_and_accuracy():
+    user_id = 'user_ingest_columns'
+    device_id = create_device(user_id)
+    t0 = 1_700_000_000
+    resp = client.post(
+        f'/v1/users/{user_id}/devices/{device_id}/breadcrumbs:batchCreate',
+        json={'t': [t0, t0 + 1.5, t0 + 3], 'lat': [10.0, 10.0001, 10.0002], 'lng': [20.0, 20.0001, 20.0002], 'acc': [5, None, 7.5]},
+    )
+    assert resp.status_code == 200
+    assert resp.json()['createdCount'] == 3
+    rows = stored(device_id)
+    assert [r.lat for r in rows] == [10.0, 10.0001, 10.0002]
+    assert [r.accuracy_meters for r in rows] == [5.0, None, 7.5]
+    assert rows[1].recorded_at.replace(tzinfo=None) == datetime(2023, 11, 14, 22, 13, 21, 500000)
+
+    resp = client.get(f'/v1/users/{user_id}/devices/{device_id}/breadcrumbs')
+    assert len(resp.json()['breadcrumbs']) == 3
+
+
+def test_columnar_batch_rejects_bad_arrays():
+    user_id = 'user_ingest_invalid'
+    device_id = create_device(user_id)
+    url = f'/v1/users/{user_id}/devices/{device_id}/breadcrumbs:batchCreate'
+    cases = [
+        ({'lat': [10.0, 95.0], 'lng': [20.0, 20.0]}, 'lat[1]'),
+        ({'lat': [10.0], 'lng': [200.0]}, 'lng[0]'),
+        ({'lat': [10.0, 11.0], 'lng': [20.0]}, 'same length'),
+        ({'lat': [10.0], 'lng': [20.0], 'acc': [-1]}, 'acc[0]'),
+        ({'lat': [10.0], 'lng': [20.0], 't': [4_000_000_000]}, 't[0]'),
+        ({'lat': [10.0]}, 'lat and lng'),
+        ({'breadcrumbs': [], 'lat': [1.0], 'lng': [1.0]}, 'either'),
+    ]
+    for body, message in cases:
+        resp = client.post(url, json=body)
+        assert resp.status_code == 400, body
+        assert message in resp.json()['detail']
+    # Nothing from a rejected batch is stored
+    assert stored(device_id) == []
+
+
+def test_nested_batch_errors_stay_validation_errors():
+    user_id = 'user_ingest_nested_invalid'
+    device_id = create_device(user_id)
+    url = f'/v1/users/{user_id}/devices/{device_id}/breadcrumbs:batchCreate'
+    good = {'position': {'latitude': 10.0, 'longitude': 20.0}}
+    cases = [
+        ({'breadcrumbs': [good, {'position': {'latitude': 95.0, 'longitude': 20.0}}]}, ['body', 'breadcrumbs', 1, 'position', 'latitude']),
+        ({'breadcrumbs': [{'position': {'latitude': 10.0, 'longitude': -181.0}}]}, ['body', 'breadcrumbs', 0, 'position', 'longitude']),
+        ({}, ['body', 'breadcrumbs']),
+    ]
+    for body, loc in cases:
+        resp = client.post(url, json=body)
+        assert resp.status_code == 422, body
+        assert resp.json()['detail'][0]['loc'] == loc
+    assert stored(device_id) == []
+
+
+def test_batch_drops_inaccurate_points_spikes_and_jitter():
+    user_id = 'user_ingest_filter'
+    device_id = create_device(user_id)
+    url = f'/v1/users/{user_id}/devices/{device_id}/breadcrumbs:batchCreate'
+    t0 = 1_700_000_000
+    resp = client.post(
+        url,
+        json={
+            't': [t0, t0 + 10, t0 + 20, t0 + 30, t0 + 40],
+            # kept, jitter (1 m), poor accuracy, a 5 km spike, kept (22 m on)
+            'lat': [30.0, 30.00001, 30.0001, 30.05, 30.0002],
+            'lng': [40.0, 40.0, 40.0, 40.0, 40.0],
+            'acc': [5, 5, 500, 5, None],
+        },
+    )
+    assert resp.json() == {'createdCount': 2, 'droppedCount': 3}
+    assert [r.lat for r in stored(device_id)] == [30.0, 30.0002]
+
+    # The last kept point carries over: a stationary follow-up batch adds nothing
+    resp = client.post(url, json={'t': [t0 + 50, t0 + 60], 'lat': [30.0002, 30.00021], 'lng': [40.0, 40.0]})
+    assert resp.json() == {'createdCount': 0, 'droppedCount': 2}
+    assert len(stored(device_id)) == 2
+
+
+def test_single_timed_point_on_a_new_device_is_stored():
+    user_id = 'user_ingest_single'
+    device_id = create_device(user_id)
+    url = f'/v1/users/{user_id}/devices/{device_id}/breadcrumbs:batchCreate'
+    resp = client.post(url, json={'t': [1_700_000_000], 'lat': [45.0], 'lng': [-122.0]})
+    assert resp.status_code == 200
+    assert resp.json() == {'createdCount': 1, 'droppedCount': 0}
+    # And against the point just stored
+    resp = client.post(url, json={'t': [1_700_000_060], 'lat': [45.001], 'lng': [-122.0]})
+    assert resp.json() == {'createdCount': 1, 'droppedCount': 0}
+
+
+def test_filter_thins_long_stationary_runs():
+    limits = ingest.PointFilter(max_accuracy_m=0, min_distance_m=5, max_speed_mps=0)
+    rng = np.random.default_rng(7)
+    # 1000 points within ~1 m of the start, then a walk in 10 m steps
+    lat = np.r_[45.0 + rng.normal(0, 0.000005, 1000), 45.0 + 0.00009 * np.arange(1, 51)]
+    lng = np.full(len(lat), -122.0)
+    cols = ingest.Columns(t=None, lat=lat, lng=lng, acc=np.full(len(lat), np.nan))
+
+    kept = ingest.filter_points(cols, None, limits)
+    assert len(kept) == 51
+    assert kept.lat[0] == lat[0]
+    assert np.all(ingest.distance_m(kept.lat[:-1], kept.lng[:-1], kept.lat[1:], kept.lng[1:]) >= 5)
+
+    kept = ingest.filter_points(cols, ingest.Point(t=None, lat=45.0, lng=-122.0), limits)
+    assert len(kept) == 50
@@ -1,4 +1,5 @@
 import os
+from datetime import datetime, timedelta
 
 os.environ['DATABASE_URL'] = 'sqlite+pysqlite:///:memory:'
 
@@ -38,3 +39,87 @@ def test_create_and_list_checkins():
     assert resp.status_code == 200
     data = resp.json()
     assert len(data['checkIns']) == 1
+
+
+def seed_checkins(user_id: str, count: int):
+    db = SessionLocal()
+    base = datetime(2025, 1, 1)
+    for i in range(count):
+        db.add(
+            models.CheckIn(
+                user_id=user_id,
+                type='ok' if i % 2 == 0 else 'delayed',
+                device_id='dev-a' if i % 3 == 0 else None,
+                create_time=base + timedelta(hours=i),
+            )
+        )
+    db.commit()
+    db.close()
+
+
+def test_list_checkins_paginates_with_page_token():
+    user_id = 'user_checkins_paging'
+    create_user(user_id)
+    seed_checkins(user_id, 7)
+
+    seen = []
+    token = None
+    pages = 0
+    while True:
+        params = {'pageSize': 3}
+        if token:
+            params['pageToken'] = token
+        resp = client.get(f'/v1/users/{user_id}/checkIns', params=params)
+        assert resp.status_code == 200
+        data = resp.json()
+        seen.extend(c['createTime'] for c in data['checkIns'])
+        pages += 1
+        token = data.get('nextPageToken')
+        if not token:
+            break
+    assert pages == 3
+    assert len(seen) == 7
+    assert seen == sorted(seen, reverse=True)
+
+    resp = client.get(f'/v1/users/{user_id}/checkIns', params={'orderBy': 'createTime asc', 'pageSize': 50})
+    times = [c['createTime'] for c in resp.json()['checkIns']]
+    assert times == sorted(times)
+
+
+def test_list_checkins_filter():
+    user_id = 'user_checkins_filter'
+    create_user(user_id)
+    seed_checkins(user_id, 6)
+
+    resp = client.get(f'/v1/users/{user_id}/checkIns', params={'filter': 'type = "delayed"'})
+    assert resp.status_code == 200
+    assert {c['type'] for c in resp.json()['checkIns']} == {'delayed'}
+    assert len(resp.json()['checkIns']) == 3
+
+    resp = client.get(
+        f'/v1/users/{user_id}/checkIns',
+        params={'filter': 'createTime >= "2025-01-01T02:00:00Z" AND createTime < "2025-01-01T05:00:00Z"'},
+    )
+    assert len(resp.json()['checkIns']) == 3
+
+    resp = client.get(f'/v1/users/{user_id}/checkIns', params={'filter': 'deviceId = dev-a AND type = ok OR type = delayed'})
+    assert len(resp.json()['checkIns']) == 2
+
+    resp = client.get(f'/v1/users/{user_id}/checkIns', params={'filter': 'message = "x"'})
+    assert resp.status_code == 400
+    resp = client.get(f'/v1/users/{user_id}/checkIns', params={'orderBy': 'type desc'})
+    assert resp.status_code == 400
+
+
+def test_page_token_bound_to_filter():
+    user_id = 'user_checkins_token'
+    create_user(user_id)
+    seed_checkins(user_id, 4)
+
+    resp = client.get(f'/v1/users/{user_id}/checkIns', params={'pageSize': 2})
+    token = resp.json()['nextPageToken']
+    assert token
+    resp = client.get(f'/v1/users/{user_id}/checkIns', params={'pageSize': 2, 'pageToken': token, 'filter': 'type = ok'})
+    assert resp.status_code == 400
+    resp = client.get(f'/v1/users/{user_id}/checkIns', params={'pageToken': 'garbage!'})
+    assert resp.status_code == 400
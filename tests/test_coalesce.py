@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+
+os.environ['DATABASE_URL'] = 'sqlite+pysqlite:///:memory:'
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from trailguard_api.main import app
+from trailguard_api import models
+from trailguard_api.coalesce import Coalescer, read_coalescer
+from trailguard_api.database import Base, engine, SessionLocal
+
+Base.metadata.create_all(bind=engine)
+client = TestClient(app)
+
+
+def create_user(user_id: str):
+    db = SessionLocal()
+    db.add(models.User(id=user_id))
+    db.commit()
+    db.close()
+
+
+def test_concurrent_callers_share_one_execution():
+    c = Coalescer(ttl=0)
+    calls = []
+    gate = threading.Event()
+
+    def load():
+        calls.append(1)
+        gate.wait(2)
+        return b'{"ok":true}'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(c.do('k', load))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert results == [b'{"ok":true}'] * 8
+    # Nothing is kept once the flight lands when the TTL is 0
+    assert c.do('k', lambda: b'again') == b'again'
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    c = Coalescer(ttl=60)
+    gate = threading.Event()
+
+    def load():
+        gate.wait(2)
+        raise HTTPException(status_code=404, detail='Not found')
+
+    errors = []
+
+    def call():
+        try:
+            c.do('k', load)
+        except HTTPException as e:
+            errors.append(e.status_code)
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert errors == [404] * 4
+    assert c.do('k', lambda: b'found') == b'found'
+
+
+def test_micro_ttl_reuses_body_until_user_writes(monkeypatch):
+    user_id = 'user_coalesce'
+    create_user(user_id)
+    monkeypatch.setattr(read_coalescer._cache, 'ttl', 60)
+    try:
+        assert client.get(f'/v1/users/{user_id}/sos').json()['active'] is False
+        # A write that bypasses the API isn't seen while the cached body is fresh
+        db = SessionLocal()
+        db.add(models.SOSSession(user_id=user_id))
+        db.commit()
+        db.close()
+        assert client.get(f'/v1/users/{user_id}/sos').json()['active'] is False
+        # Any API write for the user moves their reads to a new key
+        resp = client.post(f'/v1/users/{user_id}/sos:cancel')
+        assert resp.json()['active'] is False
+        client.post(f'/v1/users/{user_id}/sos:activate', json={})
+        assert client.get(f'/v1/users/{user_id}/sos').json()['active'] is True
+    finally:
+        read_coalescer.clear()
+
+
+def test_coalesced_routes_keep_response_shape():
+    user_id = 'user_coalesce_shape'
+    create_user(user_id)
+    resp = client.post(f'/v1/users/{user_id}/devices', json={'pairingCode': 'ABCD1234'})
+    device_name = resp.json()['name']
+    resp = client.get(f'/v1/{device_name}')
+    assert resp.status_code == 200
+    assert resp.json()['name'] == device_name
+    assert 'batteryPercent' in resp.json()
+    assert client.get(f'/v1/users/{user_id}/devices/missing').status_code == 404
+    resp = client.get(f'/v1/{device_name}/breadcrumbs', params={'pageSize': 10})
+    assert resp.status_code == 200
+    assert resp.json() == {'breadcrumbs': [], 'nextPageToken': None}
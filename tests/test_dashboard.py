@@ -0,0 +1,87 @@
+import os
+
+os.environ['DATABASE_URL'] = 'sqlite+pysqlite:///:memory:'
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from trailguard_api.main import app
+from trailguard_api import models
+from trailguard_api.database import Base, engine, SessionLocal
+from trailguard_api.routers.dashboard import dashboard_cache
+
+Base.metadata.create_all(bind=engine)
+client = TestClient(app)
+
+
+def create_user(user_id: str):
+    db = SessionLocal()
+    db.add(models.User(id=user_id))
+    db.commit()
+    db.close()
+
+
+def add_member(owner_id: str, member_user_id: str):
+    create_user(member_user_id)
+    resp = client.post(
+        f'/v1/users/{owner_id}/familyMembers', json={'displayName': member_user_id, 'memberUserId': member_user_id}
+    )
+    assert resp.status_code == 201
+    resp = client.post(f'/v1/users/{member_user_id}/devices', json={'pairingCode': f'PAIR-{member_user_id}'})
+    device_id = resp.json()['name'].split('/')[-1]
+    client.patch(
+        f'/v1/users/{member_user_id}/devices/{device_id}',
+        json={'batteryPercent': 50, 'location': {'lat': 1.0, 'lng': 2.0}},
+    )
+    client.post(
+        f'/v1/users/{member_user_id}/devices/{device_id}/breadcrumbs',
+        json={'breadcrumb': {'position': {'latitude': 3.0, 'longitude': 4.0}}},
+    )
+
+
+def count_dashboard_queries(owner_id: str) -> int:
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    dashboard_cache.clear()
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        resp = client.get(f'/v1/users/{owner_id}/familyDashboard')
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert resp.status_code == 200
+    return len(statements)
+
+
+def test_dashboard_aggregates_members():
+    owner_id = 'dash_owner'
+    create_user(owner_id)
+    add_member(owner_id, 'dash_member_a')
+    client.post('/v1/users/dash_member_a/sos:activate', json={'message': 'help'})
+    # A member without a linked user still shows up
+    client.post(f'/v1/users/{owner_id}/familyMembers', json={'displayName': 'Grandpa'})
+
+    resp = client.get(f'/v1/users/{owner_id}/familyDashboard')
+    assert resp.status_code == 200
+    members = {m['displayName']: m for m in resp.json()['familyMembers']}
+    assert set(members) == {'dash_member_a', 'Grandpa'}
+    a = members['dash_member_a']
+    assert a['device']['batteryPercent'] == 50
+    assert a['lastKnownLocation']['lat'] == 3.0
+    assert a['sos']['active'] is True
+    assert members['Grandpa']['device'] is None
+    assert members['Grandpa']['sos'] is None
+
+
+def test_dashboard_query_count_is_constant():
+    owner_id = 'dash_owner_scale'
+    create_user(owner_id)
+    add_member(owner_id, 'dash_scale_0')
+    small = count_dashboard_queries(owner_id)
+    for i in range(1, 8):
+        add_member(owner_id, f'dash_scale_{i}')
+    large = count_dashboard_queries(owner_id)
+    assert small == large
+    assert large <= 4
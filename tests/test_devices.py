@@ -73,3 +73,64 @@ def test_device_pair_list_get_patch_check_fw():
     assert resp.status_code == 200
     data = resp.json()
     assert len(data['breadcrumbs']) == 2
+
+
+def test_bulk_firmware_listing_and_rollout():
+    user_id = 'user_firmware'
+    create_user(user_id)
+    db = SessionLocal()
+    versions = ['1.2.3', '1.0.0', None, '1.1.0', '1.2.3']
+    devices = [models.Device(user_id=user_id, pairing_code=f'fw-{i}', firmware_version=v) for i, v in enumerate(versions)]
+    db.add_all(devices)
+    db.commit()
+    ids = [d.id for d in devices]
+    db.close()
+
+    resp = client.get(f'/v1/users/{user_id}/devices:listFirmwareUpdates', params={'pageSize': 2})
+    assert resp.status_code == 200
+    first = resp.json()
+    assert first['latestVersion'] == '1.2.3'
+    resp = client.get(
+        f'/v1/users/{user_id}/devices:listFirmwareUpdates', params={'pageSize': 2, 'pageToken': first['nextPageToken']}
+    )
+    second = resp.json()
+    assert second['nextPageToken'] is None
+    listed = [d['name'].rsplit('/', 1)[-1] for d in first['devices'] + second['devices']]
+    assert sorted(listed) == sorted(ids[1:4])
+
+    resp = client.post(f'/v1/users/{user_id}/devices:rolloutFirmware', json={'targetVersion': '9.9.9'})
+    assert resp.status_code == 400
+
+    resp = client.post(f'/v1/users/{user_id}/devices:rolloutFirmware', json={'deviceIds': ids[:3]})
+    assert resp.status_code == 200
+    assert resp.json() == {
+        'targetVersion': '1.2.3',
+        'targetedCount': 3,
+        'totalDevices': 3,
+        'updatedDevices': 1,
+        'pendingDevices': 2,
+    }
+
+    # The device reports the new version and the rollout moves forward
+    client.patch(f'/v1/users/{user_id}/devices/{ids[1]}', json={'firmwareVersion': '1.2.3'})
+    resp = client.get(f'/v1/users/{user_id}/devices/{ids[1]}:checkFirmware')
+    assert resp.json()['updateAvailable'] is False
+    resp = client.post(f'/v1/users/{user_id}/devices:rolloutFirmware', json={'deviceIds': ids[:3]})
+    assert resp.json()['updatedDevices'] == 2
+    assert resp.json()['pendingDevices'] == 1
+
+
+def test_firmware_manifest_reloads_when_file_changes(tmp_path):
+    import json
+
+    from trailguard_api.firmware import ManifestCache
+
+    path = tmp_path / 'manifest.json'
+    cache = ManifestCache(str(path), check_seconds=0)
+    assert cache.get().latest == '1.2.3'  # built-in default while the file is missing
+    path.write_text(json.dumps({'latest': '2.0.0', 'releases': [{'version': '2.0.0', 'releaseNotes': 'New'}]}))
+    assert cache.get().latest == '2.0.0'
+    assert cache.get().notes('2.0.0') == 'New'
+    path.write_text('{not json')
+    os.utime(path, ns=(1, 1))
+    assert cache.get().latest == '2.0.0'  # a broken file keeps the last good manifest
@@ -0,0 +1,93 @@
+import base64
+import math
+import os
+
+os.environ['DATABASE_URL'] = 'sqlite+pysqlite:///:memory:'
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from trailguard_api.main import app
+from trailguard_api import heatmap, models
+from trailguard_api.database import Base, engine, SessionLocal
+
+Base.metadata.create_all(bind=engine)
+client = TestClient(app)
+
+
+def create_device(user_id: str) -> str:
+    db = SessionLocal()
+    db.add(models.User(id=user_id))
+    device = models.Device(user_id=user_id, pairing_code=f'HEAT-{user_id}')
+    db.add(device)
+    db.commit()
+    device_id = device.id
+    db.close()
+    return device_id
+
+
+def tile_for(lat: float, lng: float, z: int):
+    n = 1 << z
+    x = int((lng + 180.0) / 360.0 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return x, y
+
+
+def get_tile(z: int, x: int, y: int):
+    resp = client.get(f'/v1/heatmap/{z}/{x}/{y}')
+    assert resp.status_code == 200
+    data = resp.json()
+    grid = None
+    if data['counts']:
+        grid = np.frombuffer(base64.b64decode(data['counts']), dtype='<u4').reshape(data['size'], data['size'])
+    return data, grid
+
+
+def test_heatmap_tiles_count_ingested_breadcrumbs():
+    user_id = 'user_heatmap'
+    device_id = create_device(user_id)
+    # Southern hemisphere so other test modules' points don't land in these tiles
+    points = [(-33.8688 + i * 0.0005, 151.2093 + i * 0.0005) for i in range(20)]
+    resp = client.post(
+        f'/v1/users/{user_id}/devices/{device_id}/breadcrumbs:batchCreate',
+        json={'breadcrumbs': [{'position': {'latitude': a, 'longitude': b}} for a, b in points]},
+    )
+    assert resp.status_code == 200
+    client.post(
+        f'/v1/users/{user_id}/devices/{device_id}/breadcrumbs',
+        json={'breadcrumb': {'position': {'latitude': points[0][0], 'longitude': points[0][1]}}},
+    )
+
+    z = 12
+    x, y = tile_for(*points[0], z)
+    # Buffered until the flush, outside the ingest transaction
+    assert get_tile(z, x, y)[0]['total'] == 0
+    assert heatmap.flush() > 0
+    data, grid = get_tile(z, x, y)
+    assert data['total'] == 21
+    assert grid.sum() == 21
+    assert data['max'] == grid.max() >= 2
+
+    # Roll-up: the parent tile holds exactly its four children
+    parent, _ = get_tile(z - 1, x // 2, y // 2)
+    children = sum(get_tile(z, 2 * (x // 2) + dx, 2 * (y // 2) + dy)[0]['total'] for dx in (0, 1) for dy in (0, 1))
+    assert parent['total'] == children
+
+    # An empty tile far away
+    ex, ey = tile_for(60.0, -40.0, z)
+    data, grid = get_tile(z, ex, ey)
+    assert data['total'] == 0 and data['counts'] is None
+
+
+def test_heatmap_cells_match_slippy_tiles():
+    lat, lng = 47.6062, -122.3321
+    z = 10 + heatmap.GRID_BITS
+    x, y = tile_for(lat, lng, z)
+    key = int(heatmap.quadkeys([lat], [lng], z)[0])
+    assert int(heatmap._compact(np.array([key]))[0]) == x
+    assert int(heatmap._compact(np.array([key >> 1]))[0]) == y
+
+
+def test_heatmap_tile_validation():
+    assert client.get('/v1/heatmap/3/8/0').status_code == 400
+    assert client.get(f'/v1/heatmap/{heatmap.MAX_TILE_ZOOM + 1}/0/0').status_code == 400
@@ -0,0 +1,156 @@
+import io
+import os
+
+os.environ['DATABASE_URL'] = 'sqlite+pysqlite:///:memory:'
+
+import pytest
+from fastapi.testclient import TestClient
+
+from trailguard_api.main import app
+from trailguard_api import imports, models, trackfiles
+from trailguard_api.database import Base, engine, SessionLocal
+
+Base.metadata.create_all(bind=engine)
+client = TestClient(app)
+
+
+_started = []
+
+
+@pytest.fixture(autouse=True)
+def import_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(imports, 'IMPORT_DIR', str(tmp_path))
+    monkeypatch.setattr(imports, 'CHUNK_POINTS', 50)
+    start = imports.start
+
+    def tracked_start(*args):
+        future = start(*args)
+        _started.append(future)
+        return future
+
+    monkeypatch.setattr(imports, 'start', tracked_start)
+    yield tmp_path
+
+
+def create_device(user_id: str) -> str:
+    db = SessionLocal()
+    db.add(models.User(id=user_id))
+    d = models.Device(user_id=user_id, pairing_code=f'pair-{user_id}')
+    db.add(d)
+    db.commit()
+    device_id = d.id
+    db.close()
+    return device_id
+
+
+def gpx(points) -> bytes:
+    pts = ''.join(
+        f'<trkpt lat="{lat}" lon="{lng}"><ele>120</ele><time>2023-11-14T22:{i // 60:02d}:{i % 60:02d}Z</time></trkpt>'
+        for i, (lat, lng) in enumerate(points)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<gpx version="1.1" creator="test" xmlns="http://www.topografix.com/GPX/1/1">'
+        f'<trk><name>Hike</name><trkseg>{pts}</trkseg></trk></gpx>'
+    ).encode()
+
+
+def wait(name: str) -> dict:
+    # Join the runner rather than polling: the in-memory SQLite engine shares
+    # one connection, so a poll's rollback could undo the import's open chunk
+    _started.pop().result(timeout=30)
+    return client.get(f'/v1/{name}').json()
+
+
+def test_gpx_import_runs_in_chunks_and_reports_progress(import_dir):
+    user_id = 'user_import_gpx'
+    device_id = create_device(user_id)
+    # 200 points 11 m apart plus 20 stationary repeats of the last one
+    points = [(45.0 + i * 0.0001, -122.0) for i in range(200)] + [(45.0199, -122.0)] * 20
+    body = gpx(points)
+    resp = client.post(
+        f'/v1/users/{user_id}/devices/{device_id}/breadcrumbs:import',
+        content=body,
+        headers={'Content-Type': 'application/gpx+xml'},
+    )
+    assert resp.status_code == 202
+    assert resp.json()['format'] == 'gpx'
+    assert resp.json()['totalBytes'] == len(body)
+
+    job = wait(resp.json()['name'])
+    assert job['state'] == 'SUCCEEDED', job
+    assert job['pointsParsed'] == 220
+    assert job['createdCount'] == 200 and job['droppedCount'] == 20
+    assert job['bytesRead'] == len(body)
+    assert os.listdir(import_dir) == []
+
+    db = SessionLocal()
+    rows = db.query(models.Breadcrumb).filter(models.Breadcrumb.device_id == device_id).all()
+    db.close()
+    assert len(rows) == 200
+    assert min(r.recorded_at for r in rows).replace(tzinfo=None).isoformat() == '2023-11-14T22:00:00'
+
+
+def test_kml_import_is_sniffed_from_the_body():
+    user_id = 'user_import_kml'
+    device_id = create_device(user_id)
+    coords = ' '.join(f'{-110.0 + i * 0.001},{35.0},1500' for i in range(60))
+    body = (
+        '<kml xmlns="http://www.opengis.net/kml/2.2"><Document><Placemark>'
+        f'<LineString><coordinates>{coords}</coordinates></LineString></Placemark></Document></kml>'
+    ).encode()
+    resp = client.post(f'/v1/users/{user_id}/devices/{device_id}/breadcrumbs:import', content=body)
+    assert resp.status_code == 202
+    job = wait(resp.json()['name'])
+    assert job['state'] == 'SUCCEEDED', job
+    assert job['format'] == 'kml' and job['createdCount'] == 60
+
+
+def test_timeless_route_keeps_every_waypoint():
+    user_id = 'user_import_route'
+    device_id = create_device(user_id)
+    # A planned route: 20 points 1 km apart and no times
+    rtepts = ''.join(f'<rtept lat="{40.0 + i * 0.009}" lon="-105.0"><name>WP{i}</name></rtept>' for i in range(20))
+    body = f'<gpx xmlns="http://www.topografix.com/GPX/1/1"><rte>{rtepts}</rte></gpx>'.encode()
+    resp = client.post(f'/v1/users/{user_id}/devices/{device_id}/breadcrumbs:import', content=body)
+    job = wait(resp.json()['name'])
+    assert job['state'] == 'SUCCEEDED', job
+    assert job['createdCount'] == 20 and job['droppedCount'] == 0
+
+
+def test_parser_detaches_everything_it_has_read(monkeypatch):
+    roots = []
+    iterparse = trackfiles.ET.iterparse
+
+    def recording_iterparse(*args, **kwargs):
+        for event, elem in iterparse(*args, **kwargs):
+            if not roots:
+                roots.append(elem)
+            yield event, elem
+
+    monkeypatch.setattr(trackfiles.ET, 'iterparse', recording_iterparse)
+    wpts = ''.join(f'<wpt lat="1" lon="2"><name>W{i}</name></wpt>' for i in range(10))
+    body = (
+        '<gpx xmlns="http://www.topografix.com/GPX/1/1"><metadata><name>hike</name></metadata>'
+        f'{wpts}<trk><trkseg><trkpt lat="40.0" lon="-105.0"><time>2024-05-01T10:00:00Z</time></trkpt></trkseg></trk></gpx>'
+    ).encode()
+    chunks = list(trackfiles.iter_chunks(io.BytesIO(body), 'gpx'))
+    assert [c.lat.tolist() for c in chunks] == [[40.0]]
+    assert chunks[0].t.tolist() == [1714557600.0]
+    # Waypoints and metadata don't pile up under the root
+    assert len(roots[0]) == 0
+
+
+def test_import_failures():
+    user_id = 'user_import_bad'
+    device_id = create_device(user_id)
+    url = f'/v1/users/{user_id}/devices/{device_id}/breadcrumbs:import'
+    assert client.post(url, content=b'lat,lng\n1,2\n').status_code == 400
+    assert client.post(url, content=b'').status_code == 400
+    assert client.post(f'/v1/users/{user_id}/devices/nope/breadcrumbs:import', content=gpx([(1, 2)])).status_code == 404
+
+    # Malformed XML is only found while parsing, so the job fails
+    resp = client.post(url, content=gpx([(1.0, 2.0)])[:-20])
+    job = wait(resp.json()['name'])
+    assert job['state'] == 'FAILED' and 'Malformed GPX' in job['error']
+    assert client.get(f'/v1/users/{user_id}/devices/{device_id}/breadcrumbImports/missing').status_code == 404
@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+os.environ['DATABASE_URL'] = 'sqlite+pysqlite:///:memory:'
+
+from fastapi.testclient import TestClient
+
+from trailguard_api.main import app
+from trailguard_api import changes, models
+from trailguard_api.database import Base, engine, SessionLocal
+
+Base.metadata.create_all(bind=engine)
+client = TestClient(app)
+
+
+def create_user(user_id: str):
+    db = SessionLocal()
+    db.add(models.User(id=user_id))
+    db.commit()
+    db.close()
+
+
+def test_create_batch_and_paginate_messages():
+    user_id = 'user_messages'
+    create_user(user_id)
+
+    resp = client.post(f'/v1/users/{user_id}/messages', json={'message': {'text': 'hi', 'location': {'lat': 1.0, 'lng': 2.0}}})
+    assert resp.status_code == 201
+    assert resp.json()['location']['lat'] == 1.0
+
+    resp = client.post(f'/v1/users/{user_id}/messages:batchCreate', json={'messages': [{'text': f'm{i}'} for i in range(6)]})
+    assert resp.status_code == 200
+    assert len(resp.json()['messages']) == 6
+
+    resp = client.post(f'/v1/users/{user_id}/messages', json={'message': {'text': ''}})
+    assert resp.status_code == 422
+
+    names = []
+    token = None
+    while True:
+        params = {'pageSize': 3}
+        if token:
+            params['pageToken'] = token
+        data = client.get(f'/v1/users/{user_id}/messages', params=params).json()
+        names.extend(m['name'] for m in data['messages'])
+        token = data['nextPageToken']
+        if not token:
+            break
+    assert len(names) == 7
+    assert len(set(names)) == 7
+
+
+def test_messages_only_name_the_users_own_devices():
+    owner, other = 'user_messages_device_owner', 'user_messages_device_other'
+    create_user(owner)
+    create_user(other)
+    device_id = client.post(f'/v1/users/{owner}/devices', json={'pairingCode': 'MSG-0001'}).json()['name'].split('/')[-1]
+
+    resp = client.post(f'/v1/users/{owner}/messages', json={'message': {'text': 'hi', 'deviceId': device_id}})
+    assert resp.status_code == 201
+    resp = client.post(f'/v1/users/{other}/messages', json={'message': {'text': 'hi', 'deviceId': device_id}})
+    assert resp.status_code == 404
+    resp = client.post(
+        f'/v1/users/{other}/messages:batchCreate', json={'messages': [{'text': 'a'}, {'text': 'b', 'deviceId': device_id}]}
+    )
+    assert resp.status_code == 404
+    assert client.get(f'/v1/users/{other}/messages').json()['messages'] == []
+
+
+def test_watch_returns_only_newer_messages():
+    user_id = 'user_messages_watch'
+    create_user(user_id)
+    client.post(f'/v1/users/{user_id}/messages', json={'message': {'text': 'old'}})
+
+    watch = client.get(f'/v1/users/{user_id}/messages').json()['watchToken']
+    data = client.get(f'/v1/users/{user_id}/messages', params={'watchToken': watch}).json()
+    assert data['messages'] == []
+    assert data['watchToken'] == watch
+
+    client.post(f'/v1/users/{user_id}/messages', json={'message': {'text': 'new'}})
+    data = client.get(f'/v1/users/{user_id}/messages', params={'watchToken': watch}).json()
+    assert [m['text'] for m in data['messages']] == ['new']
+    assert data['watchToken'] != watch
+
+
+def test_long_poll_wakes_on_new_message():
+    user_id = 'user_messages_longpoll'
+    create_user(user_id)
+    watch = client.get(f'/v1/users/{user_id}/messages').json()['watchToken']
+
+    def send_later():
+        time.sleep(0.2)
+        client.post(f'/v1/users/{user_id}/messages', json={'message': {'text': 'ping'}})
+
+    sender = threading.Thread(target=send_later)
+    sender.start()
+    started = time.monotonic()
+    data = client.get(f'/v1/users/{user_id}/messages', params={'watchToken': watch, 'waitFor': 10}).json()
+    elapsed = time.monotonic() - started
+    sender.join()
+    assert [m['text'] for m in data['messages']] == ['ping']
+    assert elapsed < 5
+
+
+def test_watch_delivers_a_message_committed_late():
+    user_id = 'user_messages_late_commit'
+    create_user(user_id)
+    client.post(f'/v1/users/{user_id}/messages', json={'message': {'text': 'first'}})
+    watch = client.get(f'/v1/users/{user_id}/messages').json()['watchToken']
+
+    # Stamped before 'first' but committed after it, as a slow concurrent write would be
+    db = SessionLocal()
+    seq = changes.bump(db, user_id)
+    db.add(models.Message(user_id=user_id, text='late', create_time=datetime(2000, 1, 1), change_seq=seq))
+    db.commit()
+    db.close()
+
+    data = client.get(f'/v1/users/{user_id}/messages', params={'watchToken': watch}).json()
+    assert [m['text'] for m in data['messages']] == ['late']
@@ -0,0 +1,149 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+os.environ['DATABASE_URL'] = 'sqlite+pysqlite:///:memory:'
+
+from fastapi.testclient import TestClient
+
+from trailguard_api.main import app
+from trailguard_api import models
+from trailguard_api.database import Base, engine, SessionLocal
+from trailguard_api.overdue import OverdueMonitor, _EPOCH, overdue_monitor
+
+Base.metadata.create_all(bind=engine)
+client = TestClient(app)
+
+
+def create_user(user_id: str):
+    db = SessionLocal()
+    db.add(models.User(id=user_id))
+    db.commit()
+    db.close()
+
+
+def check_in(user_id: str, due=None):
+    body = {'checkIn': {'type': 'ok'}}
+    if due is not None:
+        body['checkIn']['nextCheckInTime'] = due.isoformat() + 'Z'
+    resp = client.post(f'/v1/users/{user_id}/checkIns', json=body)
+    assert resp.status_code == 201, resp.text
+    return resp.json()
+
+
+class Clock:
+    def __init__(self, now: datetime):
+        self.now = now
+
+    def __call__(self) -> float:
+        return (self.now - _EPOCH).total_seconds()
+
+
+def test_missed_deadline_raises_one_alert_and_check_in_clears_it():
+    hiker, other = 'user_overdue_hiker', 'user_overdue_other'
+    create_user(hiker)
+    create_user(other)
+    due = datetime.utcnow() + timedelta(hours=2)
+    created = check_in(hiker, due)
+    assert created['nextCheckInTime'].startswith(due.isoformat()[:19])
+    check_in(other, due + timedelta(hours=5))
+
+    clock = Clock(datetime.utcnow())
+    overdue_monitor.clock = clock
+    alerts = []
+    overdue_monitor.add_listener(alerts.extend)
+    try:
+        db = SessionLocal()
+        assert overdue_monitor.check(db) == []
+        clock.now = due + timedelta(minutes=1)
+        raised = overdue_monitor.check(db)
+        assert [a.user_id for a in raised] == [hiker]
+        assert alerts == raised
+        # Only raised once
+        assert overdue_monitor.check(db) == []
+        db.close()
+
+        listed = client.get('/v1/overdueCheckIns').json()['overdueCheckIns']
+        assert [o['userId'] for o in listed] == [hiker]
+        assert listed[0]['name'] == created['name']
+
+        # Checking in again (with no new deadline) resolves the alert
+        check_in(hiker)
+        assert client.get('/v1/overdueCheckIns').json()['overdueCheckIns'] == []
+    finally:
+        overdue_monitor.remove_listener(alerts.extend)
+        overdue_monitor.clock = time.time
+
+
+def test_deadline_must_be_in_the_future():
+    create_user('user_overdue_past')
+    resp = client.post(
+        '/v1/users/user_overdue_past/checkIns',
+        json={'checkIn': {'type': 'ok', 'nextCheckInTime': '2001-01-01T00:00:00Z'}},
+    )
+    assert resp.status_code == 400
+
+
+def test_rebuild_loads_pending_deadlines_and_rechecks_before_alerting():
+    base = datetime(2030, 1, 1)
+    a, b = 'user_overdue_rebuild_a', 'user_overdue_rebuild_b'
+    for user_id in (a, b):
+        create_user(user_id)
+    check_in(a, base + timedelta(hours=1))
+    check_in(a)  # Newest check-in has no deadline: not monitored
+    check_in(b, base + timedelta(hours=3))
+
+    clock = Clock(base)
+    monitor = OverdueMonitor(clock=clock)
+    db = SessionLocal()
+    monitor.rebuild(db)
+    monitor.schedule(b, base + timedelta(hours=1))  # stale in-memory deadline
+    assert a not in monitor._due
+    ours = {a, b}
+    clock.now = base + timedelta(hours=2)
+    # The DB says b is due at +3h (as if another worker handled a check-in), so no alert yet
+    assert [x for x in monitor.check(db) if x.user_id in ours] == []
+    clock.now = base + timedelta(hours=4)
+    assert [x.user_id for x in monitor.check(db) if x.user_id in ours] == [b]
+
+    # A restart doesn't alert again for a deadline that already alerted
+    restarted = OverdueMonitor(clock=clock)
+    restarted.rebuild(db)
+    assert b not in restarted._due
+    assert [x for x in restarted.check(db) if x.user_id in ours] == []
+    db.close()
+
+
+def test_each_alert_is_sent_once_across_workers():
+    user_id, stranded = 'user_overdue_workers', 'user_overdue_stranded'
+    create_user(user_id)
+    create_user(stranded)
+    due = datetime.utcnow() + timedelta(hours=1)
+    check_in(user_id, due)
+    check_in(stranded, due)
+    overdue_monitor.schedule(user_id, None)
+    overdue_monitor.schedule(stranded, None)
+
+    clock = Clock(due + timedelta(minutes=1))
+    alerts = []
+    workers = []
+    for _ in range(2):
+        monitor = OverdueMonitor(clock=clock)
+        monitor.schedule(user_id, due)
+        monitor.add_listener(alerts.extend)
+        workers.append(monitor)
+    db = SessionLocal()
+    for monitor in workers:
+        monitor.check(db)
+    assert [a.user_id for a in alerts] == [user_id]
+
+    # Nobody held the stranded deadline; the periodic pick-up finds it once
+    assert workers[0].pick_up(db) == 1
+    assert workers[1].pick_up(db) == 1
+    for monitor in workers:
+        monitor.check(db)
+    assert [a.user_id for a in alerts] == [user_id, stranded]
+    db.close()
+
+    listed = client.get('/v1/overdueCheckIns').json()['overdueCheckIns']
+    assert {user_id, stranded} <= {o['userId'] for o in listed}
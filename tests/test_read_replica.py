@@ -0,0 +1,62 @@
+import os
+import tempfile
+
+os.environ['DATABASE_URL'] = 'sqlite+pysqlite:///:memory:'
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from trailguard_api.main import app
+from trailguard_api import database, models
+from trailguard_api.database import Base, engine, SessionLocal
+
+Base.metadata.create_all(bind=engine)
+client = TestClient(app)
+
+
+def make_replica(path: str):
+    replica = create_engine(f'sqlite+pysqlite:///{path}', future=True)
+    Base.metadata.create_all(bind=replica)
+    return sessionmaker(bind=replica, autoflush=False, autocommit=False)
+
+
+def seed(factory, user_id: str, pairing_code: str):
+    db = factory()
+    if db.get(models.User, user_id) is None:
+        db.add(models.User(id=user_id))
+    db.add(models.Device(user_id=user_id, pairing_code=pairing_code))
+    db.commit()
+    db.close()
+
+
+def device_count(user_id: str) -> int:
+    resp = client.get(f'/v1/users/{user_id}/devices')
+    assert resp.status_code == 200
+    return len(resp.json()['devices'])
+
+
+def test_reads_use_replica_until_user_writes(monkeypatch):
+    user_id = 'user_replica'
+    with tempfile.TemporaryDirectory() as tmp:
+        replica = make_replica(os.path.join(tmp, 'replica.db'))
+        monkeypatch.setattr(database, 'ReadSessionLocal', replica)
+        database.primary_pins.clear()
+
+        # The "replica" lags: it has one device, the primary has two
+        seed(replica, user_id, 'REPL-0001')
+        seed(SessionLocal, user_id, 'PRIM-0001')
+        seed(SessionLocal, user_id, 'PRIM-0002')
+        assert device_count(user_id) == 1
+
+        # A write pins this user to the primary so they read their own writes
+        resp = client.post(f'/v1/users/{user_id}/devices', json={'pairingCode': 'PRIM-0003'})
+        assert resp.status_code == 201
+        assert device_count(user_id) == 3
+        # Other users are unaffected
+        seed(replica, 'user_replica_other', 'REPL-0002')
+        assert device_count('user_replica_other') == 1
+
+        # Once the pin lapses reads return to the replica
+        database.primary_pins.clear()
+        assert device_count(user_id) == 1
@@ -0,0 +1,118 @@
+import os
+from datetime import datetime, timedelta
+
+os.environ['DATABASE_URL'] = 'sqlite+pysqlite:///:memory:'
+
+import numpy as np
+
+from trailguard_api import ingest, models, retention
+from trailguard_api.database import Base, engine, SessionLocal
+
+Base.metadata.create_all(bind=engine)
+
+NOW = datetime(2026, 6, 1, 12, 0, 0)
+
+
+def create_device(user_id: str) -> str:
+    db = SessionLocal()
+    db.add(models.User(id=user_id))
+    d = models.Device(user_id=user_id, pairing_code=f'pair-{user_id}')
+    db.add(d)
+    db.commit()
+    device_id = d.id
+    db.close()
+    return device_id
+
+
+def add_track(device_id: str, start: datetime, points: int, step_seconds: int):
+    db = SessionLocal()
+    for i in range(points):
+        db.add(models.Breadcrumb(device_id=device_id, recorded_at=start + timedelta(seconds=i * step_seconds), lat=1.0, lng=2.0))
+    db.commit()
+    db.close()
+
+
+def run_retention(**kwargs):
+    db = SessionLocal()
+    try:
+        return retention.run(db, now=NOW, pause=0, **kwargs)
+    finally:
+        db.close()
+
+
+def recorded(device_id: str):
+    db = SessionLocal()
+    rows = db.query(models.Breadcrumb.recorded_at).filter(models.Breadcrumb.device_id == device_id).all()
+    db.close()
+    return sorted(r[0].replace(tzinfo=None) for r in rows)
+
+
+def test_downsamples_old_points_across_chunks_and_keeps_recent():
+    device_id = create_device('user_retention_downsample')
+    old_start = NOW - timedelta(days=40)
+    add_track(device_id, old_start, 300, 1)  # 5 minutes at 1 Hz
+    add_track(device_id, NOW - timedelta(days=1), 120, 1)
+
+    # Other modules share the database, so the report covers at least this device
+    report = run_retention(retention=None, chunk=7)
+    assert report.downsampled >= 295
+    assert report.expired == 0
+    assert report.rows_removed == report.downsampled
+    assert report.chunks > 1
+    assert report.seconds >= 0
+    times = recorded(device_id)
+    assert times[:5] == [old_start + timedelta(minutes=m) for m in range(5)]
+    assert len(times) == 5 + 120
+
+    # Already thinned tracks are left alone, and not even rescanned
+    report = run_retention(retention=None, chunk=7)
+    assert report.chunks == 0
+    assert len(recorded(device_id)) == 5 + 120
+
+
+def test_points_written_behind_the_mark_are_downsampled():
+    device_id = create_device('user_retention_late')
+    start = NOW - timedelta(days=60)
+    add_track(device_id, start, 120, 1)
+    run_retention(retention=None, chunk=50)
+    assert len(recorded(device_id)) == 2
+
+    # An imported track from before the mark, starting in the last kept minute
+    db = SessionLocal()
+    t = np.array([(start + timedelta(seconds=90 + i) - datetime(1970, 1, 1)).total_seconds() for i in range(120)])
+    cols = ingest.Columns(t=t, lat=np.full(120, 1.0), lng=np.full(120, 2.0), acc=np.full(120, np.nan))
+    ingest.insert_columns(db, device_id, cols, NOW)
+    db.commit()
+    db.close()
+
+    run_retention(retention=None, chunk=50)
+    assert recorded(device_id) == [start, start + timedelta(minutes=1), start + timedelta(minutes=2), start + timedelta(minutes=3)]
+
+
+def test_mark_is_reopened_whatever_window_retention_ran_with():
+    device_id = create_device('user_retention_window')
+    start = NOW - timedelta(days=10)
+    add_track(device_id, start, 120, 1)
+    # A shorter window than BREADCRUMB_DOWNSAMPLE_AFTER_DAYS, as from the CLI
+    run_retention(retention=None, chunk=50, downsample_after=timedelta(days=1))
+    assert len(recorded(device_id)) == 2
+
+    db = SessionLocal()
+    t = np.array([(start + timedelta(seconds=90 + i) - datetime(1970, 1, 1)).total_seconds() for i in range(120)])
+    cols = ingest.Columns(t=t, lat=np.full(120, 1.0), lng=np.full(120, 2.0), acc=np.full(120, np.nan))
+    ingest.insert_columns(db, device_id, cols, NOW)
+    db.commit()
+    db.close()
+
+    run_retention(retention=None, chunk=50, downsample_after=timedelta(days=1))
+    assert len(recorded(device_id)) == 4
+
+
+def test_expires_rows_older_than_retention():
+    device_id = create_device('user_retention_expire')
+    add_track(device_id, NOW - timedelta(days=400), 10, 3600)
+    add_track(device_id, NOW - timedelta(days=2), 10, 1)
+
+    report = run_retention(retention=timedelta(days=365), chunk=4)
+    assert report.expired >= 10
+    assert len(recorded(device_id)) == 10
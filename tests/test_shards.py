@@ -0,0 +1,169 @@
+import os
+from datetime import datetime
+
+os.environ['DATABASE_URL'] = 'sqlite+pysqlite:///:memory:'
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, func, select
+
+from trailguard_api.main import app
+from trailguard_api import database, models, shards
+from trailguard_api.coalesce import read_coalescer
+from trailguard_api.database import Base, engine
+
+Base.metadata.create_all(bind=engine)
+client = TestClient(app)
+
+
+def make_shards(tmp_path, n=2):
+    engines = []
+    for i in range(n):
+        e = create_engine(f'sqlite+pysqlite:///{tmp_path}/shard{i}.db', future=True)
+        Base.metadata.create_all(bind=e)
+        engines.append(e)
+    return shards.ShardMap(engines, path=str(tmp_path / 'shard_map.json'), check_seconds=0)
+
+
+def users_in_distinct_buckets(prefix, n):
+    out, seen = [], set()
+    i = 0
+    while len(out) < n:
+        user_id = f'{prefix}-{i}'
+        if shards.bucket_of(user_id) not in seen:
+            seen.add(shards.bucket_of(user_id))
+            out.append(user_id)
+        i += 1
+    return out
+
+
+def seed(factory, user_id):
+    db = factory()
+    db.add(models.User(id=user_id))
+    device = models.Device(user_id=user_id, pairing_code=f'pair-{user_id}')
+    db.add(device)
+    db.flush()
+    db.add_all(models.Breadcrumb(device_id=device.id, lat=45.0, lng=-122.0 + i / 1000) for i in range(7))
+    db.add(models.CheckIn(user_id=user_id, device_id=device.id, type='OK', lat=45.0, lng=-122.0))
+    db.add(models.UserSetting(user_id=user_id))
+    db.commit()
+    db.close()
+
+
+def count(factory, model, **where):
+    db = factory()
+    try:
+        q = select(func.count()).select_from(model)
+        for k, v in where.items():
+            q = q.where(getattr(model, k) == v)
+        return db.execute(q).scalar()
+    finally:
+        db.close()
+
+
+def test_bucket_is_stable():
+    assert shards.bucket_of('11111111-1111-1111-1111-111111111111') == shards.bucket_of('11111111-1111-1111-1111-111111111111')
+    assert all(0 <= shards.bucket_of(f'u{i}') < shards.BUCKETS for i in range(100))
+
+
+def test_plan_evens_out_buckets():
+    moves = shards.plan([0] * shards.BUCKETS, 3)
+    after = [0] * shards.BUCKETS
+    for bucket, src, dst in moves:
+        assert src == 0
+        after[bucket] = dst
+    assert sorted(after.count(s) for s in range(3)) == [341, 341, 342]
+    # An even map needs no moves
+    assert shards.plan(shards.even_map(3), 3) == []
+
+
+def test_requests_route_to_the_users_shard(tmp_path, monkeypatch):
+    smap = make_shards(tmp_path)
+    home, away = users_in_distinct_buckets('shard-route', 2)
+    buckets = [0] * shards.BUCKETS
+    buckets[shards.bucket_of(away)] = 1
+    shards.write_map(smap.path, buckets)
+    monkeypatch.setattr(database, 'shard_map', smap)
+    read_coalescer.clear()
+
+    for user_id in (home, away):
+        resp = client.post(f'/v1/users/{user_id}/devices', json={'pairingCode': f'code-{user_id}'})
+        assert resp.status_code == 201
+        resp = client.get(f'/v1/users/{user_id}/devices')
+        assert len(resp.json()['devices']) == 1
+
+    s0, s1 = smap.sessionmakers
+    assert count(s0, models.Device, user_id=home) == 1
+    assert count(s1, models.Device, user_id=away) == 1
+    assert count(s0, models.Device, user_id=away) == 0
+
+
+def test_move_bucket_copies_then_deletes(tmp_path):
+    smap = make_shards(tmp_path)
+    moving, staying = users_in_distinct_buckets('shard-move', 2)
+    s0, s1 = smap.sessionmakers
+    seed(s0, moving)
+    seed(s0, staying)
+    late = []
+
+    def settle(seconds):
+        # A write that reached the old shard before every worker saw the new map
+        db = s0()
+        device_id = db.execute(select(models.Device.id).where(models.Device.user_id == moving)).scalar()
+        db.add(models.Breadcrumb(device_id=device_id, lat=46.0, lng=-121.0, recorded_at=datetime(2001, 1, 1)))
+        # ...and changes to rows already copied
+        db.query(models.CheckIn).filter(models.CheckIn.user_id == moving).update({'type': 'SOS_CANCELLED'})
+        db.delete(db.query(models.Breadcrumb).filter(models.Breadcrumb.device_id == device_id).first())
+        db.commit()
+        db.close()
+        late.append(seconds)
+
+    moved = shards.move_bucket(smap, shards.bucket_of(moving), 1, settle=3, sleep=settle)
+
+    assert moved == 1
+    assert late == [3]
+    assert smap.shard_of(moving) == 1 and smap.shard_of(staying) == 0
+    assert shards.read_map(smap.path, 2)[shards.bucket_of(moving)] == 1
+    for model in (models.User, models.Device, models.CheckIn, models.UserSetting):
+        assert count(s0, model) == 1
+        assert count(s1, model) == 1
+    assert count(s1, models.Breadcrumb) == 7
+    assert count(s0, models.Breadcrumb) == 7
+    assert count(s1, models.CheckIn, type='SOS_CANCELLED') == 1
+
+
+def test_move_buckets_settles_once(tmp_path):
+    smap = make_shards(tmp_path, n=3)
+    users = users_in_distinct_buckets('shard-multi', 3)
+    s0, s1, s2 = smap.sessionmakers
+    for user_id in users:
+        seed(s0, user_id)
+    waits = []
+
+    moves = {shards.bucket_of(users[0]): 1, shards.bucket_of(users[1]): 2}
+    moved = shards.move_buckets(smap, moves, settle=3, sleep=waits.append)
+
+    assert moved == 2
+    assert waits == [3]
+    assert [smap.shard_of(u) for u in users] == [1, 2, 0]
+    assert [count(f, models.User) for f in (s0, s1, s2)] == [1, 1, 1]
+    assert [count(f, models.Breadcrumb) for f in (s0, s1, s2)] == [7, 7, 7]
+
+
+def test_fleet_views_span_shards(tmp_path, monkeypatch):
+    smap = make_shards(tmp_path)
+    home, away = users_in_distinct_buckets('shard-fleet', 2)
+    buckets = [0] * shards.BUCKETS
+    buckets[shards.bucket_of(away)] = 1
+    shards.write_map(smap.path, buckets)
+    monkeypatch.setattr(database, 'shard_map', smap)
+
+    for user_id in (home, away):
+        assert client.post(f'/v1/users/{user_id}/sos:activate', json={}).status_code == 200
+    resp = client.get('/v1/activeSosSessions')
+    assert {s['userId'] for s in resp.json()['sessions']} == {home, away}
+
+    # The owner's family row is on shard 0, the member's SOS on shard 1
+    resp = client.post(f'/v1/users/{home}/familyMembers', json={'displayName': 'Away', 'memberUserId': away})
+    assert resp.status_code == 201
+    members = client.get(f'/v1/users/{home}/familyDashboard').json()['familyMembers']
+    assert members[0]['sos']['active'] is True
@@ -7,6 +7,7 @@ from fastapi.testclient import TestClient
 from trailguard_api.main import app
 from trailguard_api import models
 from trailguard_api.database import Base, engine, SessionLocal
+from trailguard_api.sos_index import ActiveSOSIndex
 
 Base.metadata.create_all(bind=engine)
 client = TestClient(app)
@@ -46,3 +47,68 @@ def test_sos_activate_cancel_flow():
     assert resp.status_code == 200
     assert resp.json()['active'] is False
 
+
+
+def test_fleet_active_sos_listing_newest_first():
+    create_user('fleet_a')
+    create_user('fleet_b')
+    client.post('/v1/users/fleet_a/sos:activate', json={'location': {'lat': 5.0, 'lng': 6.0}})
+    client.post('/v1/users/fleet_b/sos:activate', json={'message': 'fell'})
+
+    resp = client.get('/v1/activeSosSessions')
+    assert resp.status_code == 200
+    users = [s['userId'] for s in resp.json()['sessions'] if s['userId'].startswith('fleet_')]
+    assert users == ['fleet_b', 'fleet_a']
+    loc = next(s for s in resp.json()['sessions'] if s['userId'] == 'fleet_a')['lastKnownLocation']
+    assert loc['lat'] == 5.0
+
+    client.post('/v1/users/fleet_b/sos:cancel')
+    resp = client.get('/v1/activeSosSessions')
+    users = [s['userId'] for s in resp.json()['sessions'] if s['userId'].startswith('fleet_')]
+    assert users == ['fleet_a']
+    client.post('/v1/users/fleet_a/sos:cancel')
+
+
+def test_fleet_index_detects_writes_from_other_workers():
+    # A second index stands in for another API worker's in-memory copy
+    other_worker = ActiveSOSIndex()
+    db = SessionLocal()
+    other_worker.ensure_fresh(db)
+    before = other_worker.version
+
+    create_user('fleet_remote')
+    client.post('/v1/users/fleet_remote/sos:activate')
+    other_worker.ensure_fresh(db)
+    assert other_worker.version != before
+    _, entries = other_worker.snapshot()
+    assert 'fleet_remote' in {e.user_id for e in entries}
+
+    client.post('/v1/users/fleet_remote/sos:cancel')
+    other_worker.ensure_fresh(db)
+    _, entries = other_worker.snapshot()
+    assert 'fleet_remote' not in {e.user_id for e in entries}
+    db.close()
+
+
+def test_fleet_watch_returns_on_change():
+    resp = client.get('/v1/activeSosSessions:watch')
+    version = resp.json()['version']
+    # Unchanged version with zero timeout returns the same snapshot
+    resp = client.get('/v1/activeSosSessions:watch', params={'sinceVersion': version, 'timeoutSeconds': 0})
+    assert resp.json()['version'] == version
+
+    create_user('fleet_watch')
+    client.post('/v1/users/fleet_watch/sos:activate')
+    resp = client.get('/v1/activeSosSessions:watch', params={'sinceVersion': version, 'timeoutSeconds': 5})
+    assert resp.json()['version'] != version
+    client.post('/v1/users/fleet_watch/sos:cancel')
+
+
+def test_fleet_listing_leaves_no_transaction_open():
+    from trailguard_api.database import open_shards
+    from trailguard_api.routers.dispatch import _list
+
+    dbs = open_shards()
+    _list(dbs)
+    assert not any(db.in_transaction() for db in dbs.all())
+    dbs.close()
@@ -0,0 +1,70 @@
+import os
+from datetime import datetime, timedelta
+
+os.environ['DATABASE_URL'] = 'sqlite+pysqlite:///:memory:'
+
+from trailguard_api import models, sweeper
+from trailguard_api.database import Base, engine, SessionLocal
+
+Base.metadata.create_all(bind=engine)
+
+# Far in the past so devices created by other test modules are never stale
+NOW = datetime(2000, 1, 1, 12, 0, 0)
+
+
+def add_devices(user_id: str, specs):
+    db = SessionLocal()
+    db.add(models.User(id=user_id))
+    devices = [
+        models.Device(user_id=user_id, pairing_code=f'{user_id}-{i}', connection_state=state, last_seen_time=seen)
+        for i, (state, seen) in enumerate(specs)
+    ]
+    db.add_all(devices)
+    db.commit()
+    ids = [d.id for d in devices]
+    db.close()
+    return ids
+
+
+def states(ids):
+    db = SessionLocal()
+    rows = dict(db.query(models.Device.id, models.Device.connection_state).filter(models.Device.id.in_(ids)).all())
+    db.close()
+    return [rows[i] for i in ids]
+
+
+def sweep(**kwargs):
+    db = SessionLocal()
+    try:
+        return sweeper.sweep(db, now=NOW, degraded_after=300, offline_after=1800, **kwargs)
+    finally:
+        db.close()
+
+
+def test_sweep_degrades_then_offlines_stale_devices_and_stamps_them():
+    sweep()  # Settle live devices other test modules left without a heartbeat time
+    ids = add_devices(
+        'user_sweeper',
+        [
+            ('ONLINE', NOW - timedelta(seconds=30)),  # fresh
+            ('ONLINE', NOW - timedelta(seconds=600)),  # stale
+            ('ONLINE', NOW - timedelta(hours=2)),  # long dead
+            ('DEGRADED', NOW - timedelta(hours=1)),
+            ('OFFLINE', NOW - timedelta(days=3)),
+            ('ONLINE', None),  # never reported a heartbeat time
+        ],
+    )
+    report = sweep(batch=1)
+    # A live device that never reported a heartbeat time is stale too
+    assert states(ids) == ['ONLINE', 'DEGRADED', 'OFFLINE', 'OFFLINE', 'OFFLINE', 'OFFLINE']
+    assert (report.degraded, report.offline) == (1, 3)
+    assert report.batches > 3
+    # Flipped devices get a change sequence so delta sync returns them
+    db = SessionLocal()
+    seqs = dict(db.query(models.Device.id, models.Device.change_seq).filter(models.Device.id.in_(ids)).all())
+    db.close()
+    assert [i for i in ids if seqs[i]] == [ids[1], ids[2], ids[3], ids[5]]
+
+    # Nothing left to do on the next pass
+    report = sweep()
+    assert (report.degraded, report.offline) == (0, 0)
@@ -0,0 +1,148 @@
+import os
+from datetime import datetime
+
+os.environ['DATABASE_URL'] = 'sqlite+pysqlite:///:memory:'
+
+from fastapi.testclient import TestClient
+
+from trailguard_api.main import app
+from trailguard_api import models, sweeper
+from trailguard_api.database import Base, engine, SessionLocal
+
+Base.metadata.create_all(bind=engine)
+client = TestClient(app)
+
+
+def create_user(user_id: str):
+    db = SessionLocal()
+    if db.get(models.User, user_id) is None:
+        db.add(models.User(id=user_id))
+        db.commit()
+    db.close()
+
+
+def sync(user_id: str, token=None, **params):
+    if token is not None:
+        params['since'] = token
+    resp = client.get(f'/v1/users/{user_id}:sync', params=params)
+    assert resp.status_code == 200, resp.text
+    return resp.json()
+
+
+def names(items):
+    return sorted(i['name'] for i in items)
+
+
+def test_sync_returns_only_changes_since_token():
+    user_id = 'user_sync'
+    create_user(user_id)
+    device = client.post(f'/v1/users/{user_id}/devices', json={'pairingCode': 'SYNC-0001'}).json()
+    device_id = device['name'].split('/')[-1]
+    client.post(f'/v1/users/{user_id}/checkIns', json={'checkIn': {'type': 'ok'}})
+    member = client.post(f'/v1/users/{user_id}/familyMembers', json={'displayName': 'Sam'}).json()
+    client.patch(f'/v1/users/{user_id}/settings', json={'autoAlerts': True})
+    client.post(
+        f'/v1/users/{user_id}/devices/{device_id}/breadcrumbs:batchCreate',
+        json={'lat': [45.0, 45.001], 'lng': [-122.0, -122.0]},
+    )
+
+    full = sync(user_id)
+    assert names(full['devices']) == [device['name']]
+    assert len(full['checkIns']) == 1 and len(full['familyMembers']) == 1 and len(full['breadcrumbs']) == 2
+    assert full['settings']['autoAlerts'] is True
+    assert full['hasMore'] is False
+
+    # Nothing changed: an empty delta and a token that still works
+    empty = sync(user_id, full['syncToken'])
+    assert empty['devices'] == empty['checkIns'] == empty['breadcrumbs'] == empty['deleted'] == []
+    assert empty['settings'] is None
+
+    client.patch(f'/v1/users/{user_id}/devices/{device_id}', json={'batteryPercent': 42})
+    client.delete(f"/v1/users/{user_id}/familyMembers/{member['name'].split('/')[-1]}")
+    delta = sync(user_id, empty['syncToken'])
+    assert [d['batteryPercent'] for d in delta['devices']] == [42]
+    assert delta['deleted'] == [member['name']]
+    assert delta['checkIns'] == delta['familyMembers'] == delta['breadcrumbs'] == []
+
+
+def test_sync_pages_breadcrumbs_without_repeats():
+    user_id = 'user_sync_pages'
+    create_user(user_id)
+    device = client.post(f'/v1/users/{user_id}/devices', json={'pairingCode': 'SYNC-0002'}).json()
+    device_id = device['name'].split('/')[-1]
+    for lat in ([45.0, 45.1, 45.2], [46.0, 46.1]):
+        client.post(
+            f'/v1/users/{user_id}/devices/{device_id}/breadcrumbs:batchCreate', json={'lat': lat, 'lng': [-122.0] * len(lat)}
+        )
+    client.post(f'/v1/users/{user_id}/checkIns', json={'checkIn': {'type': 'ok'}})
+
+    seen_crumbs, seen_checkins, token, pages = [], [], None, 0
+    while True:
+        page = sync(user_id, token, pageSize=2)
+        seen_crumbs += names(page['breadcrumbs'])
+        seen_checkins += names(page['checkIns'])
+        token = page['syncToken']
+        pages += 1
+        if not page['hasMore']:
+            break
+    assert pages == 3
+    assert len(seen_crumbs) == len(set(seen_crumbs)) == 5
+    assert len(seen_checkins) == 1
+
+
+def test_sync_merges_breadcrumbs_of_every_device_in_change_order():
+    user_id = 'user_sync_merge'
+    create_user(user_id)
+    device_ids = [
+        client.post(f'/v1/users/{user_id}/devices', json={'pairingCode': code}).json()['name'].split('/')[-1]
+        for code in ('SYNC-0003', 'SYNC-0004')
+    ]
+    for device_id, lat in zip(device_ids * 2, ([45.0, 45.1], [47.0], [46.0], [48.0, 48.1])):
+        client.post(
+            f'/v1/users/{user_id}/devices/{device_id}/breadcrumbs:batchCreate', json={'lat': lat, 'lng': [-122.0] * len(lat)}
+        )
+
+    seen, token = [], None
+    while True:
+        page = sync(user_id, token, pageSize=2)
+        seen += [c['position']['latitude'] for c in page['breadcrumbs']]
+        token = page['syncToken']
+        if not page['hasMore']:
+            break
+    assert seen == [45.0, 45.1, 47.0, 46.0, 48.0, 48.1]
+
+
+def test_swept_devices_are_synced():
+    users = ['user_sync_sweep_a', 'user_sync_sweep_b']
+    tokens = {}
+    db = SessionLocal()
+    sweeper.sweep(db, now=datetime(1995, 1, 1))  # Settle devices other tests left without a heartbeat time
+    db.close()
+    for i, user_id in enumerate(users):
+        create_user(user_id)
+        db = SessionLocal()
+        # Two users in one sweep batch, one with two devices
+        db.add_all(
+            models.Device(
+                user_id=user_id,
+                pairing_code=f'SYNC-SWEEP-{i}-{j}',
+                connection_state='ONLINE',
+                last_seen_time=datetime(1990, 1, 1),
+            )
+            for j in range(i + 1)
+        )
+        db.commit()
+        db.close()
+        tokens[user_id] = sync(user_id)['syncToken']
+
+    db = SessionLocal()
+    report = sweeper.sweep(db, now=datetime(1995, 1, 1))
+    db.close()
+    assert report.offline == 3
+    for i, user_id in enumerate(users):
+        delta = sync(user_id, tokens[user_id])
+        assert [d['connectionState'] for d in delta['devices']] == ['OFFLINE'] * (i + 1)
+
+
+def test_sync_rejects_bad_token():
+    assert client.get('/v1/users/user_sync:sync', params={'since': 'nope'}).status_code == 400
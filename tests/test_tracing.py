@@ -0,0 +1,80 @@
+import json
+import os
+
+os.environ['DATABASE_URL'] = 'sqlite+pysqlite:///:memory:'
+
+import pytest
+from fastapi.testclient import TestClient
+
+from trailguard_api.main import app
+from trailguard_api import models
+from trailguard_api.database import Base, engine, SessionLocal
+from trailguard_api import tracing
+from trailguard_api.tracing import tracer
+
+Base.metadata.create_all(bind=engine)
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def traces_endpoint(monkeypatch):
+    monkeypatch.setattr(tracing, 'TRACES_ENDPOINT_ENABLED', True)
+
+
+def create_user(user_id: str):
+    db = SessionLocal()
+    db.add(models.User(id=user_id))
+    db.commit()
+    db.close()
+
+
+def test_unsampled_requests_leave_no_trace(monkeypatch):
+    monkeypatch.setattr(tracer, 'sample_rate', 0)
+    tracer.buffer.clear()
+    resp = client.get('/v1/users/user_trace_none/devices')
+    assert resp.status_code == 200
+    assert 'x-trace-id' not in resp.headers
+    assert client.get('/traces').json()['traces'] == []
+
+
+def test_sampled_request_has_route_db_sql_and_encode_spans(monkeypatch, tmp_path):
+    user_id = 'user_trace'
+    create_user(user_id)
+    path = tmp_path / 'traces.jsonl'
+    monkeypatch.setattr(tracer, 'sample_rate', 1.0)
+    monkeypatch.setattr(tracer, 'path', str(path))
+    tracer.buffer.clear()
+
+    resp = client.post(f'/v1/users/{user_id}/devices', json={'pairingCode': 'TRACE123'})
+    assert resp.status_code == 201
+    trace_id = resp.headers['x-trace-id']
+
+    monkeypatch.setattr(tracer, 'sample_rate', 0)
+    traces = client.get('/traces').json()['traces']
+    assert [t['traceId'] for t in traces] == [trace_id]
+    trace = traces[0]
+    assert trace['attrs']['route'] == '/v1/users/{user_id}/devices'
+    assert trace['attrs']['status'] == 201
+    spans = {s['name']: s for s in trace['spans']}
+    assert {'request', 'route', 'route.prepare', 'get_db', 'route.endpoint', 'sql', 'route.encode'} <= set(spans)
+    by_id = {s['spanId']: s for s in trace['spans']}
+    assert by_id[spans['get_db']['parentId']]['name'] == 'route.prepare'
+    sql = [s for s in trace['spans'] if s['name'] == 'sql']
+    assert any(s['attrs']['statement'].startswith('INSERT INTO devices') for s in sql)
+    assert all(by_id[s['parentId']]['name'] == 'route.endpoint' for s in sql)
+
+    lines = path.read_text().splitlines()
+    assert [json.loads(line)['traceId'] for line in lines] == [trace_id]
+
+
+def test_header_forces_sampling(monkeypatch):
+    monkeypatch.setattr(tracer, 'sample_rate', 0)
+    tracer.buffer.clear()
+    resp = client.get('/v1/users/user_trace_forced/devices', headers={'X-TrailGuard-Trace': '1'})
+    assert 'x-trace-id' in resp.headers
+    assert client.get('/traces', params={'minDurationMs': 0}).json()['traces'][0]['traceId'] == resp.headers['x-trace-id']
+
+
+def test_traces_endpoint_is_hidden_unless_enabled(monkeypatch):
+    monkeypatch.setattr(tracing, 'TRACES_ENDPOINT_ENABLED', False)
+    assert client.get('/traces').status_code == 404
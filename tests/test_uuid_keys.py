@@ -0,0 +1,48 @@
+import os
+import time
+import uuid
+
+os.environ['DATABASE_URL'] = 'sqlite+pysqlite:///:memory:'
+
+from fastapi.testclient import TestClient
+
+from trailguard_api.main import app
+from trailguard_api import models
+from trailguard_api.database import Base, engine, SessionLocal
+
+Base.metadata.create_all(bind=engine)
+client = TestClient(app)
+
+
+def test_uuid7_is_time_ordered():
+    before = time.time_ns() // 1_000_000
+    ids = [models.uuid7_str() for _ in range(5000)]
+    after = time.time_ns() // 1_000_000
+    assert ids == sorted(ids) and len(set(ids)) == len(ids)
+    u = uuid.UUID(ids[0])
+    assert u.version == 7 and u.variant == uuid.RFC_4122
+    assert before <= u.int >> 80 <= after
+
+
+def test_breadcrumbs_get_uuid7_keys():
+    user_id = 'user_uuid7'
+    db = SessionLocal()
+    db.add(models.User(id=user_id))
+    device = models.Device(user_id=user_id, pairing_code=f'pair-{user_id}')
+    db.add(device)
+    db.commit()
+    device_id = device.id
+    db.close()
+
+    resp = client.post(
+        f'/v1/users/{user_id}/devices/{device_id}/breadcrumbs:batchCreate',
+        json={'lat': [45.0, 45.001, 45.002], 'lng': [-122.0, -122.0, -122.0]},
+    )
+    assert resp.status_code == 200
+    db = SessionLocal()
+    ids = [b.id for b in db.query(models.Breadcrumb).filter(models.Breadcrumb.device_id == device_id)]
+    db.close()
+    assert len(ids) == 3
+    assert all(uuid.UUID(i).version == 7 for i in ids)
+    # The device itself keeps a random key
+    assert uuid.UUID(device_id).version == 4
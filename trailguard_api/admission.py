@@ -0,0 +1,189 @@
+"""In-process admission control for ingest routes.
+
+Each limited route gets a token bucket (sustained rate + burst) and an
+in-flight cap per user and per device. A request that would exceed either is
+shed with ``429`` and a ``Retry-After`` header before it touches the DB.
+
+Limits are configured per route name. Defaults live in ``DEFAULT_LIMITS`` and
+can be overridden with the ``ADMISSION_LIMITS`` JSON variable, e.g.::
+
+    {"breadcrumbs.batchCreate": {"device": {"rate": 1, "burst": 5, "concurrency": 1}}}
+
+SOS routes never take an admission dependency and the dependency itself
+always admits routes tagged ``SOS``, so an emergency is never shed.
+
+Per-key state is a few numbers; keys idle for longer than the time to refill
+their bucket are evicted, so memory tracks the number of active keys.
+"""
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+
+ADMISSION_CONTROL_ENABLED = os.getenv('ADMISSION_CONTROL_ENABLED', '1') not in ('0', 'false', 'False')
+_MIN_IDLE_SECONDS = 60.0
+_EVICT_PER_CALL = 2
+# Matched on the route rather than the URL, which also carries client-chosen ids
+_EXEMPT_TAG = 'SOS'
+
+
+@dataclass(frozen=True)
+class LimitConfig:
+    rate: float  # sustained requests per second
+    burst: int  # bucket size
+    concurrency: int = 0  # max in-flight requests; 0 means unlimited
+
+
+DEFAULT_LIMITS: Dict[str, Dict[str, LimitConfig]] = {
+    'breadcrumbs.create': {
+        'device': LimitConfig(rate=10, burst=50, concurrency=2),
+        'user': LimitConfig(rate=50, burst=200, concurrency=8),
+    },
+    'breadcrumbs.batchCreate': {
+        'device': LimitConfig(rate=2, burst=20, concurrency=1),
+        'user': LimitConfig(rate=10, burst=50, concurrency=4),
+    },
+    'breadcrumbs.import': {
+        'device': LimitConfig(rate=0.1, burst=3, concurrency=1),
+        'user': LimitConfig(rate=0.2, burst=5, concurrency=2),
+    },
+    'devices.patch': {
+        'device': LimitConfig(rate=5, burst=20, concurrency=2),
+        'user': LimitConfig(rate=20, burst=100, concurrency=8),
+    },
+}
+
+
+class _Bucket:
+    __slots__ = ('tokens', 'stamp', 'in_flight')
+
+    def __init__(self, tokens: float, stamp: float):
+        self.tokens = tokens
+        self.stamp = stamp
+        self.in_flight = 0
+
+
+class Limiter:
+    """Token bucket plus in-flight cap, one bucket per key."""
+
+    def __init__(self, config: LimitConfig, clock: Callable[[], float] = time.monotonic):
+        self.config = config
+        self.clock = clock
+        # A bucket idle this long has refilled completely, so dropping it loses nothing
+        self.idle_seconds = max(_MIN_IDLE_SECONDS, config.burst / config.rate)
+        self._buckets: 'OrderedDict[Hashable, _Bucket]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def try_acquire(self, key: Hashable) -> Optional[float]:
+        """Admit one request for ``key``; return None if admitted, else seconds to wait."""
+        cfg = self.config
+        now = self.clock()
+        with self._lock:
+            b = self._buckets.get(key)
+            if b is None:
+                b = self._buckets[key] = _Bucket(float(cfg.burst), now)
+            else:
+                b.tokens = min(float(cfg.burst), b.tokens + (now - b.stamp) * cfg.rate)
+                b.stamp = now
+                self._buckets.move_to_end(key)
+            self._evict(now)
+            if cfg.concurrency and b.in_flight >= cfg.concurrency:
+                return 1.0
+            if b.tokens < 1.0:
+                return (1.0 - b.tokens) / cfg.rate
+            b.tokens -= 1.0
+            b.in_flight += 1
+            return None
+
+    def release(self, key: Hashable, refund: bool = False) -> None:
+        with self._lock:
+            b = self._buckets.get(key)
+            if b is None:
+                return
+            b.in_flight = max(0, b.in_flight - 1)
+            if refund:
+                b.tokens = min(float(self.config.burst), b.tokens + 1.0)
+
+    def _evict(self, now: float) -> None:
+        # Buckets are kept in last-use order, so only the front can be idle.
+        # A bounded number of steps per call keeps acquire O(1).
+        for _ in range(_EVICT_PER_CALL):
+            if not self._buckets:
+                return
+            key, b = next(iter(self._buckets.items()))
+            if now - b.stamp < self.idle_seconds:
+                return
+            if b.in_flight:
+                self._buckets.move_to_end(key)
+            else:
+                del self._buckets[key]
+
+
+_limiters: Dict[str, Dict[str, Limiter]] = {}
+
+
+def configure(route: str, **scopes: Optional[LimitConfig]) -> None:
+    """Set (or with None, remove) the limits for ``route`` by scope ('user'/'device')."""
+    current = _limiters.setdefault(route, {})
+    for scope, cfg in scopes.items():
+        if cfg is None:
+            current.pop(scope, None)
+        else:
+            current[scope] = Limiter(cfg)
+
+
+def _load_limits() -> None:
+    limits = {route: dict(scopes) for route, scopes in DEFAULT_LIMITS.items()}
+    raw = os.getenv('ADMISSION_LIMITS')
+    if raw:
+        for route, scopes in json.loads(raw).items():
+            for scope, cfg in scopes.items():
+                limits.setdefault(route, {})[scope] = LimitConfig(**cfg) if cfg else None
+    for route, scopes in limits.items():
+        configure(route, **scopes)
+
+
+_load_limits()
+
+
+def admission(route: str):
+    """Route dependency that sheds requests over ``route``'s user/device limits."""
+
+    def dependency(request: Request):
+        matched = request.scope.get('route')
+        if not ADMISSION_CONTROL_ENABLED or _EXEMPT_TAG in getattr(matched, 'tags', ()):
+            yield
+            return
+        scopes = _limiters.get(route, {})
+        acquired: List[Tuple[Limiter, str]] = []
+        for scope in ('user', 'device'):
+            limiter = scopes.get(scope)
+            key = request.path_params.get(f'{scope}_id')
+            if limiter is None or key is None:
+                continue
+            retry_after = limiter.try_acquire(key)
+            if retry_after is not None:
+                for held, held_key in acquired:
+                    held.release(held_key, refund=True)
+                raise HTTPException(
+                    status_code=429,
+                    detail=f'Too many requests for this {scope}; retry later',
+                    headers={'Retry-After': str(max(1, math.ceil(retry_after)))},
+                )
+            acquired.append((limiter, key))
+        try:
+            yield
+        finally:
+            for held, held_key in acquired:
+                held.release(held_key)
+
+    return dependency
@@ -0,0 +1,357 @@
+"""Cold-tier archive of old breadcrumbs in memory-mapped columnar segment files.
+
+Breadcrumbs older than a cutoff are moved out of the ``breadcrumbs`` table into
+per-device segment files under ``BREADCRUMB_ARCHIVE_DIR/<device_id>/``. Each
+segment is immutable and laid out as:
+
+    header (64 bytes)
+    recorded_at  int64[n]    microseconds since epoch (UTC), ascending
+    create_time  int64[n]    microseconds since epoch (UTC)
+    lat          float64[n]
+    lng          float64[n]
+    accuracy     float32[n]  NaN when unknown
+    id           bytes16[n]  raw UUID
+    time index   int64[m]    recorded_at of every ``stride``-th row
+
+Readers ``mmap`` the file and wrap each column with ``numpy.frombuffer`` so
+nothing is copied until the few rows of a page are turned into responses.
+
+Run the archiver with ``python -m trailguard_api.archive --older-than-days 90``.
+"""
+import argparse
+import mmap
+import os
+import re
+import struct
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from . import models
+
+ARCHIVE_DIR = os.getenv('BREADCRUMB_ARCHIVE_DIR', 'data/breadcrumb_archive')
+ARCHIVE_AFTER_DAYS = int(os.getenv('BREADCRUMB_ARCHIVE_AFTER_DAYS', '90'))
+
+_MAGIC = b'TGBC'
+_VERSION = 1
+_HEADER = struct.Struct('<4sHHQqqII')  # magic, version, flags, count, t_min, t_max, stride, index_count
+_HEADER_SIZE = 64
+_INDEX_STRIDE = 1024
+_SEGMENT_ROWS = 200_000
+_DELETE_BATCH = 1000
+_EPOCH = datetime(1970, 1, 1)
+# archive_device names segments <t_min>-<t_max>-<random>.tgbc
+_SPAN_NAME = re.compile(r'^(-?\d+)-(-?\d+)-')
+
+
+class CrumbRow(NamedTuple):
+    """Breadcrumb fields needed for responses; quacks like ``models.Breadcrumb``."""
+
+    id: str
+    recorded_at: datetime
+    create_time: datetime
+    lat: float
+    lng: float
+    accuracy_meters: Optional[float]
+
+
+def _naive_utc(dt: datetime) -> datetime:
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def to_micros(dt: datetime) -> int:
+    return (_naive_utc(dt) - _EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(us: int, aware: bool) -> datetime:
+    dt = _EPOCH + timedelta(microseconds=int(us))
+    return dt.replace(tzinfo=timezone.utc) if aware else dt
+
+
+def _pad8(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def _layout(n: int, index_count: int):
+    offsets = {}
+    pos = _HEADER_SIZE
+    for name, itemsize in (('recorded_at', 8), ('create_time', 8), ('lat', 8), ('lng', 8), ('acc', 4), ('id', 16)):
+        offsets[name] = pos
+        pos = _pad8(pos + itemsize * n)
+    offsets['index'] = pos
+    return offsets, pos + 8 * index_count
+
+
+def write_segment(path: Path, recorded_at, create_time, lat, lng, acc, ids: Sequence[bytes]) -> None:
+    """Write one segment atomically; inputs must already be sorted by (recorded_at, id)."""
+    n = len(recorded_at)
+    recorded_at = np.asarray(recorded_at, dtype='<i8')
+    index = recorded_at[::_INDEX_STRIDE]
+    offsets, size = _layout(n, len(index))
+    buf = bytearray(size)
+    _HEADER.pack_into(
+        buf, 0, _MAGIC, _VERSION, 0, n, int(recorded_at[0]), int(recorded_at[-1]), _INDEX_STRIDE, len(index)
+    )
+    columns = (
+        ('recorded_at', recorded_at),
+        ('create_time', np.asarray(create_time, dtype='<i8')),
+        ('lat', np.asarray(lat, dtype='<f8')),
+        ('lng', np.asarray(lng, dtype='<f8')),
+        ('acc', np.asarray(acc, dtype='<f4')),
+        ('id', np.frombuffer(b''.join(ids), dtype='V16')),
+        ('index', index),
+    )
+    for name, arr in columns:
+        raw = arr.tobytes()
+        buf[offsets[name]:offsets[name] + len(raw)] = raw
+    tmp = path.with_suffix('.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(buf)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class Segment:
+    """Read-only, zero-copy view over one segment file."""
+
+    def __init__(self, path: Path):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _flags, n, self.t_min, self.t_max, self.stride, index_count = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f'Not a breadcrumb segment: {path}')
+        self.count = n
+        offsets, _ = _layout(n, index_count)
+        self.recorded_at = np.frombuffer(self._mm, dtype='<i8', count=n, offset=offsets['recorded_at'])
+        self.create_time = np.frombuffer(self._mm, dtype='<i8', count=n, offset=offsets['create_time'])
+        self.lat = np.frombuffer(self._mm, dtype='<f8', count=n, offset=offsets['lat'])
+        self.lng = np.frombuffer(self._mm, dtype='<f8', count=n, offset=offsets['lng'])
+        self.acc = np.frombuffer(self._mm, dtype='<f4', count=n, offset=offsets['acc'])
+        self.ids = np.frombuffer(self._mm, dtype='V16', count=n, offset=offsets['id'])
+        self.index = np.frombuffer(self._mm, dtype='<i8', count=index_count, offset=offsets['index'])
+        # Guarded by the cache's lock
+        self._readers = 0
+        self._evicted = False
+
+    def close(self) -> None:
+        # Views first: a map with exported buffers refuses to close
+        self.recorded_at = self.create_time = self.lat = self.lng = self.acc = self.ids = self.index = None
+        self._mm.close()
+
+    def search(self, t: int, side: str = 'left') -> int:
+        """``searchsorted`` on recorded_at, narrowed by the sparse time index first."""
+        block = int(np.searchsorted(self.index, t, side=side))
+        lo = max(0, (block - 1) * self.stride)
+        hi = min(self.count, block * self.stride + 1) if block < len(self.index) else self.count
+        return lo + int(np.searchsorted(self.recorded_at[lo:hi], t, side=side))
+
+    def rows(self, lo: int, hi: int, aware: bool) -> List[CrumbRow]:
+        out = []
+        for i in range(lo, hi):
+            acc = float(self.acc[i])
+            out.append(
+                CrumbRow(
+                    id=str(uuid.UUID(bytes=bytes(self.ids[i]))),
+                    recorded_at=_from_micros(self.recorded_at[i], aware),
+                    create_time=_from_micros(self.create_time[i], aware),
+                    lat=float(self.lat[i]),
+                    lng=float(self.lng[i]),
+                    accuracy_meters=None if np.isnan(acc) else acc,
+                )
+            )
+        return out
+
+
+class _SegmentCache:
+    """Keeps recently used segments mapped; an evicted map closes when its last reader is done."""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._open: 'OrderedDict[Tuple[str, int], Segment]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def open(self, path: Path) -> Iterator[Segment]:
+        key = (str(path), path.stat().st_mtime_ns)
+        with self._lock:
+            seg = self._acquire(key)
+        if seg is None:
+            new = Segment(path)
+            with self._lock:
+                seg = self._acquire(key)
+                if seg is None:
+                    seg = self._open[key] = new
+                    seg._readers += 1
+                    idle = self._evict()
+                else:
+                    # Another reader mapped it first
+                    idle = [new]
+            for old in idle:
+                old.close()
+        try:
+            yield seg
+        finally:
+            with self._lock:
+                seg._readers -= 1
+                done = seg._evicted and seg._readers == 0
+            if done:
+                seg.close()
+
+    def _acquire(self, key) -> Optional[Segment]:
+        seg = self._open.get(key)
+        if seg is not None:
+            self._open.move_to_end(key)
+            seg._readers += 1
+        return seg
+
+    def _evict(self) -> List[Segment]:
+        """Drop the least recently used maps; returns those no reader holds."""
+        idle = []
+        while len(self._open) > self.maxsize:
+            _, seg = self._open.popitem(last=False)
+            seg._evicted = True
+            if seg._readers == 0:
+                idle.append(seg)
+        return idle
+
+
+_segments = _SegmentCache()
+open_segment = _segments.open
+
+
+def _device_dir(device_id: str) -> Path:
+    return Path(ARCHIVE_DIR) / device_id
+
+
+def segment_paths(device_id: str) -> List[Path]:
+    d = _device_dir(device_id)
+    if not d.is_dir():
+        return []
+    return sorted(d.glob('*.tgbc'))
+
+
+def _span(path: Path) -> Tuple[int, int]:
+    """(t_min, t_max) of a segment from its name, without mapping it."""
+    m = _SPAN_NAME.match(path.name)
+    if m:
+        return int(m.group(1)), int(m.group(2))
+    with open_segment(path) as seg:
+        return seg.t_min, seg.t_max
+
+
+def cold_page(device_id: str, limit: int, before: Optional[Sequence] = None, aware: bool = False) -> List[CrumbRow]:
+    """Newest ``limit`` archived rows strictly before ``before`` = (recorded_at, id), newest first.
+
+    Segments are read newest ``t_max`` first, and reading stops once ``limit``
+    rows are known to be newer than anything left, so a page usually maps
+    one or two segments however long the device's history is.
+    """
+    if before is not None:
+        bound = (to_micros(before[0]), before[1])
+    spans = sorted(((*_span(p), p) for p in segment_paths(device_id)), key=lambda s: s[1], reverse=True)
+    candidates: List[CrumbRow] = []
+    for t_min, t_max, path in spans:
+        if before is not None and t_min > bound[0]:
+            continue
+        if len(candidates) >= limit and to_micros(candidates[limit - 1].recorded_at) > t_max:
+            break
+        with open_segment(path) as seg:
+            if before is None:
+                hi = seg.count
+                lo = max(0, hi - limit)
+            else:
+                hi = seg.search(bound[0], 'right')
+                ties = hi - seg.search(bound[0], 'left')
+                lo = max(0, hi - limit - ties)
+            rows = seg.rows(lo, hi, aware)
+        if before is not None:
+            rows = [r for r in rows if (to_micros(r.recorded_at), r.id) < bound]
+        candidates.extend(rows)
+        candidates.sort(key=lambda r: (r.recorded_at, r.id), reverse=True)
+        del candidates[limit:]
+    return candidates
+
+
+def merge_newest(hot: Sequence, cold: Sequence[CrumbRow], limit: int) -> list:
+    """Merge DB rows and archived rows newest first, dropping archived duplicates.
+
+    Duplicates only exist if the archiver died between writing a segment and
+    deleting the rows it copied; the DB copy wins.
+    """
+    hot_ids = {r.id for r in hot}
+    rows = list(hot) + [r for r in cold if r.id not in hot_ids]
+    rows.sort(key=lambda r: (_naive_utc(r.recorded_at), r.id), reverse=True)
+    return rows[:limit]
+
+
+def archive_device(db: Session, device_id: str, cutoff: datetime) -> int:
+    """Move one device's breadcrumbs recorded before ``cutoff`` into segment files."""
+    B = models.Breadcrumb
+    moved = 0
+    d = _device_dir(device_id)
+    while True:
+        rows = db.execute(
+            select(B.id, B.recorded_at, B.create_time, B.lat, B.lng, B.accuracy_meters)
+            .where(B.device_id == device_id, B.recorded_at < cutoff)
+            .order_by(B.recorded_at, B.id)
+            .limit(_SEGMENT_ROWS)
+        ).all()
+        if not rows:
+            return moved
+        d.mkdir(parents=True, exist_ok=True)
+        recorded = [to_micros(r.recorded_at) for r in rows]
+        path = d / f'{recorded[0]:020d}-{recorded[-1]:020d}-{uuid.uuid4().hex[:8]}.tgbc'
+        write_segment(
+            path,
+            recorded,
+            [to_micros(r.create_time or r.recorded_at) for r in rows],
+            [r.lat for r in rows],
+            [r.lng for r in rows],
+            [np.nan if r.accuracy_meters is None else r.accuracy_meters for r in rows],
+            [uuid.UUID(r.id).bytes for r in rows],
+        )
+        # The segment is durable before any row is deleted
+        ids = [r.id for r in rows]
+        for i in range(0, len(ids), _DELETE_BATCH):
+            db.execute(delete(B).where(B.id.in_(ids[i:i + _DELETE_BATCH])))
+        db.commit()
+        moved += len(rows)
+
+
+def archive_breadcrumbs(db: Session, older_than: timedelta) -> int:
+    cutoff = datetime.utcnow() - older_than
+    # One probe of idx_breadcrumbs_device_time per device, rather than a
+    # DISTINCT over every old breadcrumb
+    device_ids = db.execute(select(models.Device.id)).scalars().all()
+    return sum(archive_device(db, device_id, cutoff) for device_id in device_ids)
+
+
+def main():  # pragma: no cover
+    from .database import shard_map
+
+    parser = argparse.ArgumentParser(description='Move old breadcrumbs into the cold-tier archive.')
+    parser.add_argument('--older-than-days', type=int, default=ARCHIVE_AFTER_DAYS)
+    args = parser.parse_args()
+    moved = 0
+    for factory in shard_map.sessionmakers:
+        db = factory()
+        try:
+            moved += archive_breadcrumbs(db, timedelta(days=args.older_than_days))
+        finally:
+            db.close()
+    print(f'archived {moved} breadcrumbs to {ARCHIVE_DIR}')
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
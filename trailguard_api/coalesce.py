@@ -0,0 +1,116 @@
+"""Single-flight coalescing for hot read endpoints.
+
+Concurrent identical GETs (same route, path parameters and query string) share
+one execution: the first caller runs the query and serializes the response,
+later callers block until it finishes and reuse the same bytes. An optional
+micro-TTL (``COALESCE_TTL_SECONDS``) keeps the bytes around briefly to absorb
+bursts that arrive just after the leader finishes.
+
+Keys carry a per-user generation that every write request for that user bumps
+(see ``database.get_db``), so a read started after a write never joins or
+reuses a result computed before it.
+"""
+import itertools
+import os
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+from .cache import TTLCache
+from .tracing import span
+
+COALESCE_TTL_SECONDS = float(os.getenv('COALESCE_TTL_SECONDS', '0'))
+# Generations older than this can't matter to any cached or in-flight read
+_GENERATION_RETENTION_SECONDS = 60.0
+_PRUNE_AT = 10000
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Optional[bytes] = None
+        self.error: Optional[BaseException] = None
+
+
+class Coalescer:
+    def __init__(self, ttl: float):
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, _Call] = {}
+        self._cache = TTLCache(ttl=ttl, maxsize=10000)
+        self._generations: Dict[str, Tuple[int, float]] = {}
+        self._counter = itertools.count(1)
+
+    def generation(self, user_id: Optional[str]) -> int:
+        entry = self._generations.get(user_id) if user_id else None
+        return entry[0] if entry else 0
+
+    def invalidate(self, user_id: Optional[str]) -> None:
+        if not user_id:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._generations[user_id] = (next(self._counter), now)
+            if len(self._generations) > _PRUNE_AT:
+                cutoff = now - _GENERATION_RETENTION_SECONDS
+                self._generations = {k: v for k, v in self._generations.items() if v[1] > cutoff}
+
+    def do(self, key: Hashable, fn: Callable[[], bytes]) -> bytes:
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            self._cache.set(key, call.result)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.event.set()
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+read_coalescer = Coalescer(COALESCE_TTL_SECONDS)
+
+
+def coalesced_json(request: Request, load: Callable[[], BaseModel]) -> Response:
+    """Run ``load`` once per concurrent identical request and share the serialized body.
+
+    Primary pinning (``database.primary_pins``) is keyed by the same path
+    ``user_id``, so requests that share a key also read from the same database.
+    """
+    route = request.scope.get('route')
+    key = (
+        request.method,
+        getattr(route, 'path', request.url.path),
+        tuple(sorted(request.path_params.items())),
+        tuple(sorted(request.query_params.multi_items())),
+        read_coalescer.generation(request.path_params.get('user_id')),
+    )
+
+    def run() -> bytes:
+        model = load()
+        with span('coalesce.encode'):
+            return model.model_dump_json(by_alias=True).encode()
+
+    body = read_coalescer.do(key, run)
+    return Response(content=body, media_type='application/json')
@@ -0,0 +1,163 @@
+"""Small AIP-160 style filter grammar compiled to SQLAlchemy expressions.
+
+Supported syntax:
+    expr   := seq (AND seq)*
+    seq    := factor (OR factor)*        # OR binds tighter than AND (AIP-160)
+    factor := '(' expr ')' | field op value
+    op     := = | != | < | <= | > | >=
+
+Values may be bare words (`ok`, `2025-01-01T00:00:00Z`) or double-quoted
+strings. Each distinct filter string is parsed and compiled once; the
+resulting expression is cached in an LRU and reused across requests.
+"""
+import re
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+
+class FilterError(ValueError):
+    """Raised when a filter string cannot be parsed or references unknown fields."""
+
+
+_TOKEN_RE = re.compile(
+    r'\s*(?:(?P<op><=|>=|!=|=|<|>)|(?P<paren>[()])|(?P<str>"(?:[^"\\]|\\.)*")|(?P<word>[^\s()<>=!"]+))'
+)
+
+_EQUALITY = frozenset({'=', '!='})
+_ORDERED = frozenset({'=', '!=', '<', '<=', '>', '>='})
+
+
+def parse_timestamp(value: str) -> datetime:
+    """Parse an RFC 3339 timestamp into a naive UTC datetime (the models store naive UTC)."""
+    try:
+        dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise FilterError(f'Invalid timestamp: {value}')
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+@dataclass(frozen=True)
+class FilterField:
+    column: Any
+    ops: FrozenSet[str] = _EQUALITY
+    parse: Callable[[str], Any] = str
+
+
+def string_field(column) -> FilterField:
+    return FilterField(column=column, ops=_EQUALITY)
+
+
+def timestamp_field(column) -> FilterField:
+    return FilterField(column=column, ops=_ORDERED, parse=parse_timestamp)
+
+
+def _tokenize(text: str) -> List[Tuple[str, str]]:
+    tokens: List[Tuple[str, str]] = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        m = _TOKEN_RE.match(text, pos)
+        if not m or m.end() == pos:
+            raise FilterError(f'Unexpected input at position {pos}')
+        kind = m.lastgroup
+        value = m.group(kind)
+        if kind == 'str':
+            value = re.sub(r'\\(.)', r'\1', value[1:-1])
+        tokens.append((kind, value))
+        pos = m.end()
+    return tokens
+
+
+class _Parser:
+    def __init__(self, tokens: List[Tuple[str, str]], fields: Dict[str, FilterField]):
+        self.tokens = tokens
+        self.fields = fields
+        self.pos = 0
+
+    def _peek(self) -> Optional[Tuple[str, str]]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _next(self) -> Tuple[str, str]:
+        tok = self._peek()
+        if tok is None:
+            raise FilterError('Unexpected end of filter')
+        self.pos += 1
+        return tok
+
+    def _keyword(self, word: str) -> bool:
+        tok = self._peek()
+        if tok == ('word', word):
+            self.pos += 1
+            return True
+        return False
+
+    def parse(self):
+        expr = self._expr()
+        if self._peek() is not None:
+            raise FilterError(f'Unexpected token: {self._peek()[1]}')
+        return expr
+
+    def _expr(self):
+        parts = [self._seq()]
+        while self._keyword('AND'):
+            parts.append(self._seq())
+        return parts[0] if len(parts) == 1 else and_(*parts)
+
+    def _seq(self):
+        parts = [self._factor()]
+        while self._keyword('OR'):
+            parts.append(self._factor())
+        return parts[0] if len(parts) == 1 else or_(*parts)
+
+    def _factor(self):
+        kind, value = self._next()
+        if (kind, value) == ('paren', '('):
+            expr = self._expr()
+            if self._next() != ('paren', ')'):
+                raise FilterError('Expected )')
+            return expr
+        if kind != 'word':
+            raise FilterError(f'Expected field name, got {value}')
+        field = self.fields.get(value)
+        if field is None:
+            raise FilterError(f'Unknown filter field: {value}')
+        op_kind, op = self._next()
+        if op_kind != 'op' or op not in field.ops:
+            raise FilterError(f'Unsupported operator for {value}: {op}')
+        val_kind, raw = self._next()
+        if val_kind not in ('word', 'str'):
+            raise FilterError(f'Expected value for {value}')
+        return _compare(field.column, op, field.parse(raw))
+
+
+def _compare(column, op: str, value):
+    if op == '=':
+        return column == value
+    if op == '!=':
+        return column != value
+    if op == '<':
+        return column < value
+    if op == '<=':
+        return column <= value
+    if op == '>':
+        return column > value
+    return column >= value
+
+
+class FilterCompiler:
+    """Compile filter strings against a fixed field table, caching by string."""
+
+    def __init__(self, fields: Dict[str, FilterField], maxsize: int = 256):
+        self.fields = fields
+        self.compile = lru_cache(maxsize=maxsize)(self._compile)
+
+    def _compile(self, text: str):
+        if not text or not text.strip():
+            return None
+        return _Parser(_tokenize(text), self.fields).parse()
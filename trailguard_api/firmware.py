@@ -0,0 +1,88 @@
+"""Firmware release manifest.
+
+The manifest is a JSON file (``FIRMWARE_MANIFEST_PATH``)::
+
+    {"latest": "1.2.3",
+     "releases": [{"version": "1.2.3", "releaseNotes": "..."}]}
+
+It is parsed once and kept in memory. The file's mtime is checked at most
+every ``FIRMWARE_MANIFEST_CHECK_SECONDS`` and the manifest is reloaded when it
+changes, so publishing a release is just replacing the file. If the file is
+missing or invalid the last good manifest (initially the built-in default) is
+kept.
+"""
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Optional
+
+MANIFEST_PATH = os.getenv('FIRMWARE_MANIFEST_PATH', 'firmware/manifest.json')
+CHECK_SECONDS = float(os.getenv('FIRMWARE_MANIFEST_CHECK_SECONDS', '5'))
+
+
+@dataclass(frozen=True)
+class Manifest:
+    latest: str
+    release_notes: Dict[str, Optional[str]] = field(default_factory=dict)
+
+    def has_release(self, version: str) -> bool:
+        return version in self.release_notes
+
+    def notes(self, version: str) -> Optional[str]:
+        return self.release_notes.get(version)
+
+
+DEFAULT_MANIFEST = Manifest(
+    latest='1.2.3', release_notes={'1.2.3': 'Improved GPS accuracy and battery reporting.'}
+)
+
+
+def parse_manifest(data: dict) -> Manifest:
+    notes = {str(r['version']): r.get('releaseNotes') for r in data.get('releases', [])}
+    latest = str(data['latest'])
+    notes.setdefault(latest, None)
+    return Manifest(latest=latest, release_notes=notes)
+
+
+class ManifestCache:
+    def __init__(self, path: str, check_seconds: float = CHECK_SECONDS):
+        self.path = Path(path)
+        self.check_seconds = check_seconds
+        self._manifest = DEFAULT_MANIFEST
+        self._mtime: Optional[int] = None
+        self._checked = float('-inf')
+        self._lock = threading.Lock()
+
+    def get(self) -> Manifest:
+        now = time.monotonic()
+        if now - self._checked < self.check_seconds:
+            return self._manifest
+        with self._lock:
+            if now - self._checked >= self.check_seconds:
+                self._checked = now
+                self._reload_if_changed()
+        return self._manifest
+
+    def _reload_if_changed(self) -> None:
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            self._manifest = parse_manifest(json.loads(self.path.read_text()))
+        except (OSError, ValueError, KeyError, TypeError):
+            # Keep serving the last good manifest; a half-written file is retried next check
+            return
+        self._mtime = mtime
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._checked = float('-inf')
+
+
+manifest_cache = ManifestCache(MANIFEST_PATH)
@@ -0,0 +1,281 @@
+"""Quadkey-aggregated breadcrumb counts for fleet heatmap tiles.
+
+Every slippy-map tile (z, x, y) up to ``HEATMAP_MAX_ZOOM`` is served as a
+``GRID x GRID`` grid of counts. Cell (i, j) of tile (z, x, y) is the tile at
+zoom ``z + GRID_BITS``, so all cells for all tile zooms live in one table keyed
+by (cell zoom, quadkey) where the quadkey is the Morton interleave of the
+cell's x/y. A tile's cells are then one contiguous quadkey range.
+
+Ingest calls ``record`` after each batch commits: the batch is binned at the
+finest zoom with NumPy and rolled up to every coarser zoom by shifting the
+quadkeys. The counts are buffered in memory and ``flush`` upserts them as
+``count = count + n`` in its own short transaction, every
+``HEATMAP_FLUSH_SECONDS``. Coarse cells are shared by the whole fleet, so
+writing them inside each ingest transaction would serialize all ingest on
+their row locks. With several shards each shard counts its own users'
+breadcrumbs and ``shard_tile_grid`` sums them.
+
+Counts are approximate: tiles lag ingest by up to one flush interval, a
+worker that dies loses its unflushed counts, and breadcrumbs that retention
+downsamples or deletes are never subtracted. Archiving keeps counting moved
+rows, and ``--rebuild`` counts the archive too, but segment files removed
+by hand drift the same way. ``python -m trailguard_api.heatmap --rebuild``
+recomputes everything from the stored and archived breadcrumbs.
+"""
+import argparse
+import asyncio
+import logging
+import math
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from . import archive, models
+
+HEATMAP_ENABLED = os.getenv('HEATMAP_ENABLED', '1') not in ('0', 'false', 'False')
+MAX_TILE_ZOOM = int(os.getenv('HEATMAP_MAX_ZOOM', '14'))
+FLUSH_SECONDS = float(os.getenv('HEATMAP_FLUSH_SECONDS', '2'))
+GRID_BITS = 5
+GRID = 1 << GRID_BITS
+_MAX_LAT = 85.05112878
+_REBUILD_CHUNK = 50_000
+# (cell zoom << _ZOOM_SHIFT) | quadkey packs a cell into one uint64; quadkeys use 2 * 24 bits at most
+_ZOOM_SHIFT = np.uint64(58)
+_KEY_MASK = np.uint64((1 << 58) - 1)
+# Merge buffered batches once this many have piled up between flushes
+_COMPACT_AFTER = 64
+
+logger = logging.getLogger(__name__)
+
+
+def _spread(v: np.ndarray) -> np.ndarray:
+    """Insert a zero bit between each of the low 32 bits of ``v``."""
+    v = v.astype(np.uint64)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x0000FFFF0000FFFF)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x00FF00FF00FF00FF)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x3333333333333333)
+    v = (v | (v << np.uint64(1))) & np.uint64(0x5555555555555555)
+    return v
+
+
+def _compact(v: np.ndarray) -> np.ndarray:
+    """Inverse of ``_spread``: gather every other bit."""
+    v = v.astype(np.uint64) & np.uint64(0x5555555555555555)
+    v = (v | (v >> np.uint64(1))) & np.uint64(0x3333333333333333)
+    v = (v | (v >> np.uint64(2))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    v = (v | (v >> np.uint64(4))) & np.uint64(0x00FF00FF00FF00FF)
+    v = (v | (v >> np.uint64(8))) & np.uint64(0x0000FFFF0000FFFF)
+    v = (v | (v >> np.uint64(16))) & np.uint64(0x00000000FFFFFFFF)
+    return v
+
+
+def quadkeys(lat: Sequence[float], lng: Sequence[float], zoom: int) -> np.ndarray:
+    """Web Mercator tile quadkeys (as integers) of each point at ``zoom``."""
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -_MAX_LAT, _MAX_LAT)
+    lng = np.asarray(lng, dtype=np.float64)
+    n = float(1 << zoom)
+    x = np.clip(((lng + 180.0) / 360.0 * n).astype(np.int64), 0, (1 << zoom) - 1)
+    s = np.sin(np.radians(lat))
+    y = np.clip(((0.5 - np.log((1 + s) / (1 - s)) / (4 * math.pi)) * n).astype(np.int64), 0, (1 << zoom) - 1)
+    return _spread(x) | (_spread(y) << np.uint64(1))
+
+
+def _insert_for(db: Session):
+    if db.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def _cells(lat: Sequence[float], lng: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+    """Packed cells at every zoom level and their point counts."""
+    finest = MAX_TILE_ZOOM + GRID_BITS
+    keys = quadkeys(lat, lng, finest)
+    levels = [
+        (np.uint64(cell_zoom) << _ZOOM_SHIFT) | (keys >> np.uint64(2 * (finest - cell_zoom)))
+        for cell_zoom in range(GRID_BITS, finest + 1)
+    ]
+    return np.unique(np.concatenate(levels), return_counts=True)
+
+
+def _merge(cells: np.ndarray, counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    uniq, inverse = np.unique(cells, return_inverse=True)
+    return uniq, np.bincount(inverse, weights=counts, minlength=len(uniq)).astype(np.int64)
+
+
+def _upsert(db: Session, cells: np.ndarray, counts: np.ndarray) -> None:
+    rows = [
+        {'zoom': int(c >> _ZOOM_SHIFT), 'quadkey': int(c & _KEY_MASK), 'count': int(n)}
+        for c, n in zip(cells, counts)
+    ]
+    # Sorted by (zoom, quadkey), so concurrent flushes take row locks in the
+    # same order and can't deadlock each other.
+    table = models.HeatmapCell.__table__
+    stmt = _insert_for(db)(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.zoom, table.c.quadkey], set_={'count': table.c.count + stmt.excluded['count']}
+    )
+    db.execute(stmt, rows)
+
+
+class _Pending:
+    """Counts waiting for ``flush``, per shard engine."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._batches: Dict[object, List[Tuple[np.ndarray, np.ndarray]]] = {}
+
+    def add(self, bind, cells: np.ndarray, counts: np.ndarray) -> None:
+        with self._lock:
+            batches = self._batches.setdefault(bind, [])
+            batches.append((cells, counts))
+            if len(batches) >= _COMPACT_AFTER:
+                batches[:] = [_merge(np.concatenate([c for c, _ in batches]), np.concatenate([n for _, n in batches]))]
+
+    def take(self) -> Dict[object, Tuple[np.ndarray, np.ndarray]]:
+        with self._lock:
+            batches, self._batches = self._batches, {}
+        return {
+            bind: _merge(np.concatenate([c for c, _ in b]), np.concatenate([n for _, n in b]))
+            for bind, b in batches.items()
+        }
+
+
+_pending = _Pending()
+
+
+def record(db: Session, lat: Sequence[float], lng: Sequence[float]) -> None:
+    """Queue a committed batch of points for the next ``flush`` of ``db``'s shard.
+
+    Call it after the ingest commits; with ``HEATMAP_FLUSH_SECONDS=0`` the
+    counts are written straight away in a separate transaction.
+    """
+    if not HEATMAP_ENABLED or len(lat) == 0:
+        return
+    bind = db.get_bind()
+    _pending.add(bind, *_cells(lat, lng))
+    if FLUSH_SECONDS <= 0:
+        flush()
+
+
+def flush() -> int:
+    """Write the buffered counts, one short transaction per shard; returns cells written."""
+    written = 0
+    for bind, (cells, counts) in _pending.take().items():
+        db = Session(bind=bind)
+        try:
+            _upsert(db, cells, counts)
+            db.commit()
+            written += len(cells)
+        except Exception:
+            db.rollback()
+            # Keep the counts for the next attempt
+            _pending.add(bind, cells, counts)
+            raise
+        finally:
+            db.close()
+    return written
+
+
+async def run_periodically(interval: float = FLUSH_SECONDS):
+    """Background loop for the API lifespan; each flush runs in a worker thread."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(flush)
+        except Exception:
+            logger.exception('heatmap flush failed')
+
+
+def tile_grid(db: Session, z: int, x: int, y: int) -> np.ndarray:
+    """Counts for tile (z, x, y) as a ``GRID x GRID`` uint32 array, row 0 at the north edge."""
+    tile_key = int((_spread(np.array([x])) | (_spread(np.array([y])) << np.uint64(1)))[0])
+    lo = tile_key << (2 * GRID_BITS)
+    hi = (tile_key + 1) << (2 * GRID_BITS)
+    C = models.HeatmapCell
+    rows = db.execute(
+        select(C.quadkey, C.count).where(C.zoom == z + GRID_BITS, C.quadkey >= lo, C.quadkey < hi)
+    ).all()
+    grid = np.zeros((GRID, GRID), dtype=np.uint32)
+    if rows:
+        local = np.array([r[0] for r in rows], dtype=np.uint64) - np.uint64(lo)
+        counts = np.array([r[1] for r in rows], dtype=np.uint64)
+        cx = _compact(local).astype(np.intp)
+        cy = _compact(local >> np.uint64(1)).astype(np.intp)
+        grid[cy, cx] = np.minimum(counts, np.iinfo(np.uint32).max)
+    return grid
+
+
+def shard_tile_grid(dbs: Sequence[Session], z: int, x: int, y: int) -> np.ndarray:
+    """``tile_grid`` summed over one session per shard."""
+    if len(dbs) == 1:
+        return tile_grid(dbs[0], z, x, y)
+    total = np.zeros((GRID, GRID), dtype=np.uint64)
+    for db in dbs:
+        total += tile_grid(db, z, x, y)
+    return np.minimum(total, np.iinfo(np.uint32).max).astype(np.uint32)
+
+
+def rebuild(db: Session, chunk: int = _REBUILD_CHUNK, archived: bool = True) -> int:
+    """Recompute all cells from the breadcrumbs table and the cold-tier archive.
+
+    Meant to be run offline: tiles are incomplete until it finishes. The
+    archive is shared by all shards, so only one shard should count it.
+    """
+    db.execute(delete(models.HeatmapCell))
+    B = models.Breadcrumb
+    total = 0
+    last_id: Optional[str] = None
+    while True:
+        q = select(B.id, B.lat, B.lng).order_by(B.id).limit(chunk)
+        if last_id is not None:
+            q = q.where(B.id > last_id)
+        rows = db.execute(q).all()
+        if not rows:
+            break
+        _upsert(db, *_cells([r.lat for r in rows], [r.lng for r in rows]))
+        db.commit()
+        total += len(rows)
+        last_id = rows[-1].id
+    # Archived history counts too; segment columns are zero-copy NumPy views
+    root = Path(archive.ARCHIVE_DIR)
+    device_dirs = sorted(p.name for p in root.iterdir() if p.is_dir()) if archived and root.is_dir() else []
+    for device_id in device_dirs:
+        for path in archive.segment_paths(device_id):
+            with archive.open_segment(path) as seg:
+                for i in range(0, seg.count, chunk):
+                    _upsert(db, *_cells(seg.lat[i:i + chunk], seg.lng[i:i + chunk]))
+                    db.commit()
+                total += seg.count
+    db.commit()
+    return total
+
+
+def main():  # pragma: no cover
+    from .database import shard_map
+
+    parser = argparse.ArgumentParser(description='Maintain breadcrumb heatmap tiles.')
+    parser.add_argument('--rebuild', action='store_true', help='Recompute all cells from breadcrumbs')
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.print_help()
+        return
+    total = 0
+    for i, factory in enumerate(shard_map.sessionmakers):
+        db = factory()
+        try:
+            total += rebuild(db, archived=i == 0)
+        finally:
+            db.close()
+    print(f'rebuilt heatmap from {total} breadcrumbs')
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
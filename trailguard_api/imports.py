@@ -0,0 +1,161 @@
+"""GPX/KML breadcrumb imports.
+
+``POST .../breadcrumbs:import`` streams the upload to ``BREADCRUMB_IMPORT_DIR``
+and records a ``breadcrumb_imports`` row. An import thread then hands the
+file to a process pool worker (``trackfiles.parse_into``) and feeds the
+chunks it sends back through the batch ingest path: ``validate``,
+``filter_points``, ``insert_columns``, then the heatmap. Each chunk is one
+transaction that also updates the job's progress, which
+``GET .../breadcrumbImports/{id}`` reports.
+
+Parsing runs in another process, so a file of hundreds of MB neither holds
+the GIL nor ties up the request thread pool. The queue between the worker
+and the import thread holds at most ``_QUEUE_CHUNKS`` chunks, so memory
+stays bounded when the database is slower than the parser.
+
+A job whose API process exits mid-import stays RUNNING; upload the file
+again. Points without a time in the file are recorded at the import time.
+"""
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional, Tuple
+
+import numpy as np
+
+from . import changes, heatmap, ingest, models, trackfiles
+from .database import open_shards
+
+IMPORT_DIR = os.getenv('BREADCRUMB_IMPORT_DIR', 'data/breadcrumb_imports')
+IMPORT_MAX_BYTES = int(os.getenv('BREADCRUMB_IMPORT_MAX_BYTES', str(1 << 30)))
+IMPORT_WORKERS = int(os.getenv('BREADCRUMB_IMPORT_WORKERS', '2'))
+CHUNK_POINTS = int(os.getenv('BREADCRUMB_IMPORT_CHUNK_POINTS', '5000'))
+_QUEUE_CHUNKS = 4
+_GET_TIMEOUT_SECONDS = 0.5
+_EPOCH = datetime(1970, 1, 1)
+
+logger = logging.getLogger(__name__)
+
+# Spawned, not forked: the API process has threads and open connections
+_mp = multiprocessing.get_context('spawn')
+_lock = threading.Lock()
+_parsers: Optional[ProcessPoolExecutor] = None
+_runners: Optional[ThreadPoolExecutor] = None
+_manager = None
+
+
+def _executors() -> Tuple[ProcessPoolExecutor, ThreadPoolExecutor]:
+    global _parsers, _runners, _manager
+    with _lock:
+        if _parsers is None:
+            _manager = _mp.Manager()
+            _parsers = ProcessPoolExecutor(max_workers=IMPORT_WORKERS, mp_context=_mp)
+            # One runner per parser, so a queued job waits here rather than parsing into a full queue
+            _runners = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix='breadcrumb-import')
+        return _parsers, _runners
+
+
+def shutdown() -> None:
+    global _parsers, _runners, _manager
+    with _lock:
+        if _parsers is None:
+            return
+        _runners.shutdown(wait=False, cancel_futures=True)
+        _parsers.shutdown(wait=False, cancel_futures=True)
+        _manager.shutdown()
+        _parsers = _runners = _manager = None
+
+
+def upload_path(job_id: str) -> str:
+    return os.path.join(IMPORT_DIR, f'{job_id}.upload')
+
+
+def start(job_id: str, user_id: str, device_id: str, fmt: str, path: str) -> Future:
+    _, runners = _executors()
+    return runners.submit(run, job_id, user_id, device_id, fmt, path)
+
+
+def _next_chunk(out, parsed: Future) -> Optional[trackfiles.Chunk]:
+    while True:
+        try:
+            return out.get(timeout=_GET_TIMEOUT_SECONDS)
+        except queue.Empty:
+            if parsed.done():
+                # A worker that died without sending the end marker raises here
+                parsed.result()
+                try:
+                    return out.get_nowait()
+                except queue.Empty:
+                    return None
+
+
+def run(job_id: str, user_id: str, device_id: str, fmt: str, path: str) -> None:
+    """Parse ``path`` in the process pool and insert its points chunk by chunk."""
+    parsers, _ = _executors()
+    out, stop = _manager.Queue(maxsize=_QUEUE_CHUNKS), _manager.Event()
+    dbs = open_shards()
+    db = dbs.for_user(user_id)
+    state, error = 'SUCCEEDED', None
+    try:
+        job = db.get(models.BreadcrumbImport, job_id)
+        parsed = parsers.submit(trackfiles.parse_into, path, fmt, out, stop, CHUNK_POINTS)
+        prev = ingest.last_kept(db, device_id)
+        while True:
+            chunk = _next_chunk(out, parsed)
+            if chunk is None:
+                break
+            n = len(chunk.lat)
+            now = datetime.utcnow()
+            # Planned routes carry no times: store them at the import time, but
+            # keep them out of the speed check, which would see every step as instant
+            untimed = np.isnan(chunk.t)
+            if untimed.all():
+                t, untimed = None, None
+            else:
+                t = np.where(untimed, (now - _EPOCH).total_seconds(), chunk.t)
+                untimed = untimed if untimed.any() else None
+            try:
+                cols = ingest.validate(ingest.Columns(t=t, lat=chunk.lat, lng=chunk.lng, acc=np.full(n, np.nan)), now)
+            except ingest.IngestError as e:
+                raise ingest.IngestError(f'{e} (in points {job.points_parsed}-{job.points_parsed + n - 1})')
+            kept = ingest.filter_points(cols, prev, untimed=untimed)
+            if len(kept):
+                ingest.insert_columns(db, device_id, kept, now, change_seq=changes.bump(db, user_id))
+                prev = ingest.Point(
+                    t=float(kept.t[-1]) if kept.t is not None else None, lat=float(kept.lat[-1]), lng=float(kept.lng[-1])
+                )
+            job.bytes_read = chunk.bytes_read
+            job.points_parsed += n
+            job.created_count += len(kept)
+            job.dropped_count += n - len(kept)
+            job.update_time = now
+            db.commit()
+            if len(kept):
+                heatmap.record(db, kept.lat, kept.lng)
+        parsed.result()
+    except (trackfiles.TrackFileError, ingest.IngestError) as e:
+        state, error = 'FAILED', str(e)
+    except Exception:
+        logger.exception('breadcrumb import %s failed', job_id)
+        state, error = 'FAILED', 'Import failed'
+    finally:
+        stop.set()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    try:
+        # Chunks already committed stay; only the failed one is rolled back
+        db.rollback()
+        job = db.get(models.BreadcrumbImport, job_id)
+        if job is not None:
+            job.state, job.error, job.update_time = state, error, datetime.utcnow()
+            if state == 'SUCCEEDED':
+                job.bytes_read = job.total_bytes
+            db.commit()
+    finally:
+        dbs.close()
@@ -0,0 +1,293 @@
+"""Columnar breadcrumb ingest.
+
+Batches are handled as NumPy columns from validation through to the insert:
+range checks run on whole arrays and the bulk insert takes its parameters
+straight from the columns. The nested ``breadcrumbs`` format is converted to
+the same columns so both share one path.
+
+Before the insert, ``filter_points`` drops GPS jitter: points with a worse
+accuracy than ``INGEST_MAX_ACCURACY_METERS``, speed spikes faster than
+``INGEST_MAX_SPEED_MPS``, and points closer than ``INGEST_MIN_DISTANCE_METERS``
+to the previous kept point. The previous kept point of an earlier batch is
+the device's newest stored breadcrumb (``last_kept``), so a stationary
+tracker stops adding rows across batches too. ``0`` disables a check.
+"""
+import os
+from datetime import datetime, timezone
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from . import models, retention, schemas
+
+MAX_COLUMNAR_POINTS = 10_000
+# Device clocks drift; anything further ahead than this is a bad timestamp
+_MAX_FUTURE_SKEW_SECONDS = 24 * 3600
+_EARTH_RADIUS_METERS = 6_371_008.8
+# Points compared against the current anchor per vectorized step while thinning
+_THIN_WINDOW = 256
+_EPOCH = datetime(1970, 1, 1)
+# Column name -> field of the nested {"breadcrumbs": [{"position": ...}]} format
+_NESTED_FIELDS = {'lat': 'latitude', 'lng': 'longitude'}
+
+
+class PointFilter(NamedTuple):
+    max_accuracy_m: float
+    min_distance_m: float
+    max_speed_mps: float
+
+
+FILTER = PointFilter(
+    max_accuracy_m=float(os.getenv('INGEST_MAX_ACCURACY_METERS', '100')),
+    min_distance_m=float(os.getenv('INGEST_MIN_DISTANCE_METERS', '5')),
+    max_speed_mps=float(os.getenv('INGEST_MAX_SPEED_MPS', '150')),
+)
+
+
+class IngestError(ValueError):
+    """The batch is malformed or has out-of-range values.
+
+    ``loc`` locates the bad value in the request body, FastAPI-style, when
+    there is one.
+    """
+
+    def __init__(self, message: str, loc: Tuple = ()):
+        super().__init__(message)
+        self.loc = loc
+
+
+class Columns(NamedTuple):
+    t: Optional[np.ndarray]  # Unix seconds, float64; None means "now"
+    lat: np.ndarray
+    lng: np.ndarray
+    acc: np.ndarray  # float64, NaN when unknown
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+
+class Point(NamedTuple):
+    t: Optional[float]  # Unix seconds
+    lat: float
+    lng: float
+
+
+def _column(name: str, values, n: int) -> np.ndarray:
+    try:
+        arr = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise IngestError(f'{name} must be an array of numbers')
+    if arr.ndim != 1 or len(arr) != n:
+        raise IngestError(f'{name} must have the same length as lat ({n})')
+    return arr
+
+
+def _first_bad(mask: np.ndarray) -> int:
+    return int(np.flatnonzero(mask)[0])
+
+
+def is_columnar(payload: schemas.BreadcrumbBatchCreateRequest) -> bool:
+    return payload.lat is not None or payload.lng is not None
+
+
+def from_request(payload: schemas.BreadcrumbBatchCreateRequest, now: datetime) -> Columns:
+    """Validate either batch format and return its columns."""
+    columnar = is_columnar(payload)
+    if columnar == (payload.breadcrumbs is not None):
+        raise IngestError('Provide either breadcrumbs or the lat/lng columns', loc=('breadcrumbs',))
+    if not columnar:
+        n = len(payload.breadcrumbs)
+        lat = np.fromiter((b.position.latitude for b in payload.breadcrumbs), dtype=np.float64, count=n)
+        lng = np.fromiter((b.position.longitude for b in payload.breadcrumbs), dtype=np.float64, count=n)
+        try:
+            return validate(Columns(t=None, lat=lat, lng=lng, acc=np.full(n, np.nan)), now)
+        except IngestError as e:
+            name, i = e.loc
+            raise IngestError(str(e), loc=('breadcrumbs', i, 'position', _NESTED_FIELDS[name]))
+    if payload.lat is None or payload.lng is None:
+        raise IngestError('lat and lng are both required')
+    n = len(payload.lat)
+    if n > MAX_COLUMNAR_POINTS:
+        raise IngestError(f'At most {MAX_COLUMNAR_POINTS} points per batch')
+    cols = Columns(
+        t=_column('t', payload.t, n) if payload.t is not None else None,
+        lat=_column('lat', payload.lat, n),
+        lng=_column('lng', payload.lng, n),
+        acc=_column('acc', payload.acc, n) if payload.acc is not None else np.full(n, np.nan),
+    )
+    return validate(cols, now)
+
+
+def validate(cols: Columns, now: datetime) -> Columns:
+    """Whole-array range checks; the error names the first offending index."""
+    checks = [
+        ('lat', ~(np.abs(cols.lat) <= 90.0)),
+        ('lng', ~(np.abs(cols.lng) <= 180.0)),
+        # NaN accuracy means unknown; only negatives and infinities are wrong
+        ('acc', (cols.acc < 0) | np.isinf(cols.acc)),
+    ]
+    if cols.t is not None:
+        latest = (now - datetime(1970, 1, 1)).total_seconds() + _MAX_FUTURE_SKEW_SECONDS
+        checks.append(('t', ~((cols.t > 0) & (cols.t <= latest))))
+    for name, bad in checks:
+        if bad.any():
+            i = _first_bad(bad)
+            raise IngestError(f'{name}[{i}] is out of range', loc=(name, i))
+    return cols
+
+
+def take(cols: Columns, idx: np.ndarray) -> Columns:
+    return Columns(
+        t=cols.t[idx] if cols.t is not None else None, lat=cols.lat[idx], lng=cols.lng[idx], acc=cols.acc[idx]
+    )
+
+
+def distance_m(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """Haversine distance in meters; broadcasts like any NumPy expression."""
+    p1, p2 = np.radians(lat1), np.radians(lat2)
+    dp, dl = p2 - p1, np.radians(np.asarray(lng2) - np.asarray(lng1))
+    h = np.sin(dp / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(dl / 2) ** 2
+    return 2 * _EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+
+
+def last_kept(db: Session, device_id: str) -> Optional[Point]:
+    """The device's newest stored breadcrumb, which the next batch is thinned against."""
+    B = models.Breadcrumb
+    row = db.execute(
+        select(B.recorded_at, B.lat, B.lng)
+        .where(B.device_id == device_id, B.recorded_at.isnot(None))
+        .order_by(B.recorded_at.desc())
+        .limit(1)
+    ).first()
+    if row is None:
+        return None
+    recorded = row.recorded_at
+    if recorded.tzinfo is not None:
+        recorded = recorded.astimezone(timezone.utc).replace(tzinfo=None)
+    return Point(t=(recorded - _EPOCH).total_seconds(), lat=row.lat, lng=row.lng)
+
+
+def _too_fast(lat1, lng1, t1, lat2, lng2, t2, max_speed: float) -> np.ndarray:
+    dt = np.asarray(t2) - np.asarray(t1)
+    # Timestamps are whole seconds on most trackers; don't divide by zero
+    return (dt >= 0) & (distance_m(lat1, lng1, lat2, lng2) > max_speed * np.maximum(dt, 1.0))
+
+
+def _speed_spikes(lat, lng, t, prev: Optional[Point], max_speed: float) -> np.ndarray:
+    """Points reached too fast from their predecessor and left too fast for their successor.
+
+    Requiring both edges singles out the spike rather than the good point
+    next to it. The newest point has no successor yet, so it is checked
+    against the last point that survived instead.
+    """
+    anchored = prev is not None and prev.t is not None
+    if anchored:
+        lat, lng, t = np.r_[prev.lat, lat], np.r_[prev.lng, lng], np.r_[prev.t, t]
+    if len(lat) < 2:
+        # A lone point with nothing to compare against
+        return np.zeros(len(lat), dtype=bool)
+    fast = _too_fast(lat[:-1], lng[:-1], t[:-1], lat[1:], lng[1:], t[1:], max_speed)
+    # spike[i]: the edges into and out of point i are both too fast
+    spike = np.r_[False, fast[:-1] & fast[1:], False]
+    ok = np.flatnonzero(~spike[:-1])
+    if len(ok) and ok[-1] < len(lat) - 1:
+        j = ok[-1]
+        spike[-1] = bool(_too_fast(lat[j], lng[j], t[j], lat[-1], lng[-1], t[-1], max_speed))
+    return spike[1:] if anchored else spike
+
+
+def _thin(lat, lng, prev: Optional[Point], min_distance: float) -> np.ndarray:
+    """Mask of points at least ``min_distance`` from the previous kept point.
+
+    Greedy and order-dependent, but only the stretches where points bunch up
+    need a loop: a point far enough from its predecessor is kept outright
+    whenever that predecessor was kept, so whole runs of moving points are
+    accepted at once.
+    """
+    n = len(lat)
+    keep = np.zeros(n, dtype=bool)
+    # step[i]: distance from point i-1 to point i
+    step = np.r_[np.inf, distance_m(lat[:-1], lng[:-1], lat[1:], lng[1:])]
+    short = np.flatnonzero(step < min_distance)
+    # Without an earlier point the first one is kept
+    anchor, far_from = ((prev.lat, prev.lng), None) if prev is not None else (None, 0)
+    i = 0
+    while i < n:
+        if far_from is None:
+            window = slice(i, min(i + _THIN_WINDOW, n))
+            far = np.flatnonzero(distance_m(anchor[0], anchor[1], lat[window], lng[window]) >= min_distance)
+            if len(far) == 0:
+                i = window.stop
+                continue
+            far_from = i + int(far[0])
+        # Kept: far_from, then every following point until one is too close to its predecessor
+        pos = np.searchsorted(short, far_from + 1)
+        end = int(short[pos]) if pos < len(short) else n
+        keep[far_from:end] = True
+        anchor, i, far_from = (lat[end - 1], lng[end - 1]), end, None
+    return keep
+
+
+def filter_points(
+    cols: Columns, prev: Optional[Point], limits: Optional[PointFilter] = None, untimed: Optional[np.ndarray] = None
+) -> Columns:
+    """Drop inaccurate points, speed spikes and jitter around the previous kept point.
+
+    ``prev`` is the device's last kept point from an earlier batch, if any.
+    Points with ``t`` are handled in time order; the result is what to store.
+    ``untimed`` marks points whose ``t`` is a stand-in rather than a recorded
+    time (imports); they skip the speed check.
+    """
+    limits = limits or FILTER
+    if len(cols) == 0:
+        return cols
+    if cols.t is not None:
+        order = np.argsort(cols.t, kind='stable')
+        cols = take(cols, order)
+        untimed = untimed[order] if untimed is not None else None
+    idx = np.arange(len(cols))
+    if limits.max_accuracy_m > 0:
+        # Unknown (NaN) accuracy compares False and is kept
+        idx = idx[~(cols.acc > limits.max_accuracy_m)]
+    if limits.max_speed_mps > 0 and cols.t is not None and len(idx):
+        timed = idx if untimed is None else idx[~untimed[idx]]
+        if len(timed):
+            spikes = timed[_speed_spikes(cols.lat[timed], cols.lng[timed], cols.t[timed], prev, limits.max_speed_mps)]
+            idx = np.setdiff1d(idx, spikes, assume_unique=True)
+    if limits.min_distance_m > 0 and len(idx):
+        idx = idx[_thin(cols.lat[idx], cols.lng[idx], prev, limits.min_distance_m)]
+    return take(cols, idx)
+
+
+def insert_columns(db: Session, device_id: str, cols: Columns, now: datetime, change_seq: int = 0) -> int:
+    """Bulk insert the batch with one executemany, inside the caller's transaction."""
+    n = len(cols)
+    if n == 0:
+        return 0
+    if cols.t is None:
+        recorded: List = [now] * n
+    else:
+        recorded = (cols.t * 1e6).astype(np.int64).astype('datetime64[us]').tolist()
+        # Points behind the device's downsampling mark, where retention no longer
+        # looks, pull the mark back; the UPDATE compares against the stored mark
+        # (whatever window the retention run used) and matches nothing otherwise
+        retention.reopen(db, device_id, recorded[int(np.argmin(cols.t))])
+    acc = np.where(np.isnan(cols.acc), None, cols.acc).tolist()
+    db.execute(
+        insert(models.Breadcrumb),
+        [
+            {
+                'device_id': device_id,
+                'recorded_at': r,
+                'lat': la,
+                'lng': ln,
+                'accuracy_meters': a,
+                'create_time': now,
+                'change_seq': change_seq,
+            }
+            for r, la, ln, a in zip(recorded, cols.lat.tolist(), cols.lng.tolist(), acc)
+        ],
+    )
+    return n
@@ -1,21 +1,34 @@
 from pathlib import Path
+import asyncio
 import os
 import sys
 import yaml
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from fastapi.responses import JSONResponse
 
 # Support running as a package or as a script
 try:
-    from .database import init_db, engine  # type: ignore
-    from .routers import checkins, sos, devices, breadcrumbs, family, settings  # type: ignore
+    from .database import init_db, engine, read_engine, open_shards, shard_map  # type: ignore
+    from .routers import checkins, sos, devices, breadcrumbs, family, settings, dashboard, dispatch, messages, heatmap, overdue, sync, imports  # type: ignore
+    from .sos_index import sos_index  # type: ignore
+    from .overdue import OVERDUE_MONITOR_ENABLED, overdue_monitor  # type: ignore
+    from . import heatmap as heatmap_cells, retention, sweeper  # type: ignore
+    from . import tracing  # type: ignore
+    from .tracing import TracingMiddleware, tracer  # type: ignore
+    from .imports import shutdown as shutdown_imports  # type: ignore
 except Exception:  # pragma: no cover
     # When executed as `python trailguard_api/main.py`, add project root to sys.path
     sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-    from trailguard_api.database import init_db, engine  # type: ignore
-    from trailguard_api.routers import checkins, sos, devices, breadcrumbs, family, settings  # type: ignore
+    from trailguard_api.database import init_db, engine, read_engine, open_shards, shard_map  # type: ignore
+    from trailguard_api.routers import checkins, sos, devices, breadcrumbs, family, settings, dashboard, dispatch, messages, heatmap, overdue, sync, imports  # type: ignore
+    from trailguard_api.sos_index import sos_index  # type: ignore
+    from trailguard_api.overdue import OVERDUE_MONITOR_ENABLED, overdue_monitor  # type: ignore
+    from trailguard_api import heatmap as heatmap_cells, retention, sweeper  # type: ignore
+    from trailguard_api import tracing  # type: ignore
+    from trailguard_api.tracing import TracingMiddleware, tracer  # type: ignore
+    from trailguard_api.imports import shutdown as shutdown_imports  # type: ignore
 
 
 def create_app() -> FastAPI:
@@ -23,7 +36,36 @@ def create_app() -> FastAPI:
     async def lifespan(app: FastAPI):
         # Initialize DB and run migrations on startup
         init_db()
+        # Warm the fleet-wide active-SOS index from the partial index, and the
+        # check-in deadlines from each user's newest check-in
+        dbs = open_shards()
+        try:
+            sos_index.rebuild(dbs.all())
+            if OVERDUE_MONITOR_ENABLED:
+                overdue_monitor.rebuild(dbs.all())
+        finally:
+            dbs.close()
+        tasks = []
+        # Per-shard maintenance: each shard gets its own retention and sweeper loop
+        for session_factory in shard_map.sessionmakers:
+            # Scheduled breadcrumb downsampling/expiry; off unless an interval is set
+            if retention.RETENTION_INTERVAL_SECONDS > 0:
+                tasks.append(asyncio.create_task(retention.run_periodically(session_factory)))
+            # Flip devices that stopped sending heartbeats to DEGRADED/OFFLINE
+            if sweeper.SWEEP_INTERVAL_SECONDS > 0:
+                tasks.append(asyncio.create_task(sweeper.run_periodically(session_factory)))
+        # Alert on missed check-in deadlines
+        if OVERDUE_MONITOR_ENABLED:
+            tasks.append(asyncio.create_task(overdue_monitor.run(open_shards)))
+        # Write buffered heatmap counts outside the ingest transactions
+        if heatmap_cells.HEATMAP_ENABLED and heatmap_cells.FLUSH_SECONDS > 0:
+            tasks.append(asyncio.create_task(heatmap_cells.run_periodically()))
         yield
+        for task in tasks:
+            task.cancel()
+        heatmap_cells.flush()
+        # Stop the GPX/KML import pool, if an import started it
+        shutdown_imports()
 
     app = FastAPI(lifespan=lifespan)
 
@@ -37,7 +79,10 @@ def create_app() -> FastAPI:
         allow_credentials=False,
         allow_methods=['*'],
         allow_headers=['*'],
+        expose_headers=['X-Trace-Id'],
     )
+    # Outermost, so the root span covers CORS handling and the whole response
+    app.add_middleware(TracingMiddleware)
 
     schema_path = Path('openapi.yaml')
     if schema_path.exists():
@@ -55,6 +100,13 @@ def create_app() -> FastAPI:
     app.include_router(breadcrumbs.router)
     app.include_router(family.router)
     app.include_router(settings.router)
+    app.include_router(dashboard.router)
+    app.include_router(dispatch.router)
+    app.include_router(messages.router)
+    app.include_router(heatmap.router)
+    app.include_router(overdue.router)
+    app.include_router(sync.router)
+    app.include_router(imports.router)
 
     @app.get('/db', tags=['Internal'])
     def db_info():
@@ -68,6 +120,8 @@ def create_app() -> FastAPI:
             'driver': engine.url.get_driver_name(),
             'ok': True,
             'error': None,
+            'readReplica': read_engine.url.render_as_string(hide_password=True) if read_engine is not engine else None,
+            'shards': [e.url.render_as_string(hide_password=True) for e in shard_map.engines],
         }
         try:
             with engine.connect() as conn:
@@ -77,6 +131,13 @@ def create_app() -> FastAPI:
             payload['error'] = str(e)
         return JSONResponse(payload)
 
+    @app.get('/traces', tags=['Internal'])
+    def recent_traces(limit: int = Query(20, ge=1, le=200), minDurationMs: float = Query(0, ge=0)):
+        """Most recent sampled request traces, newest first; 404 unless TRACES_ENDPOINT_ENABLED is set."""
+        if not tracing.TRACES_ENDPOINT_ENABLED:
+            raise HTTPException(status_code=404, detail='Not Found')
+        return JSONResponse({'traces': tracer.buffer.recent(limit, minDurationMs), 'sampleRate': tracer.sample_rate})
+
     return app
 
 
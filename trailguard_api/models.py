@@ -1,7 +1,12 @@
+import os
+import threading
+import time
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Integer, Boolean, ForeignKey, DateTime, Float, Text
+from sqlalchemy import Column, String, Integer, BigInteger, Boolean, ForeignKey, DateTime, Float, Text
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.types import TypeDecorator
 
 Base = declarative_base()
 
@@ -10,10 +15,42 @@ def uuid4_str() -> str:
     return str(uuid.uuid4())
 
 
+_uuid7_lock = threading.Lock()
+_uuid7_last = 0
+
+
+def uuid7_str() -> str:
+    """Time-ordered UUIDv7 (RFC 9562): 48-bit Unix milliseconds, then random bits.
+
+    New keys land at the right edge of the primary-key B-tree instead of on a
+    random page. Within a process ids strictly increase: ``rand_a`` holds a
+    12-bit counter for ids created in the same millisecond.
+    """
+    global _uuid7_last
+    stamp = (time.time_ns() // 1_000_000) << 12
+    with _uuid7_lock:
+        stamp = _uuid7_last = max(stamp, _uuid7_last + 1)
+    rand_b = int.from_bytes(os.urandom(8), 'big') & ((1 << 62) - 1)
+    value = (stamp >> 12) << 80 | 0x7 << 76 | (stamp & 0xFFF) << 64 | 0b10 << 62 | rand_b
+    return str(uuid.UUID(int=value))
+
+
+class UUIDString(TypeDecorator):
+    """Native ``uuid`` on PostgreSQL, text elsewhere; Python always sees ``str``."""
+
+    impl = String
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(postgresql.UUID(as_uuid=False))
+        return dialect.type_descriptor(String())
+
+
 class User(Base):
     __tablename__ = 'users'
 
-    id = Column(String, primary_key=True, default=uuid4_str)
+    id = Column(UUIDString, primary_key=True, default=uuid4_str)
     email = Column(Text, unique=True)
     display_name = Column(Text)
     create_time = Column(DateTime(timezone=True), default=datetime.utcnow)
@@ -24,13 +61,14 @@ class User(Base):
 class Device(Base):
     __tablename__ = 'devices'
 
-    id = Column(String, primary_key=True, default=uuid4_str)
-    user_id = Column(String, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    id = Column(UUIDString, primary_key=True, default=uuid4_str)
+    user_id = Column(UUIDString, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     name = Column(Text)
     battery_percent = Column(Integer)
     solar = Column(Boolean, nullable=False, default=False)
     connection_state = Column(Text, default='OFFLINE')
     firmware_version = Column(Text)
+    firmware_target_version = Column(Text)
     last_seen_time = Column(DateTime(timezone=True))
     lat = Column(Float)
     lng = Column(Float)
@@ -39,6 +77,7 @@ class Device(Base):
     paired_at = Column(DateTime(timezone=True))
     create_time = Column(DateTime(timezone=True), default=datetime.utcnow)
     update_time = Column(DateTime(timezone=True), default=datetime.utcnow)
+    change_seq = Column(BigInteger, nullable=False, default=0)
 
     user = relationship('User', back_populates='devices')
     breadcrumbs = relationship('Breadcrumb', back_populates='device')
@@ -49,13 +88,14 @@ class Device(Base):
 class Breadcrumb(Base):
     __tablename__ = 'breadcrumbs'
 
-    id = Column(String, primary_key=True, default=uuid4_str)
-    device_id = Column(String, ForeignKey('devices.id', ondelete='CASCADE'), nullable=False)
+    id = Column(UUIDString, primary_key=True, default=uuid7_str)
+    device_id = Column(UUIDString, ForeignKey('devices.id', ondelete='CASCADE'), nullable=False)
     recorded_at = Column(DateTime(timezone=True), default=datetime.utcnow)
     lat = Column(Float, nullable=False)
     lng = Column(Float, nullable=False)
     accuracy_meters = Column(Float)
     create_time = Column(DateTime(timezone=True), default=datetime.utcnow)
+    change_seq = Column(BigInteger, nullable=False, default=0)
 
     device = relationship('Device', back_populates='breadcrumbs')
 
@@ -63,25 +103,38 @@ class Breadcrumb(Base):
 class CheckIn(Base):
     __tablename__ = 'check_ins'
 
-    id = Column(String, primary_key=True, default=uuid4_str)
-    user_id = Column(String, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
-    device_id = Column(String, ForeignKey('devices.id', ondelete='SET NULL'))
+    id = Column(UUIDString, primary_key=True, default=uuid7_str)
+    user_id = Column(UUIDString, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    device_id = Column(UUIDString, ForeignKey('devices.id', ondelete='SET NULL'))
     type = Column(Text, nullable=False)
     message = Column(Text)
     lat = Column(Float)
     lng = Column(Float)
     accuracy_meters = Column(Float)
     create_time = Column(DateTime(timezone=True), default=datetime.utcnow)
+    next_due_time = Column(DateTime(timezone=True))
+    change_seq = Column(BigInteger, nullable=False, default=0)
 
     user = relationship('User')
     device = relationship('Device', back_populates='check_ins')
 
 
+class CheckInDeadline(Base):
+    """Each user's current check-in deadline and whether it has alerted; see overdue."""
+
+    __tablename__ = 'check_in_deadlines'
+
+    user_id = Column(UUIDString, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    check_in_id = Column(UUIDString, ForeignKey('check_ins.id', ondelete='CASCADE'), nullable=False)
+    due_time = Column(DateTime(timezone=True), nullable=False)
+    alert_time = Column(DateTime(timezone=True))
+
+
 class SOSSession(Base):
     __tablename__ = 'sos_sessions'
 
-    id = Column(String, primary_key=True, default=uuid4_str)
-    user_id = Column(String, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    id = Column(UUIDString, primary_key=True, default=uuid4_str)
+    user_id = Column(UUIDString, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     message = Column(Text)
     start_time = Column(DateTime(timezone=True), default=datetime.utcnow)
     cancel_time = Column(DateTime(timezone=True))
@@ -91,38 +144,112 @@ class SOSSession(Base):
     create_time = Column(DateTime(timezone=True), default=datetime.utcnow)
 
 
+class SOSIndexVersion(Base):
+    """Single-row counter bumped on every SOS write; see sos_index."""
+
+    __tablename__ = 'sos_index_version'
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+
+class HeatmapCell(Base):
+    """Breadcrumb count for one heatmap cell; see heatmap."""
+
+    __tablename__ = 'heatmap_cells'
+
+    zoom = Column(Integer, primary_key=True)
+    quadkey = Column(BigInteger, primary_key=True, autoincrement=False)
+    count = Column(BigInteger, nullable=False, default=0)
+
+
 class FamilyMember(Base):
     __tablename__ = 'family_members'
 
-    id = Column(String, primary_key=True, default=uuid4_str)
-    user_id = Column(String, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    id = Column(UUIDString, primary_key=True, default=uuid4_str)
+    user_id = Column(UUIDString, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    # No foreign key: the member may live on another shard
+    member_user_id = Column(UUIDString, index=True)
     display_name = Column(Text, nullable=False)
     status = Column(Text)
     last_seen_time = Column(DateTime(timezone=True))
     create_time = Column(DateTime(timezone=True), default=datetime.utcnow)
+    change_seq = Column(BigInteger, nullable=False, default=0)
 
 
 class UserSetting(Base):
     __tablename__ = 'user_settings'
 
-    user_id = Column(String, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    user_id = Column(UUIDString, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
     auto_alerts = Column(Boolean, nullable=False, default=False)
     notify_contacts = Column(Boolean, nullable=False, default=False)
     sos_auto_call = Column(Boolean, nullable=False, default=False)
     geofence_radius_meters = Column(Integer, nullable=False, default=0)
     update_time = Column(DateTime(timezone=True), default=datetime.utcnow)
+    change_seq = Column(BigInteger, nullable=False, default=0)
 
 
 class Message(Base):
     __tablename__ = 'messages'
 
-    id = Column(String, primary_key=True, default=uuid4_str)
-    user_id = Column(String, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
-    device_id = Column(String, ForeignKey('devices.id', ondelete='SET NULL'))
+    id = Column(UUIDString, primary_key=True, default=uuid7_str)
+    user_id = Column(UUIDString, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    device_id = Column(UUIDString, ForeignKey('devices.id', ondelete='SET NULL'))
     text = Column(Text, nullable=False)
     lat = Column(Float)
     lng = Column(Float)
     accuracy_meters = Column(Float)
     create_time = Column(DateTime(timezone=True), default=datetime.utcnow)
+    change_seq = Column(BigInteger, nullable=False, default=0)
 
     device = relationship('Device', back_populates='messages')
+
+
+class UserChangeSeq(Base):
+    """Last change sequence number handed out per user; see changes."""
+
+    __tablename__ = 'user_change_seqs'
+
+    user_id = Column(UUIDString, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    seq = Column(BigInteger, nullable=False, default=0)
+
+
+class ChangeTombstone(Base):
+    """A deleted resource, kept so delta sync can report the deletion."""
+
+    __tablename__ = 'change_tombstones'
+
+    id = Column(UUIDString, primary_key=True, default=uuid7_str)
+    user_id = Column(UUIDString, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    seq = Column(BigInteger, nullable=False)
+    name = Column(Text, nullable=False)
+    delete_time = Column(DateTime(timezone=True), default=datetime.utcnow)
+
+
+class BreadcrumbImport(Base):
+    """A GPX/KML upload being parsed into a device's breadcrumbs; see imports."""
+
+    __tablename__ = 'breadcrumb_imports'
+
+    id = Column(UUIDString, primary_key=True, default=uuid7_str)
+    user_id = Column(UUIDString, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    device_id = Column(UUIDString, ForeignKey('devices.id', ondelete='CASCADE'), nullable=False)
+    format = Column(Text, nullable=False)
+    state = Column(Text, nullable=False, default='RUNNING')
+    total_bytes = Column(BigInteger, nullable=False, default=0)
+    bytes_read = Column(BigInteger, nullable=False, default=0)
+    points_parsed = Column(BigInteger, nullable=False, default=0)
+    created_count = Column(BigInteger, nullable=False, default=0)
+    dropped_count = Column(BigInteger, nullable=False, default=0)
+    error = Column(Text)
+    create_time = Column(DateTime(timezone=True), default=datetime.utcnow)
+    update_time = Column(DateTime(timezone=True), default=datetime.utcnow)
+
+
+class BreadcrumbRetentionMark(Base):
+    """Breadcrumbs recorded before ``downsampled_before`` are already thinned; see retention."""
+
+    __tablename__ = 'breadcrumb_retention_marks'
+
+    device_id = Column(UUIDString, ForeignKey('devices.id', ondelete='CASCADE'), primary_key=True)
+    downsampled_before = Column(DateTime(timezone=True), nullable=False)
@@ -0,0 +1,73 @@
+"""In-process wakeups for long-polling handlers.
+
+Long-poll handlers run on the event loop, while writes happen in sync route
+handlers on the thread pool, so ``notify`` hands wakeups to each waiter's loop
+with ``call_soon_threadsafe``. A waiter costs one future; nothing is kept for
+keys nobody is waiting on.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Hashable, Iterator, Set, Tuple
+
+_Waiter = Tuple[asyncio.AbstractEventLoop, asyncio.Future]
+
+
+class Subscription:
+    def __init__(self, future: asyncio.Future):
+        self._future = future
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait until notified or ``timeout`` elapses; True if notified."""
+        try:
+            await asyncio.wait_for(asyncio.shield(self._future), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class Notifier:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters: Dict[Hashable, Set[_Waiter]] = defaultdict(set)
+
+    @contextmanager
+    def subscribe(self, key: Hashable) -> Iterator[Subscription]:
+        """Register interest in ``key``.
+
+        Subscribe *before* reading current state so a write landing between the
+        read and the wait still wakes the subscriber.
+        """
+        loop = asyncio.get_running_loop()
+        waiter = (loop, loop.create_future())
+        with self._lock:
+            self._waiters[key].add(waiter)
+        try:
+            yield Subscription(waiter[1])
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(key)
+                if waiters is not None:
+                    waiters.discard(waiter)
+                    if not waiters:
+                        del self._waiters[key]
+
+    def notify(self, key: Hashable) -> int:
+        """Wake every current subscriber of ``key``. Safe to call from any thread."""
+        with self._lock:
+            waiters = self._waiters.pop(key, None)
+        if not waiters:
+            return 0
+        for loop, fut in waiters:
+            loop.call_soon_threadsafe(_resolve, fut)
+        return len(waiters)
+
+    def waiting(self) -> int:
+        with self._lock:
+            return sum(len(w) for w in self._waiters.values())
+
+
+def _resolve(fut: asyncio.Future) -> None:
+    if not fut.done():
+        fut.set_result(None)
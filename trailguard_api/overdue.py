@@ -0,0 +1,266 @@
+"""Overdue check-in monitor.
+
+A check-in may carry ``nextCheckInTime``: the hiker's promise to check in
+again by then. The latest check-in of each user defines that user's deadline;
+a later check-in without one clears it. ``create_checkin`` records it in
+``check_in_deadlines`` (one row per user) in the check-in's transaction.
+
+Deadlines live in a min-heap keyed by due time with a ``user -> due`` map for
+lazy deletion, so ``schedule`` is O(log n) and a superseded heap entry is
+simply skipped when it surfaces. The heap is rebuilt at startup from the
+deadlines that haven't alerted yet (a partial index), so a restart neither
+scans ``check_ins`` nor alerts again for users who are long overdue. A
+background task looks only at the top of the heap, so no table is ever
+scanned to find overdue users.
+
+Every worker runs a monitor holding the deadlines it scheduled plus those
+loaded at startup, and every ``_PICKUP_SECONDS`` it also loads pending
+deadlines that have already passed (the same partial index, a range scan over
+just those rows), so a deadline whose worker died before alerting is still
+picked up. When one expires, the worker re-reads the user's row and
+claims the alert by setting ``alert_time``; only the claim that lands sends
+it, so an alert goes out once whichever workers hold the deadline, and a
+check-in handled elsewhere reschedules instead. With several shards the heap
+spans all of them and each re-read goes to the user's shard.
+
+Alerts are persisted (``GET /v1/overdueCheckIns`` lists them from the DB, the
+same from every worker) and logged as a warning. Listeners added with
+``add_listener`` are called in-process by the worker that claimed the alert;
+none is registered by default, so hook paging or messaging in there.
+"""
+import asyncio
+import heapq
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+from . import models
+from .shards import ShardSessions
+
+OVERDUE_MONITOR_ENABLED = os.getenv('OVERDUE_MONITOR_ENABLED', '1') not in ('0', 'false', 'False')
+# Upper bound on how long the task sleeps, so new earlier deadlines are noticed
+_MAX_SLEEP_SECONDS = 1.0
+_COMPACT_MIN = 1024
+# How often each worker looks for passed deadlines it doesn't hold
+_PICKUP_SECONDS = 30.0
+
+logger = logging.getLogger(__name__)
+_EPOCH = datetime(1970, 1, 1)
+
+
+def to_naive_utc(dt: datetime) -> datetime:
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _ts(dt: datetime) -> float:
+    return (to_naive_utc(dt) - _EPOCH).total_seconds()
+
+
+class OverdueAlert(NamedTuple):
+    user_id: str
+    check_in_id: str
+    due_time: datetime
+    alert_time: datetime
+
+
+class OverdueMonitor:
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self._heap: List[Tuple[float, str]] = []
+        self._due: Dict[str, float] = {}
+        self._listeners: List[Callable[[List[OverdueAlert]], None]] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def add_listener(self, fn: Callable[[List[OverdueAlert]], None]) -> None:
+        self._listeners.append(fn)
+
+    def remove_listener(self, fn: Callable[[List[OverdueAlert]], None]) -> None:
+        self._listeners.remove(fn)
+
+    def schedule(self, user_id: str, due: Optional[datetime]) -> None:
+        """Replace ``user_id``'s deadline after a check-in; None clears it."""
+        with self._lock:
+            if due is None:
+                self._due.pop(user_id, None)
+                return
+            ts = _ts(due)
+            self._due[user_id] = ts
+            heapq.heappush(self._heap, (ts, user_id))
+            # Superseded entries are skipped lazily; compact once they dominate
+            if len(self._heap) > _COMPACT_MIN and len(self._heap) > 2 * len(self._due):
+                self._heap = [(t, u) for u, t in self._due.items()]
+                heapq.heapify(self._heap)
+
+    def rebuild(self, dbs: Union[Session, Sequence[Session]]) -> None:
+        """Load the deadlines that haven't alerted yet, on every shard in ``dbs``."""
+        due = dict(_pending(dbs))
+        with self._lock:
+            self._due = due
+            self._heap = [(t, u) for u, t in due.items()]
+            heapq.heapify(self._heap)
+
+    def pick_up(self, dbs: Union[Session, Sequence[Session]]) -> int:
+        """Schedule pending deadlines that have already passed but this worker doesn't hold."""
+        now = self.clock()
+        found = [(u, t) for u, t in _pending(dbs, _EPOCH + timedelta(seconds=now)) if u not in self._due]
+        for user_id, ts in found:
+            with self._lock:
+                if user_id not in self._due:
+                    self._due[user_id] = ts
+                    heapq.heappush(self._heap, (ts, user_id))
+        return len(found)
+
+    def next_deadline(self) -> Optional[float]:
+        with self._lock:
+            while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    def _pop_expired(self, now: float) -> List[Tuple[float, str]]:
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                ts, user_id = heapq.heappop(self._heap)
+                if self._due.get(user_id) == ts:
+                    del self._due[user_id]
+                    expired.append((ts, user_id))
+        return expired
+
+    def _restore(self, expired: List[Tuple[float, str]]) -> None:
+        with self._lock:
+            for ts, user_id in expired:
+                if user_id not in self._due:
+                    self._due[user_id] = ts
+                    heapq.heappush(self._heap, (ts, user_id))
+
+    def check(self, db: Union[Session, ShardSessions]) -> List[OverdueAlert]:
+        """Claim and raise alerts for deadlines that have passed; touches only the expired users."""
+        now = self.clock()
+        expired = self._pop_expired(now)
+        if not expired:
+            return []
+        user_db = db.for_user if isinstance(db, ShardSessions) else lambda _: db
+        D = models.CheckInDeadline
+        alerts = []
+        now_dt = _EPOCH + timedelta(seconds=now)
+        try:
+            used = {}
+            for _, user_id in expired:
+                udb = user_db(user_id)
+                used[id(udb)] = udb
+                row = udb.execute(select(D.check_in_id, D.due_time, D.alert_time).where(D.user_id == user_id)).first()
+                if row is None or row.alert_time is not None:
+                    # Cleared by a check-in, or already alerted by another worker
+                    continue
+                if _ts(row.due_time) > now:
+                    # Checked in through another worker since we scheduled this
+                    self.schedule(user_id, row.due_time)
+                    continue
+                claimed = udb.execute(
+                    update(D)
+                    .where(D.user_id == user_id, D.check_in_id == row.check_in_id, D.alert_time.is_(None))
+                    .values(alert_time=now_dt)
+                ).rowcount
+                if claimed:
+                    alerts.append(OverdueAlert(user_id, row.check_in_id, to_naive_utc(row.due_time), now_dt))
+            for udb in used.values():
+                udb.commit()
+        except Exception:
+            # Never lose a deadline to a DB hiccup; the next pass retries
+            db.rollback()
+            self._restore(expired)
+            raise
+        if alerts:
+            logger.warning('%d users missed their check-in deadline', len(alerts))
+            for fn in list(self._listeners):
+                try:
+                    fn(alerts)
+                except Exception:
+                    logger.exception('overdue listener failed')
+        return alerts
+
+    async def run(self, session_factory: Callable[[], Union[Session, ShardSessions]]):
+        """Background loop for the API lifespan: sleep until the next deadline, then check."""
+
+        def once():
+            db = session_factory()
+            try:
+                return self.check(db)
+            finally:
+                db.close()
+
+        def pick_up():
+            db = session_factory()
+            try:
+                self.pick_up(db.all() if isinstance(db, ShardSessions) else db)
+            finally:
+                db.close()
+
+        last_pickup = self.clock()
+        while True:
+            if self.clock() - last_pickup >= _PICKUP_SECONDS:
+                last_pickup = self.clock()
+                try:
+                    await asyncio.to_thread(pick_up)
+                except Exception:
+                    logger.exception('overdue pick-up failed')
+            nxt = self.next_deadline()
+            delay = _MAX_SLEEP_SECONDS if nxt is None else min(max(0.0, nxt - self.clock()), _MAX_SLEEP_SECONDS)
+            await asyncio.sleep(delay)
+            nxt = self.next_deadline()
+            if nxt is not None and nxt <= self.clock():
+                try:
+                    await asyncio.to_thread(once)
+                except Exception:
+                    logger.exception('overdue check failed')
+
+
+def _pending(dbs: Union[Session, Sequence[Session]], until: Optional[datetime] = None) -> List[Tuple[str, float]]:
+    """``(user_id, due)`` of deadlines not alerted yet (``idx_check_in_deadlines_pending``), optionally only up to ``until``."""
+    D = models.CheckInDeadline
+    query = select(D.user_id, D.due_time).where(D.alert_time.is_(None))
+    if until is not None:
+        query = query.where(D.due_time <= until)
+    found = []
+    for db in [dbs] if isinstance(dbs, Session) else dbs:
+        found.extend((r.user_id, _ts(r.due_time)) for r in db.execute(query))
+        db.rollback()
+    return found
+
+
+def set_deadline(db: Session, user_id: str, check_in_id: str, due: Optional[datetime]) -> None:
+    """Replace ``user_id``'s stored deadline in the caller's transaction; None clears it.
+
+    Call after ``changes.stamp``: its lock on the user's sequence row keeps
+    two check-ins of one user from racing here.
+    """
+    D = models.CheckInDeadline
+    db.execute(delete(D).where(D.user_id == user_id))
+    if due is not None:
+        db.add(D(user_id=user_id, check_in_id=check_in_id, due_time=due))
+
+
+def list_overdue(dbs: Sequence[Session]) -> List[OverdueAlert]:
+    """Alerted deadlines on every shard, most overdue first (``idx_check_in_deadlines_alerted``)."""
+    D = models.CheckInDeadline
+    query = select(D.user_id, D.check_in_id, D.due_time, D.alert_time).where(D.alert_time.is_not(None))
+    alerts = [
+        OverdueAlert(r.user_id, r.check_in_id, to_naive_utc(r.due_time), to_naive_utc(r.alert_time))
+        for db in dbs
+        for r in db.execute(query.order_by(D.due_time))
+    ]
+    return sorted(alerts, key=lambda a: a.due_time)
+
+
+overdue_monitor = OverdueMonitor()
@@ -0,0 +1,68 @@
+"""Opaque keyset page tokens shared by list endpoints.
+
+A page token carries the sort key of the last row returned plus a short
+fingerprint of the query (filter/orderBy) that produced it, so a token
+cannot be replayed against a different query. The next page is then a
+range scan on the sort index rather than an OFFSET, which keeps deep pages
+as cheap as the first one.
+"""
+import base64
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence
+
+from sqlalchemy import and_, or_
+
+
+class PageTokenError(ValueError):
+    """Raised when a page token is malformed or does not match the query."""
+
+
+def query_fingerprint(*parts: Optional[str]) -> str:
+    raw = '\x1f'.join(p or '' for p in parts)
+    return hashlib.sha1(raw.encode()).hexdigest()[:12]
+
+
+def _encode_value(v: Any):
+    if isinstance(v, datetime):
+        return {'t': v.isoformat()}
+    return v
+
+
+def _decode_value(v: Any):
+    if isinstance(v, dict) and 't' in v:
+        return datetime.fromisoformat(v['t'])
+    return v
+
+
+def encode_page_token(values: Sequence[Any], fingerprint: str) -> str:
+    payload = {'k': [_encode_value(v) for v in values], 'f': fingerprint}
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_page_token(token: str, fingerprint: str) -> List[Any]:
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+        values = [_decode_value(v) for v in payload['k']]
+    except Exception:
+        raise PageTokenError('Invalid pageToken')
+    if payload.get('f') != fingerprint:
+        raise PageTokenError('pageToken does not match filter/orderBy')
+    return values
+
+
+def keyset_after(columns: Sequence[Any], values: Sequence[Any], descending: bool):
+    """Return a predicate selecting rows strictly after ``values`` in (columns) order.
+
+    Expanded to OR/AND form rather than a row-value comparison so it works on
+    both PostgreSQL and SQLite.
+    """
+    clauses = []
+    for i, (col, val) in enumerate(zip(columns, values)):
+        prefix = [c == v for c, v in zip(columns[:i], values[:i])]
+        step = col < val if descending else col > val
+        clauses.append(and_(*prefix, step) if prefix else step)
+    return or_(*clauses)
@@ -0,0 +1,252 @@
+"""Breadcrumb retention: downsample old tracks and delete expired ones.
+
+Breadcrumbs older than ``BREADCRUMB_DOWNSAMPLE_AFTER_DAYS`` are thinned to the
+first point in each ``BREADCRUMB_DOWNSAMPLE_SECONDS`` bucket per device, and
+breadcrumbs older than ``BREADCRUMB_RETENTION_DAYS`` (0 keeps them forever)
+are deleted.
+
+Work is done per device in keyset-ordered chunks on
+``idx_breadcrumbs_device_time``; each chunk is one short transaction followed
+by a pause, so row locks are held briefly and live ingest keeps its share of
+the database. Rows the archiver already moved to segment files are not
+touched.
+
+Each device's downsampling cutoff is kept in ``breadcrumb_retention_marks``,
+so a pass only scans what has aged past the cutoff since the previous one.
+Ingest lowers a device's mark when it writes points older than the
+downsampling window (an imported track, say), so they get thinned too.
+Devices are listed from ``devices`` and probed on the index one by one,
+rather than found with a DISTINCT over old breadcrumbs.
+
+Run once with ``python -m trailguard_api.retention``, or in the API process
+every ``BREADCRUMB_RETENTION_INTERVAL_SECONDS``.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+from .pagination import keyset_after
+
+DOWNSAMPLE_AFTER_DAYS = int(os.getenv('BREADCRUMB_DOWNSAMPLE_AFTER_DAYS', '30'))
+DOWNSAMPLE_SECONDS = int(os.getenv('BREADCRUMB_DOWNSAMPLE_SECONDS', '60'))
+RETENTION_DAYS = int(os.getenv('BREADCRUMB_RETENTION_DAYS', '0'))
+RETENTION_INTERVAL_SECONDS = float(os.getenv('BREADCRUMB_RETENTION_INTERVAL_SECONDS', '0'))
+CHUNK_ROWS = int(os.getenv('BREADCRUMB_RETENTION_CHUNK', '1000'))
+PAUSE_SECONDS = float(os.getenv('BREADCRUMB_RETENTION_PAUSE_SECONDS', '0.05'))
+
+logger = logging.getLogger(__name__)
+_EPOCH = datetime(1970, 1, 1)
+
+
+@dataclass
+class RetentionReport:
+    expired: int = 0
+    downsampled: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_removed(self) -> int:
+        return self.expired + self.downsampled
+
+
+def _bucket(dt: datetime, seconds: int) -> int:
+    return int((_naive_utc(dt) - _EPOCH).total_seconds()) // seconds
+
+
+def _naive_utc(dt: datetime) -> datetime:
+    if dt.tzinfo is not None:
+        dt = dt.replace(tzinfo=None) - dt.utcoffset()
+    return dt
+
+
+def _devices(db: Session):
+    return db.execute(select(models.Device.id)).scalars().all()
+
+
+def reopen(db: Session, device_id: str, earliest: datetime) -> None:
+    """Lower ``device_id``'s downsampling mark to ``earliest``, in the caller's transaction."""
+    M = models.BreadcrumbRetentionMark
+    db.execute(
+        update(M).where(M.device_id == device_id, M.downsampled_before > earliest).values(downsampled_before=earliest)
+    )
+
+
+def _chunks(
+    db: Session,
+    device_id: str,
+    cutoff: datetime,
+    chunk: int,
+    pause: float,
+    report: RetentionReport,
+    since: Optional[datetime] = None,
+):
+    """Yield keyset-ordered (id, recorded_at) chunks, committing and pausing between them."""
+    B = models.Breadcrumb
+    keys = (B.recorded_at, B.id)
+    after = None
+    while True:
+        q = select(B.id, B.recorded_at).where(B.device_id == device_id, B.recorded_at < cutoff)
+        if since is not None:
+            q = q.where(B.recorded_at >= since)
+        if after is not None:
+            q = q.where(keyset_after(keys, after, descending=False))
+        rows = db.execute(q.order_by(*keys).limit(chunk)).all()
+        if not rows:
+            return
+        yield rows
+        db.commit()
+        report.chunks += 1
+        after = [rows[-1].recorded_at, rows[-1].id]
+        if len(rows) < chunk:
+            return
+        if pause:
+            time.sleep(pause)
+
+
+def expire_device(db: Session, device_id: str, cutoff: datetime, chunk: int, pause: float, report: RetentionReport) -> None:
+    B = models.Breadcrumb
+    for rows in _chunks(db, device_id, cutoff, chunk, pause, report):
+        db.execute(delete(B).where(B.id.in_([r.id for r in rows])))
+        report.expired += len(rows)
+
+
+def downsample_device(
+    db: Session,
+    device_id: str,
+    cutoff: datetime,
+    seconds: int,
+    chunk: int,
+    pause: float,
+    report: RetentionReport,
+    since: Optional[datetime] = None,
+) -> None:
+    """Keep the first point of each ``seconds`` bucket in [since, cutoff), carrying the bucket across chunks."""
+    B = models.Breadcrumb
+    kept_bucket: Optional[int] = None
+    if since is not None:
+        # Rows before ``since`` are thinned already, so the newest of them is its bucket's keeper
+        last = db.execute(select(func.max(B.recorded_at)).where(B.device_id == device_id, B.recorded_at < since)).scalar()
+        if last is not None:
+            kept_bucket = _bucket(last, seconds)
+    for rows in _chunks(db, device_id, cutoff, chunk, pause, report, since):
+        drop = []
+        for r in rows:
+            bucket = _bucket(r.recorded_at, seconds)
+            if bucket == kept_bucket:
+                drop.append(r.id)
+            else:
+                kept_bucket = bucket
+        if drop:
+            db.execute(delete(B).where(B.id.in_(drop)))
+            report.downsampled += len(drop)
+
+
+def run(
+    db: Session,
+    now: Optional[datetime] = None,
+    downsample_after: timedelta = timedelta(days=DOWNSAMPLE_AFTER_DAYS),
+    downsample_seconds: int = DOWNSAMPLE_SECONDS,
+    retention: Optional[timedelta] = timedelta(days=RETENTION_DAYS) if RETENTION_DAYS else None,
+    chunk: int = CHUNK_ROWS,
+    pause: float = PAUSE_SECONDS,
+) -> RetentionReport:
+    """One retention pass; expired rows go first so they aren't downsampled needlessly."""
+    started = time.perf_counter()
+    now = now or datetime.utcnow()
+    report = RetentionReport()
+    devices = _devices(db)
+    if retention is not None:
+        # Expired rows are deleted, so the index scan from each device's oldest row needs no mark
+        cutoff = now - retention
+        for device_id in devices:
+            expire_device(db, device_id, cutoff, chunk, pause, report)
+    if downsample_seconds > 0:
+        cutoff = now - downsample_after
+        M = models.BreadcrumbRetentionMark
+        marks = dict(db.execute(select(M.device_id, M.downsampled_before)).all())
+        for device_id in devices:
+            since = marks.get(device_id)
+            if since is not None and _naive_utc(since) >= cutoff:
+                continue
+            downsample_device(db, device_id, cutoff, downsample_seconds, chunk, pause, report, since)
+            if since is None:
+                db.add(M(device_id=device_id, downsampled_before=cutoff))
+            else:
+                # Only if ingest hasn't lowered the mark during the pass
+                db.execute(
+                    update(M).where(M.device_id == device_id, M.downsampled_before == since).values(downsampled_before=cutoff)
+                )
+            try:
+                db.commit()
+            except IntegrityError:
+                # A concurrent pass marked the device first
+                db.rollback()
+    db.commit()
+    report.seconds = time.perf_counter() - started
+    logger.info(
+        'breadcrumb retention removed %d rows (%d expired, %d downsampled) in %.2fs over %d chunks',
+        report.rows_removed, report.expired, report.downsampled, report.seconds, report.chunks,
+    )
+    return report
+
+
+async def run_periodically(session_factory: Callable[[], Session], interval: float = RETENTION_INTERVAL_SECONDS):
+    """Background loop for the API lifespan; each pass runs in a worker thread."""
+
+    def once():
+        db = session_factory()
+        try:
+            return run(db)
+        finally:
+            db.close()
+
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(once)
+        except Exception:
+            logger.exception('breadcrumb retention pass failed')
+
+
+def main():  # pragma: no cover
+    from .database import shard_map
+
+    parser = argparse.ArgumentParser(description='Downsample and expire old breadcrumbs.')
+    parser.add_argument('--downsample-after-days', type=int, default=DOWNSAMPLE_AFTER_DAYS)
+    parser.add_argument('--downsample-seconds', type=int, default=DOWNSAMPLE_SECONDS, help='0 disables downsampling')
+    parser.add_argument('--retention-days', type=int, default=RETENTION_DAYS, help='0 keeps breadcrumbs forever')
+    parser.add_argument('--chunk', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--pause', type=float, default=PAUSE_SECONDS)
+    args = parser.parse_args()
+    for i, factory in enumerate(shard_map.sessionmakers):
+        db = factory()
+        try:
+            report = run(
+                db,
+                downsample_after=timedelta(days=args.downsample_after_days),
+                downsample_seconds=args.downsample_seconds,
+                retention=timedelta(days=args.retention_days) if args.retention_days else None,
+                chunk=args.chunk,
+                pause=args.pause,
+            )
+        finally:
+            db.close()
+        print(
+            f'shard {i}: removed {report.rows_removed} breadcrumbs ({report.expired} expired, '
+            f'{report.downsampled} downsampled) in {report.seconds:.2f}s over {report.chunks} chunks'
+        )
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
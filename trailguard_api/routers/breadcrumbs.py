@@ -1,16 +1,24 @@
-from typing import Optional, List
+from datetime import datetime
+from typing import Optional, List, Union
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.exceptions import RequestValidationError
 from sqlalchemy.orm import Session
 
-from .. import models, schemas
-from ..database import get_db
+from .. import archive, changes, heatmap, ingest, models, schemas
+from ..admission import admission
+from ..coalesce import coalesced_json
+from ..database import get_db, get_read_db
+from ..pagination import PageTokenError, decode_page_token, encode_page_token, keyset_after
+from ..tracing import TracedRoute
 
 
-router = APIRouter(prefix='/v1/users/{user_id}/devices/{device_id}/breadcrumbs', tags=['Breadcrumbs'])
+router = APIRouter(prefix='/v1/users/{user_id}/devices/{device_id}/breadcrumbs', tags=['Breadcrumbs'], route_class=TracedRoute)
 
+_LIST_FINGERPRINT = 'breadcrumbs.list'
 
-def _to_response(b: models.Breadcrumb, user_id: str, device_id: str) -> schemas.BreadcrumbResponse:
+
+def _to_response(b: Union[models.Breadcrumb, archive.CrumbRow], user_id: str, device_id: str) -> schemas.BreadcrumbResponse:
     return schemas.BreadcrumbResponse(
         name=f'users/{user_id}/devices/{device_id}/breadcrumbs/{b.id}',
         create_time=b.create_time,
@@ -26,40 +34,80 @@ def _device_or_404(db: Session, user_id: str, device_id: str) -> models.Device:
 
 
 @router.get('', response_model=schemas.BreadcrumbListResponse)
-def list_breadcrumbs(user_id: str, device_id: str, pageSize: int = Query(1000, ge=1, le=5000), db: Session = Depends(get_db)):
+def list_breadcrumbs(
+    user_id: str,
+    device_id: str,
+    request: Request,
+    pageSize: int = Query(1000, ge=1, le=5000),
+    pageToken: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+):
+    """Newest first, merging hot rows from the DB with the cold-tier archive."""
+    return coalesced_json(request, lambda: _list_page(db, user_id, device_id, pageSize, pageToken))
+
+
+def _list_page(
+    db: Session, user_id: str, device_id: str, pageSize: int, pageToken: Optional[str]
+) -> schemas.BreadcrumbListResponse:
     _device_or_404(db, user_id, device_id)
-    q = (
-        db.query(models.Breadcrumb)
-        .filter(models.Breadcrumb.device_id == device_id)
-        .order_by(models.Breadcrumb.recorded_at.desc())
-        .limit(pageSize)
-    )
-    rows = q.all()
+    after = None
+    if pageToken:
+        try:
+            after = decode_page_token(pageToken, _LIST_FINGERPRINT)
+        except PageTokenError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    keys = (models.Breadcrumb.recorded_at, models.Breadcrumb.id)
+    q = db.query(models.Breadcrumb).filter(models.Breadcrumb.device_id == device_id)
+    if after is not None:
+        q = q.filter(keyset_after(keys, after, descending=True))
+    hot = q.order_by(*[k.desc() for k in keys]).limit(pageSize + 1).all()
+    aware = db.get_bind().dialect.name != 'sqlite'
+    cold = archive.cold_page(device_id, pageSize + 1, before=after, aware=aware)
+    rows = archive.merge_newest(hot, cold, pageSize + 1)
+
+    next_token = None
+    if len(rows) > pageSize:
+        rows = rows[:pageSize]
+        next_token = encode_page_token([rows[-1].recorded_at, rows[-1].id], _LIST_FINGERPRINT)
     return schemas.BreadcrumbListResponse(
-        breadcrumbs=[_to_response(b, user_id, device_id) for b in rows], nextPageToken=None
+        breadcrumbs=[_to_response(b, user_id, device_id) for b in rows], nextPageToken=next_token
     )
 
 
-@router.post('', response_model=schemas.BreadcrumbResponse, status_code=201)
+@router.post(
+    '', response_model=schemas.BreadcrumbResponse, status_code=201, dependencies=[Depends(admission('breadcrumbs.create'))]
+)
 def create_breadcrumb(user_id: str, device_id: str, payload: schemas.BreadcrumbCreateRequest, db: Session = Depends(get_db)):
     _device_or_404(db, user_id, device_id)
     pos = payload.breadcrumb.position
     row = models.Breadcrumb(device_id=device_id, lat=pos.latitude, lng=pos.longitude)
     db.add(row)
+    changes.stamp(db, user_id, row)
     db.commit()
+    heatmap.record(db, [pos.latitude], [pos.longitude])
     db.refresh(row)
     return _to_response(row, user_id, device_id)
 
 
-@router.post(':batchCreate', response_model=schemas.BreadcrumbBatchCreateResponse)
+@router.post(
+    ':batchCreate',
+    response_model=schemas.BreadcrumbBatchCreateResponse,
+    dependencies=[Depends(admission('breadcrumbs.batchCreate'))],
+)
 def batch_create_breadcrumbs(user_id: str, device_id: str, payload: schemas.BreadcrumbBatchCreateRequest, db: Session = Depends(get_db)):
     _device_or_404(db, user_id, device_id)
+    now = datetime.utcnow()
+    try:
+        cols = ingest.from_request(payload, now)
+    except ingest.IngestError as e:
+        if not ingest.is_columnar(payload):
+            # The nested format has always answered bad input with a 422
+            raise RequestValidationError([{'type': 'value_error', 'loc': ('body', *e.loc), 'msg': str(e), 'input': None}])
+        raise HTTPException(status_code=400, detail=str(e))
+    kept = ingest.filter_points(cols, ingest.last_kept(db, device_id))
     created = 0
-    for b in payload.breadcrumbs:
-        pos = b.position
-        row = models.Breadcrumb(device_id=device_id, lat=pos.latitude, lng=pos.longitude)
-        db.add(row)
-        created += 1
-    db.commit()
-    return schemas.BreadcrumbBatchCreateResponse(createdCount=created)
-
+    if len(kept):
+        created = ingest.insert_columns(db, device_id, kept, now, change_seq=changes.bump(db, user_id))
+        db.commit()
+        heatmap.record(db, kept.lat, kept.lng)
+    return schemas.BreadcrumbBatchCreateResponse(createdCount=created, droppedCount=len(cols) - created)
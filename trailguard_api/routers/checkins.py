@@ -1,11 +1,34 @@
+from datetime import datetime
 from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
-from .. import models, schemas
-from ..database import get_db
+from .. import changes, models, schemas
+from ..database import get_db, get_read_db
+from ..filtering import FilterCompiler, FilterError, string_field, timestamp_field
+from ..overdue import overdue_monitor, set_deadline, to_naive_utc
+from ..pagination import PageTokenError, decode_page_token, encode_page_token, keyset_after, query_fingerprint
+from ..tracing import TracedRoute
 
-router = APIRouter(prefix='/v1/users/{user_id}/checkIns', tags=['CheckIns'])
+router = APIRouter(prefix='/v1/users/{user_id}/checkIns', tags=['CheckIns'], route_class=TracedRoute)
+
+_filters = FilterCompiler(
+    {
+        'type': string_field(models.CheckIn.type),
+        'deviceId': string_field(models.CheckIn.device_id),
+        'createTime': timestamp_field(models.CheckIn.create_time),
+    }
+)
+
+
+def _parse_order_by(order_by: Optional[str]) -> bool:
+    """Return True for descending order. Only createTime is sortable (idx_check_ins_user_time)."""
+    if not order_by or not order_by.strip():
+        return True
+    parts = order_by.split()
+    if parts[0] != 'createTime' or len(parts) > 2 or (len(parts) == 2 and parts[1] not in ('asc', 'desc')):
+        raise HTTPException(status_code=400, detail=f'Unsupported orderBy: {order_by}')
+    return len(parts) == 2 and parts[1] == 'desc'
 
 
 def to_checkin_response(ci: models.CheckIn) -> schemas.CheckInResponse:
@@ -19,6 +42,7 @@ def to_checkin_response(ci: models.CheckIn) -> schemas.CheckInResponse:
         device_id=ci.device_id,
         location=location,
         create_time=ci.create_time,
+        next_check_in_time=ci.next_due_time,
     )
 
 
@@ -29,17 +53,44 @@ def list_checkins(
     pageToken: Optional[str] = None,
     filter: Optional[str] = None,
     orderBy: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     limit = max(1, min(pageSize, 200))
-    query = db.query(models.CheckIn).filter(models.CheckIn.user_id == user_id).order_by(models.CheckIn.create_time.desc()).limit(limit)
-    checkins = query.all()
-    return schemas.CheckInListResponse(checkIns=[to_checkin_response(c) for c in checkins], nextPageToken=None)
+    descending = _parse_order_by(orderBy)
+    try:
+        condition = _filters.compile(filter or '')
+    except FilterError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    keys = (models.CheckIn.create_time, models.CheckIn.id)
+    query = db.query(models.CheckIn).filter(models.CheckIn.user_id == user_id)
+    if condition is not None:
+        query = query.filter(condition)
+    fingerprint = query_fingerprint(filter, 'desc' if descending else 'asc')
+    if pageToken:
+        try:
+            after = decode_page_token(pageToken, fingerprint)
+        except PageTokenError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.filter(keyset_after(keys, after, descending))
+    order = [k.desc() for k in keys] if descending else [k.asc() for k in keys]
+    # Fetch one extra row to learn whether another page exists
+    checkins = query.order_by(*order).limit(limit + 1).all()
+
+    next_token = None
+    if len(checkins) > limit:
+        checkins = checkins[:limit]
+        last = checkins[-1]
+        next_token = encode_page_token([last.create_time, last.id], fingerprint)
+    return schemas.CheckInListResponse(checkIns=[to_checkin_response(c) for c in checkins], nextPageToken=next_token)
 
 
 @router.post('', response_model=schemas.CheckInResponse, status_code=201)
 def create_checkin(user_id: str, payload: schemas.CheckInCreate, db: Session = Depends(get_db)):
     ci_in = payload.checkIn
+    next_due = to_naive_utc(ci_in.next_check_in_time) if ci_in.next_check_in_time else None
+    if next_due is not None and next_due <= datetime.utcnow():
+        raise HTTPException(status_code=400, detail='nextCheckInTime must be in the future')
     checkin = models.CheckIn(
         user_id=user_id,
         device_id=ci_in.device_id,
@@ -48,8 +99,14 @@ def create_checkin(user_id: str, payload: schemas.CheckInCreate, db: Session = D
         lat=ci_in.location.lat if ci_in.location else None,
         lng=ci_in.location.lng if ci_in.location else None,
         accuracy_meters=ci_in.location.accuracy_meters if ci_in.location else None,
+        next_due_time=next_due,
     )
     db.add(checkin)
+    changes.stamp(db, user_id, checkin)
+    db.flush()
+    # The newest check-in replaces (or, without a deadline, clears) the previous one
+    set_deadline(db, user_id, checkin.id, next_due)
     db.commit()
     db.refresh(checkin)
+    overdue_monitor.schedule(user_id, next_due)
     return to_checkin_response(checkin)
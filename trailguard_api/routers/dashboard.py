@@ -0,0 +1,134 @@
+import os
+from typing import Dict, List
+
+from fastapi import APIRouter, Depends
+from sqlalchemy import select, union_all
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from ..cache import TTLCache
+from ..database import get_read_shard_dbs
+from ..shards import ShardSessions
+from ..tracing import TracedRoute
+from .devices import _to_device_response
+from .sos import _to_status
+
+
+router = APIRouter(prefix='/v1/users/{user_id}/familyDashboard', tags=['Family'], route_class=TracedRoute)
+
+# Member devices and SOS sessions belong to other users, so their writes can't
+# cheaply invalidate this owner's entry; a short TTL bounds the staleness.
+DASHBOARD_CACHE_TTL_SECONDS = float(os.getenv('DASHBOARD_CACHE_TTL_SECONDS', '2'))
+dashboard_cache = TTLCache(ttl=DASHBOARD_CACHE_TTL_SECONDS, maxsize=4096)
+
+
+def _latest_devices(db: Session, member_user_ids: List[str]) -> Dict[str, models.Device]:
+    """Most recently seen device per member user, in one query."""
+    latest: Dict[str, models.Device] = {}
+    if not member_user_ids:
+        return latest
+    rows = db.query(models.Device).filter(models.Device.user_id.in_(member_user_ids)).all()
+    for d in rows:
+        cur = latest.get(d.user_id)
+        if cur is None or (d.last_seen_time or d.create_time) > (cur.last_seen_time or cur.create_time):
+            latest[d.user_id] = d
+    return latest
+
+
+def _latest_breadcrumbs(db: Session, device_ids: List[str]) -> Dict[str, models.Breadcrumb]:
+    """Newest breadcrumb per device: one LIMIT 1 probe of idx_breadcrumbs_device_time each, in one query."""
+    if not device_ids:
+        return {}
+    B = models.Breadcrumb
+    newest = union_all(
+        *[select(B.id).where(B.device_id == d).order_by(B.recorded_at.desc()).limit(1).subquery().select() for d in device_ids]
+    ).subquery()
+    rows = db.query(B).filter(B.id.in_(select(newest.c.id))).all()
+    return {b.device_id: b for b in rows}
+
+
+def _active_sessions(db: Session, member_user_ids: List[str]) -> Dict[str, models.SOSSession]:
+    if not member_user_ids:
+        return {}
+    rows = (
+        db.query(models.SOSSession)
+        .filter(models.SOSSession.user_id.in_(member_user_ids), models.SOSSession.cancel_time.is_(None))
+        .order_by(models.SOSSession.start_time.asc())
+        .all()
+    )
+    # Later rows overwrite earlier ones so the newest active session wins
+    return {s.user_id: s for s in rows}
+
+
+def _position(device: models.Device, crumb: models.Breadcrumb):
+    """Pick the fresher of the device's reported location and its newest breadcrumb."""
+    dev_loc = None
+    if device is not None and device.lat is not None and device.lng is not None:
+        dev_loc = (
+            schemas.Location(lat=device.lat, lng=device.lng, accuracy_meters=device.accuracy_meters),
+            device.last_seen_time,
+        )
+    if crumb is None:
+        return dev_loc or (None, None)
+    crumb_loc = (
+        schemas.Location(lat=crumb.lat, lng=crumb.lng, accuracy_meters=crumb.accuracy_meters),
+        crumb.recorded_at,
+    )
+    if dev_loc is None or dev_loc[1] is None or (crumb.recorded_at and crumb.recorded_at > dev_loc[1]):
+        return crumb_loc
+    return dev_loc
+
+
+def build_dashboard(dbs: ShardSessions, user_id: str) -> schemas.FamilyDashboardResponse:
+    """Assemble the dashboard with a fixed number of queries per shard regardless of family size."""
+    members = (
+        dbs.for_user(user_id)
+        .query(models.FamilyMember)
+        .filter(models.FamilyMember.user_id == user_id)
+        .order_by(models.FamilyMember.create_time.desc())
+        .all()
+    )
+    member_user_ids = sorted({m.member_user_id for m in members if m.member_user_id})
+    devices: Dict[str, models.Device] = {}
+    crumbs: Dict[str, models.Breadcrumb] = {}
+    sessions: Dict[str, models.SOSSession] = {}
+    # Members can live on other shards; each shard's members are read together
+    for shard, ids in dbs.group(member_user_ids).items():
+        db = dbs.shard(shard)
+        shard_devices = _latest_devices(db, ids)
+        devices.update(shard_devices)
+        crumbs.update(_latest_breadcrumbs(db, [d.id for d in shard_devices.values()]))
+        sessions.update(_active_sessions(db, ids))
+
+    out = []
+    for m in members:
+        device = devices.get(m.member_user_id)
+        crumb = crumbs.get(device.id) if device is not None else None
+        loc, loc_time = _position(device, crumb)
+        sos = None
+        if m.member_user_id:
+            sos = _to_status(sessions.get(m.member_user_id), m.member_user_id)
+        out.append(
+            schemas.FamilyDashboardMember(
+                name=f'users/{user_id}/familyMembers/{m.id}',
+                display_name=m.display_name,
+                status=m.status,
+                last_seen_time=m.last_seen_time,
+                member_user_id=m.member_user_id,
+                device=_to_device_response(device, device.user_id) if device is not None else None,
+                last_known_location=loc,
+                last_position_time=loc_time,
+                sos=sos,
+            )
+        )
+    return schemas.FamilyDashboardResponse(name=f'users/{user_id}/familyDashboard', familyMembers=out)
+
+
+@router.get('', response_model=schemas.FamilyDashboardResponse)
+def get_family_dashboard(user_id: str, dbs: ShardSessions = Depends(get_read_shard_dbs)):
+    cached = dashboard_cache.get(user_id)
+    if cached is not None:
+        return cached
+    resp = build_dashboard(dbs, user_id)
+    dashboard_cache.set(user_id, resp)
+    return resp
@@ -1,14 +1,22 @@
 from datetime import datetime
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import case, func, select, update
 from sqlalchemy.orm import Session
 
-from .. import models, schemas
-from ..database import get_db
+from .. import changes, models, schemas
+from ..admission import admission
+from ..coalesce import coalesced_json
+from ..firmware import manifest_cache
+from ..database import get_db, get_read_db
+from ..pagination import PageTokenError, decode_page_token, encode_page_token
+from ..tracing import TracedRoute
 
 
-router = APIRouter(prefix='/v1/users/{user_id}/devices', tags=['Devices'])
+router = APIRouter(prefix='/v1/users/{user_id}/devices', tags=['Devices'], route_class=TracedRoute)
+
+_FIRMWARE_LIST_FINGERPRINT = 'devices.listFirmwareUpdates'
 
 
 def _to_device_response(d: models.Device, user_id: str) -> schemas.DeviceResponse:
@@ -27,7 +35,7 @@ def _to_device_response(d: models.Device, user_id: str) -> schemas.DeviceRespons
 
 
 @router.get('', response_model=schemas.DeviceListResponse)
-def list_devices(user_id: str, pageSize: int = Query(50, ge=1, le=200), db: Session = Depends(get_db)):
+def list_devices(user_id: str, pageSize: int = Query(50, ge=1, le=200), db: Session = Depends(get_read_db)):
     q = db.query(models.Device).filter(models.Device.user_id == user_id).order_by(models.Device.create_time.desc()).limit(pageSize)
     devices = q.all()
     return schemas.DeviceListResponse(devices=[_to_device_response(d, user_id) for d in devices], nextPageToken=None)
@@ -53,33 +61,107 @@ def create_device(user_id: str, payload: schemas.DeviceCreateRequest, db: Sessio
         paired_at=datetime.utcnow(),
     )
     db.add(d)
+    changes.stamp(db, user_id, d)
     db.commit()
     db.refresh(d)
     return _to_device_response(d, user_id)
 
 
+@router.get(':listFirmwareUpdates', response_model=schemas.FirmwareUpdateListResponse)
+def list_firmware_updates(
+    user_id: str,
+    pageSize: int = Query(500, ge=1, le=5000),
+    pageToken: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+):
+    """Devices whose installed firmware differs from their target (or the latest release), paged on idx_devices_user_id."""
+    latest = manifest_cache.get().latest
+    D = models.Device
+    wanted = func.coalesce(D.firmware_target_version, latest)
+    q = select(D.id, D.firmware_version, wanted.label('wanted')).where(
+        D.user_id == user_id, func.coalesce(D.firmware_version, '') != wanted
+    )
+    if pageToken:
+        try:
+            (after,) = decode_page_token(pageToken, _FIRMWARE_LIST_FINGERPRINT)
+        except (PageTokenError, ValueError) as e:  # ValueError: token with the wrong arity
+            raise HTTPException(status_code=400, detail=str(e))
+        q = q.where(D.id > after)
+    rows = db.execute(q.order_by(D.id).limit(pageSize + 1)).all()
+    next_token = None
+    if len(rows) > pageSize:
+        rows = rows[:pageSize]
+        next_token = encode_page_token([rows[-1].id], _FIRMWARE_LIST_FINGERPRINT)
+    return schemas.FirmwareUpdateListResponse(
+        latestVersion=latest,
+        devices=[
+            schemas.FirmwareUpdateDevice(
+                name=f'users/{user_id}/devices/{r.id}', currentVersion=r.firmware_version, targetVersion=r.wanted
+            )
+            for r in rows
+        ],
+        nextPageToken=next_token,
+    )
+
+
+@router.post(':rolloutFirmware', response_model=schemas.FirmwareRolloutResponse)
+def rollout_firmware(user_id: str, payload: schemas.FirmwareRolloutRequest, db: Session = Depends(get_db)):
+    """Set the target version on many devices with one UPDATE and report progress."""
+    manifest = manifest_cache.get()
+    target = payload.targetVersion or manifest.latest
+    if not manifest.has_release(target):
+        raise HTTPException(status_code=400, detail=f'Unknown firmware version: {target}')
+    D = models.Device
+    stmt = update(D).where(D.user_id == user_id)
+    if payload.deviceIds is not None:
+        stmt = stmt.where(D.id.in_(payload.deviceIds))
+    result = db.execute(
+        stmt.values(firmware_target_version=target, update_time=datetime.utcnow(), change_seq=changes.bump(db, user_id)),
+        execution_options={'synchronize_session': False},
+    )
+    total, updated = db.execute(
+        select(func.count(), func.coalesce(func.sum(case((D.firmware_version == target, 1), else_=0)), 0)).where(
+            D.user_id == user_id, D.firmware_target_version == target
+        )
+    ).one()
+    db.commit()
+    return schemas.FirmwareRolloutResponse(
+        targetVersion=target,
+        targetedCount=result.rowcount,
+        totalDevices=total,
+        updatedDevices=updated,
+        pendingDevices=total - updated,
+    )
+
+
 @router.get('/{device_id}:checkFirmware', response_model=schemas.FirmwareInfoResponse)
-def check_firmware(user_id: str, device_id: str, db: Session = Depends(get_db)):
+def check_firmware(user_id: str, device_id: str, db: Session = Depends(get_read_db)):
     d = db.query(models.Device).filter(models.Device.id == device_id, models.Device.user_id == user_id).first()
     if not d:
         raise HTTPException(status_code=404, detail='Not found')
     current = d.firmware_version or '0.0.0'
-    # For dev: pretend latest is 1.2.3 unless current equals it
-    latest = '1.2.3'
-    update = current != latest
-    notes = 'Improved GPS accuracy and battery reporting.' if update else None
-    return schemas.FirmwareInfoResponse(currentVersion=current, latestVersion=latest, updateAvailable=update, releaseNotes=notes)
+    manifest = manifest_cache.get()
+    # A rollout target takes precedence over the newest release
+    latest = d.firmware_target_version or manifest.latest
+    needs_update = current != latest
+    notes = manifest.notes(latest) if needs_update else None
+    return schemas.FirmwareInfoResponse(
+        currentVersion=current, latestVersion=latest, updateAvailable=needs_update, releaseNotes=notes
+    )
 
 
 @router.get('/{device_id}', response_model=schemas.DeviceResponse)
-def get_device(user_id: str, device_id: str, db: Session = Depends(get_db)):
-    d = db.query(models.Device).filter(models.Device.id == device_id, models.Device.user_id == user_id).first()
-    if not d:
-        raise HTTPException(status_code=404, detail='Not found')
-    return _to_device_response(d, user_id)
+def get_device(user_id: str, device_id: str, request: Request, db: Session = Depends(get_read_db)):
+    def load():
+        d = db.query(models.Device).filter(models.Device.id == device_id, models.Device.user_id == user_id).first()
+        if not d:
+            raise HTTPException(status_code=404, detail='Not found')
+        return _to_device_response(d, user_id)
+
+    return coalesced_json(request, load)
 
 
-@router.patch('/{device_id}', response_model=schemas.DeviceResponse)
+@router.patch('/{device_id}', response_model=schemas.DeviceResponse, dependencies=[Depends(admission('devices.patch'))])
 def patch_device(
     user_id: str,
     device_id: str,
@@ -128,6 +210,7 @@ def patch_device(
         d.lng = payload.location.lng
         d.accuracy_meters = payload.location.accuracy_meters
 
+    changes.stamp(db, user_id, d)
     db.commit()
     db.refresh(d)
     return _to_device_response(d, user_id)
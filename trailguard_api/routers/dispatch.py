@@ -0,0 +1,66 @@
+import asyncio
+import os
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+
+from .. import schemas
+from ..database import get_shard_dbs
+from ..shards import ShardSessions
+from ..sos_index import ActiveSOS, sos_index
+from ..tracing import TracedRoute
+
+
+router = APIRouter(prefix='/v1/activeSosSessions', tags=['SOS'], route_class=TracedRoute)
+
+# Watchers share one DB version check per interval rather than one each
+WATCH_INTERVAL_SECONDS = float(os.getenv('SOS_WATCH_INTERVAL_SECONDS', '1'))
+
+
+def _to_response(e: ActiveSOS) -> schemas.ActiveSOSSession:
+    loc = None
+    if e.last_lat is not None and e.last_lng is not None:
+        loc = schemas.Location(lat=e.last_lat, lng=e.last_lng, accuracy_meters=e.last_accuracy_meters)
+    return schemas.ActiveSOSSession(
+        name=f'users/{e.user_id}/sos',
+        user_id=e.user_id,
+        message=e.message,
+        start_time=e.start_time,
+        last_known_location=loc,
+    )
+
+
+def _list(dbs: ShardSessions, max_staleness: float = 0.0) -> schemas.ActiveSOSListResponse:
+    sos_index.ensure_fresh(dbs.all(), max_staleness=max_staleness)
+    # End the version-check transactions so a long-poll sleeping between
+    # checks doesn't pin a pooled connection per shard
+    dbs.rollback()
+    version, entries = sos_index.snapshot()
+    return schemas.ActiveSOSListResponse(sessions=[_to_response(e) for e in entries], version=version or 0)
+
+
+@router.get('', response_model=schemas.ActiveSOSListResponse)
+def list_active_sos(dbs: ShardSessions = Depends(get_shard_dbs)):
+    """All active SOS sessions across the fleet, newest first."""
+    return _list(dbs)
+
+
+@router.get(':watch', response_model=schemas.ActiveSOSListResponse)
+async def watch_active_sos(
+    sinceVersion: Optional[int] = None,
+    timeoutSeconds: float = Query(30, ge=0, le=120),
+    dbs: ShardSessions = Depends(get_shard_dbs),
+):
+    """Long-poll: return as soon as the active set differs from ``sinceVersion``.
+
+    Returns immediately when ``sinceVersion`` is omitted, otherwise the current
+    snapshot after at most ``timeoutSeconds``.
+    """
+    deadline = time.monotonic() + timeoutSeconds
+    while True:
+        resp = await run_in_threadpool(_list, dbs, WATCH_INTERVAL_SECONDS)
+        if sinceVersion is None or resp.version != sinceVersion or time.monotonic() >= deadline:
+            return resp
+        await asyncio.sleep(min(WATCH_INTERVAL_SECONDS, max(0.0, deadline - time.monotonic())))
@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
-from .. import models, schemas
-from ..database import get_db
+from .. import changes, models, schemas
+from ..database import get_db, get_read_db
+from ..tracing import TracedRoute
+from .dashboard import dashboard_cache
 
 
-router = APIRouter(prefix='/v1/users/{user_id}/familyMembers', tags=['Family'])
+router = APIRouter(prefix='/v1/users/{user_id}/familyMembers', tags=['Family'], route_class=TracedRoute)
 
 
 def _to_response(m: models.FamilyMember, user_id: str) -> schemas.FamilyMemberResponse:
@@ -14,20 +16,29 @@ def _to_response(m: models.FamilyMember, user_id: str) -> schemas.FamilyMemberRe
         display_name=m.display_name,
         status=m.status,
         last_seen_time=m.last_seen_time,
+        member_user_id=m.member_user_id,
     )
 
 
 @router.get('', response_model=schemas.FamilyListResponse)
-def list_family(user_id: str, db: Session = Depends(get_db)):
+def list_family(user_id: str, db: Session = Depends(get_read_db)):
     rows = db.query(models.FamilyMember).filter(models.FamilyMember.user_id == user_id).order_by(models.FamilyMember.create_time.desc()).all()
     return schemas.FamilyListResponse(familyMembers=[_to_response(m, user_id) for m in rows])
 
 
 @router.post('', response_model=schemas.FamilyMemberResponse, status_code=201)
 def create_family_member(user_id: str, payload: schemas.FamilyMemberPayload, db: Session = Depends(get_db)):
-    m = models.FamilyMember(user_id=user_id, display_name=payload.display_name, status=payload.status, last_seen_time=payload.last_seen_time)
+    m = models.FamilyMember(
+        user_id=user_id,
+        display_name=payload.display_name,
+        status=payload.status,
+        last_seen_time=payload.last_seen_time,
+        member_user_id=payload.member_user_id,
+    )
     db.add(m)
+    changes.stamp(db, user_id, m)
     db.commit()
+    dashboard_cache.invalidate(user_id)
     db.refresh(m)
     return _to_response(m, user_id)
 
@@ -38,6 +49,8 @@ def delete_family_member(user_id: str, member_id: str, db: Session = Depends(get
     if not m:
         raise HTTPException(status_code=404, detail='Not found')
     db.delete(m)
+    changes.tombstone(db, user_id, f'users/{user_id}/familyMembers/{m.id}')
     db.commit()
+    dashboard_cache.invalidate(user_id)
     return None
 
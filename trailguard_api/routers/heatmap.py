@@ -0,0 +1,29 @@
+import base64
+
+from fastapi import APIRouter, Depends, HTTPException, Response
+
+from .. import heatmap, schemas
+from ..database import get_read_shard_dbs
+from ..shards import ShardSessions
+from ..tracing import TracedRoute
+
+
+router = APIRouter(prefix='/v1/heatmap', tags=['Heatmap'], route_class=TracedRoute)
+
+
+@router.get('/{z}/{x}/{y}', response_model=schemas.HeatmapTileResponse)
+def get_heatmap_tile(z: int, x: int, y: int, response: Response, dbs: ShardSessions = Depends(get_read_shard_dbs)):
+    if not (0 <= z <= heatmap.MAX_TILE_ZOOM):
+        raise HTTPException(status_code=400, detail=f'z must be between 0 and {heatmap.MAX_TILE_ZOOM}')
+    if not (0 <= x < (1 << z) and 0 <= y < (1 << z)):
+        raise HTTPException(status_code=400, detail='Tile x/y out of range for zoom')
+    grid = heatmap.shard_tile_grid(dbs.all(), z, x, y)
+    total = int(grid.sum(dtype='u8'))
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    return schemas.HeatmapTileResponse(
+        name=f'heatmap/{z}/{x}/{y}',
+        size=heatmap.GRID,
+        total=total,
+        max=int(grid.max()),
+        counts=base64.b64encode(grid.astype('<u4').tobytes()).decode() if total else None,
+    )
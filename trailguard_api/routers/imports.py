@@ -0,0 +1,119 @@
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from .. import imports, models, schemas, trackfiles
+from ..admission import admission
+from ..database import get_db, get_read_db
+from ..tracing import TracedRoute
+from .breadcrumbs import _device_or_404
+
+
+router = APIRouter(prefix='/v1/users/{user_id}/devices/{device_id}', tags=['Breadcrumbs'], route_class=TracedRoute)
+
+_CONTENT_TYPES = {
+    'application/gpx+xml': 'gpx',
+    'application/vnd.google-earth.kml+xml': 'kml',
+}
+_SNIFF_BYTES = 1024
+# Upload bytes gathered per off-loop write
+_WRITE_BYTES = 1 << 20
+
+
+def _to_response(job: models.BreadcrumbImport, user_id: str) -> schemas.BreadcrumbImportResponse:
+    return schemas.BreadcrumbImportResponse(
+        name=f'users/{user_id}/devices/{job.device_id}/breadcrumbImports/{job.id}',
+        state=job.state,
+        format=job.format,
+        total_bytes=job.total_bytes,
+        bytes_read=job.bytes_read,
+        points_parsed=job.points_parsed,
+        created_count=job.created_count,
+        dropped_count=job.dropped_count,
+        error=job.error,
+        create_time=job.create_time,
+        update_time=job.update_time,
+    )
+
+
+def _create_job(db: Session, user_id: str, device_id: str, fmt: str, size: int) -> models.BreadcrumbImport:
+    job = models.BreadcrumbImport(user_id=user_id, device_id=device_id, format=fmt, total_bytes=size)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+@router.post(
+    '/breadcrumbs:import',
+    status_code=202,
+    response_model=schemas.BreadcrumbImportResponse,
+    dependencies=[Depends(admission('breadcrumbs.import'))],
+)
+async def import_breadcrumbs(
+    user_id: str,
+    device_id: str,
+    request: Request,
+    format: Optional[str] = Query(None, description='gpx or kml; taken from Content-Type or the file itself when omitted'),
+    db: Session = Depends(get_db),
+):
+    """Start importing a GPX/KML file sent as the raw request body.
+
+    The body is streamed to disk rather than buffered, then parsed in the
+    background; poll the returned ``breadcrumbImports`` resource for progress.
+    """
+    await run_in_threadpool(_device_or_404, db, user_id, device_id)
+    if format is not None and format not in trackfiles.FORMATS:
+        raise HTTPException(status_code=400, detail='format must be gpx or kml')
+    os.makedirs(imports.IMPORT_DIR, exist_ok=True)
+    job_path = imports.upload_path(models.uuid4_str())
+    size, head = 0, b''
+    try:
+        with open(job_path, 'wb') as f:
+            # Body parts are small; gather them so each thread hop writes a whole buffer
+            pending = bytearray()
+            async for part in request.stream():
+                size += len(part)
+                if size > imports.IMPORT_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail=f'Imports are limited to {imports.IMPORT_MAX_BYTES} bytes')
+                if len(head) < _SNIFF_BYTES:
+                    head += part[:_SNIFF_BYTES]
+                pending += part
+                if len(pending) >= _WRITE_BYTES:
+                    await run_in_threadpool(f.write, bytes(pending))
+                    pending.clear()
+            if pending:
+                await run_in_threadpool(f.write, bytes(pending))
+        content_type = request.headers.get('content-type', '').split(';')[0].strip().lower()
+        fmt = format or _CONTENT_TYPES.get(content_type) or trackfiles.sniff(head)
+        if size == 0:
+            raise HTTPException(status_code=400, detail='The request body is empty')
+        if fmt is None:
+            raise HTTPException(status_code=400, detail='Not a GPX or KML file')
+        job = await run_in_threadpool(_create_job, db, user_id, device_id, fmt, size)
+    except BaseException:
+        os.remove(job_path)
+        raise
+    path = imports.upload_path(job.id)
+    os.replace(job_path, path)
+    imports.start(job.id, user_id, device_id, fmt, path)
+    return _to_response(job, user_id)
+
+
+@router.get('/breadcrumbImports/{import_id}', response_model=schemas.BreadcrumbImportResponse)
+def get_import(user_id: str, device_id: str, import_id: str, db: Session = Depends(get_read_db)):
+    job = (
+        db.query(models.BreadcrumbImport)
+        .filter(
+            models.BreadcrumbImport.id == import_id,
+            models.BreadcrumbImport.device_id == device_id,
+            models.BreadcrumbImport.user_id == user_id,
+        )
+        .first()
+    )
+    if not job:
+        raise HTTPException(status_code=404, detail='Import not found')
+    return _to_response(job, user_id)
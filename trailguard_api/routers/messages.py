@@ -0,0 +1,165 @@
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from .. import changes, models, schemas
+from ..database import get_db
+from ..notify import Notifier
+from ..pagination import PageTokenError, decode_page_token, encode_page_token, keyset_after
+from ..tracing import TracedRoute
+
+
+router = APIRouter(prefix='/v1/users/{user_id}/messages', tags=['Messages'], route_class=TracedRoute)
+
+# Woken by message writes in this process so long-polls don't poll the DB
+message_notifier = Notifier()
+
+_KEYS = (models.Message.create_time, models.Message.id)
+# create_time is stamped before commit, so a write can commit behind a newer
+# one; watching follows the per-user change sequence, which commits in order
+_WATCH_KEYS = (models.Message.change_seq, models.Message.id)
+_LIST_FINGERPRINT = 'messages.list'
+_WATCH_FINGERPRINT = 'messages.watch.seq'
+
+
+def _to_response(m: dict, user_id: str) -> schemas.MessageResponse:
+    loc = None
+    if m['lat'] is not None and m['lng'] is not None:
+        loc = schemas.Location(lat=m['lat'], lng=m['lng'], accuracy_meters=m['accuracy_meters'])
+    return schemas.MessageResponse(
+        name=f'users/{user_id}/messages/{m["id"]}',
+        text=m['text'],
+        device_id=m['device_id'],
+        location=loc,
+        create_time=m['create_time'],
+    )
+
+
+def _row(user_id: str, p: schemas.MessagePayload, now: datetime, seq: int) -> dict:
+    return {
+        'id': models.uuid7_str(),
+        'user_id': user_id,
+        'device_id': p.device_id,
+        'text': p.text,
+        'lat': p.location.lat if p.location else None,
+        'lng': p.location.lng if p.location else None,
+        'accuracy_meters': p.location.accuracy_meters if p.location else None,
+        'create_time': now,
+        'change_seq': seq,
+    }
+
+
+def _insert(db: Session, user_id: str, payloads: List[schemas.MessagePayload]) -> List[dict]:
+    if not payloads:
+        return []
+    device_ids = {p.device_id for p in payloads if p.device_id is not None}
+    if device_ids:
+        D = models.Device
+        owned = db.execute(select(D.id).where(D.id.in_(device_ids), D.user_id == user_id)).scalars().all()
+        if len(owned) < len(device_ids):
+            raise HTTPException(status_code=404, detail='Device not found')
+    now = datetime.utcnow()
+    # Holds the user's sequence row until commit, so watchers see writes in sequence order
+    seq = changes.bump(db, user_id)
+    rows = [_row(user_id, p, now, seq) for p in payloads]
+    # Single executemany; ids and timestamps are generated here so no refresh is needed
+    db.execute(insert(models.Message), rows)
+    db.commit()
+    message_notifier.notify(user_id)
+    return rows
+
+
+def _as_dict(m: models.Message) -> dict:
+    return {
+        c: getattr(m, c) for c in ('id', 'device_id', 'text', 'lat', 'lng', 'accuracy_meters', 'create_time', 'change_seq')
+    }
+
+
+def _page(db: Session, user_id: str, limit: int, after: Optional[list], descending: bool, keys=_KEYS) -> List[dict]:
+    q = db.query(models.Message).filter(models.Message.user_id == user_id)
+    if after is not None:
+        q = q.filter(keyset_after(keys, after, descending))
+    order = [k.desc() for k in keys] if descending else [k.asc() for k in keys]
+    rows = [_as_dict(m) for m in q.order_by(*order).limit(limit).all()]
+    # End the read transaction so long-polls don't pin a pooled connection
+    db.rollback()
+    return rows
+
+
+def _decode(token: str, fingerprint: str) -> list:
+    try:
+        return decode_page_token(token, fingerprint)
+    except PageTokenError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _watch_token(seq: int, message_id: Optional[str] = None) -> str:
+    # Without an id the token is past every message up to ``seq``
+    key = [seq] if message_id is None else [seq, message_id]
+    return encode_page_token(key, _WATCH_FINGERPRINT)
+
+
+@router.post('', response_model=schemas.MessageResponse, status_code=201)
+def create_message(user_id: str, payload: schemas.MessageCreate, db: Session = Depends(get_db)):
+    row = _insert(db, user_id, [payload.message])[0]
+    return _to_response(row, user_id)
+
+
+@router.post(':batchCreate', response_model=schemas.MessageBatchCreateResponse)
+def batch_create_messages(user_id: str, payload: schemas.MessageBatchCreateRequest, db: Session = Depends(get_db)):
+    rows = _insert(db, user_id, payload.messages)
+    return schemas.MessageBatchCreateResponse(messages=[_to_response(r, user_id) for r in rows])
+
+
+@router.get('', response_model=schemas.MessageListResponse)
+async def list_messages(
+    user_id: str,
+    pageSize: int = Query(50, ge=1, le=500),
+    pageToken: Optional[str] = None,
+    watchToken: Optional[str] = None,
+    waitFor: float = Query(0, ge=0, le=60, description='Seconds to wait for new messages when watching'),
+    db: Session = Depends(get_db),
+):
+    """List messages newest first on idx_messages_user_time.
+
+    Without ``watchToken`` this is a normal keyset-paginated listing. The
+    response's ``watchToken`` marks the user's change sequence; passing it back
+    returns only newer messages (oldest ``pageSize`` of them, newest first),
+    waiting up to ``waitFor`` seconds for one to arrive.
+    """
+    if watchToken is None:
+        after = _decode(pageToken, _LIST_FINGERPRINT) if pageToken else None
+        # One extra row tells us whether another page exists
+        # Head before rows: a message committed in between is listed and then
+        # watched again, rather than missed
+        head = None if pageToken else await run_in_threadpool(changes.head, db, user_id)
+        rows = await run_in_threadpool(_page, db, user_id, pageSize + 1, after, True)
+        next_token = None
+        if len(rows) > pageSize:
+            rows = rows[:pageSize]
+            next_token = encode_page_token([rows[-1]['create_time'], rows[-1]['id']], _LIST_FINGERPRINT)
+        # Only the first page knows the newest message
+        watch = None if pageToken else _watch_token(head)
+        return schemas.MessageListResponse(
+            messages=[_to_response(r, user_id) for r in rows], nextPageToken=next_token, watchToken=watch
+        )
+
+    after = _decode(watchToken, _WATCH_FINGERPRINT)
+    deadline = time.monotonic() + waitFor
+    while True:
+        with message_notifier.subscribe(user_id) as sub:
+            rows = await run_in_threadpool(_page, db, user_id, pageSize, after, False, _WATCH_KEYS)
+            remaining = deadline - time.monotonic()
+            if rows or remaining <= 0:
+                break
+            await sub.wait(remaining)
+    if rows:
+        watchToken = _watch_token(rows[-1]['change_seq'], rows[-1]['id'])
+    return schemas.MessageListResponse(
+        messages=[_to_response(r, user_id) for r in reversed(rows)], nextPageToken=None, watchToken=watchToken
+    )
@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends
+
+from .. import schemas
+from ..database import get_shard_dbs
+from ..overdue import list_overdue
+from ..shards import ShardSessions
+from ..tracing import TracedRoute
+
+
+router = APIRouter(prefix='/v1/overdueCheckIns', tags=['CheckIns'], route_class=TracedRoute)
+
+
+@router.get('', response_model=schemas.OverdueCheckInListResponse)
+def list_overdue_checkins(dbs: ShardSessions = Depends(get_shard_dbs)):
+    """Users who missed their promised check-in and haven't checked in since, most overdue first."""
+    return schemas.OverdueCheckInListResponse(
+        overdueCheckIns=[
+            schemas.OverdueCheckIn(
+                name=f'users/{a.user_id}/checkIns/{a.check_in_id}',
+                user_id=a.user_id,
+                due_time=a.due_time,
+                alert_time=a.alert_time,
+            )
+            for a in list_overdue(dbs.all())
+        ]
+    )
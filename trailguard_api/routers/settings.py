@@ -4,11 +4,12 @@ from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
-from .. import models, schemas
+from .. import changes, models, schemas
 from ..database import get_db
+from ..tracing import TracedRoute
 
 
-router = APIRouter(prefix='/v1/users/{user_id}/settings', tags=['Settings'])
+router = APIRouter(prefix='/v1/users/{user_id}/settings', tags=['Settings'], route_class=TracedRoute)
 
 
 def _ensure_settings(db: Session, user_id: str) -> models.UserSetting:
@@ -16,6 +17,7 @@ def _ensure_settings(db: Session, user_id: str) -> models.UserSetting:
     if not s:
         s = models.UserSetting(user_id=user_id)
         db.add(s)
+        changes.stamp(db, user_id, s)
         db.commit()
         db.refresh(s)
     return s
@@ -72,6 +74,7 @@ def patch_settings(
         maybe('geofence_radius_meters', payload.geofence_radius_meters)
 
     s.update_time = datetime.utcnow()
+    changes.stamp(db, user_id, s)
     db.commit()
     db.refresh(s)
     return _to_response(s, user_id)
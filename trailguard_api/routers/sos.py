@@ -1,14 +1,17 @@
 from datetime import datetime
 from typing import Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from sqlalchemy.orm import Session
 
 from .. import models, schemas
-from ..database import get_db
+from ..coalesce import coalesced_json
+from ..database import get_db, shard_of
+from ..sos_index import bump_version, sos_index
+from ..tracing import TracedRoute
 
 
-router = APIRouter(prefix='/v1/users/{user_id}/sos', tags=['SOS'])
+router = APIRouter(prefix='/v1/users/{user_id}/sos', tags=['SOS'], route_class=TracedRoute)
 
 
 def _active_session(db: Session, user_id: str) -> Optional[models.SOSSession]:
@@ -38,9 +41,8 @@ def _to_status(sess: Optional[models.SOSSession], user_id: str) -> schemas.SOSSt
 
 
 @router.get('', response_model=schemas.SOSStatusResponse)
-def get_status(user_id: str, db: Session = Depends(get_db)):
-    sess = _active_session(db, user_id)
-    return _to_status(sess, user_id)
+def get_status(user_id: str, request: Request, db: Session = Depends(get_db)):
+    return coalesced_json(request, lambda: _to_status(_active_session(db, user_id), user_id))
 
 
 @router.post(':activate', response_model=schemas.SOSStatusResponse)
@@ -57,8 +59,10 @@ def activate(user_id: str, payload: Optional[schemas.SOSActivateRequest] = None,
         sess.last_lng = payload.location.lng
         sess.last_accuracy_meters = payload.location.accuracy_meters
     sess.cancel_time = None
+    version = bump_version(db)
     db.commit()
     db.refresh(sess)
+    sos_index.record_active(version, sess, shard_of(user_id))
     return _to_status(sess, user_id)
 
 
@@ -67,7 +71,9 @@ def cancel(user_id: str, db: Session = Depends(get_db)):
     sess = _active_session(db, user_id)
     if sess:
         sess.cancel_time = datetime.utcnow()
+        version = bump_version(db)
         db.commit()
         db.refresh(sess)
+        sos_index.record_cancel(version, user_id, shard_of(user_id))
     return _to_status(_active_session(db, user_id), user_id)
 
@@ -0,0 +1,101 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select, union_all
+from sqlalchemy.orm import Session
+
+from .. import changes, models, schemas
+from ..database import get_read_db
+from ..pagination import PageTokenError, decode_page_token, encode_page_token, keyset_after
+from ..tracing import TracedRoute
+from .breadcrumbs import _to_response as _breadcrumb_response
+from .checkins import to_checkin_response
+from .devices import _to_device_response
+from .family import _to_response as _family_response
+from .settings import _to_response as _settings_response
+
+
+router = APIRouter(prefix='/v1/users/{user_id}', tags=['Sync'], route_class=TracedRoute)
+
+_SYNC_FINGERPRINT = 'users.sync'
+
+
+def _decode(token: Optional[str]):
+    """(sequence, breadcrumb id) the client has seen up to; (-1, None) means nothing yet."""
+    if not token:
+        return -1, None
+    try:
+        seq, after_id = decode_page_token(token, _SYNC_FINGERPRINT)
+        return int(seq), after_id
+    except (PageTokenError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail='Invalid sync token')
+
+
+@router.get(':sync', response_model=schemas.SyncResponse)
+def sync(
+    user_id: str,
+    since: Optional[str] = None,
+    pageSize: int = Query(1000, ge=1, le=5000),
+    db: Session = Depends(get_read_db),
+):
+    """Resources changed since ``since`` (a previous ``syncToken``); omit it for a full sync.
+
+    Breadcrumbs are paged in (change_seq, id) order. A page that stops inside
+    a sequence number returns everything else up to that number and
+    ``hasMore``; call again with its ``syncToken`` to continue.
+    """
+    seq, after_id = _decode(since)
+    top = changes.head(db, user_id)
+
+    # One (change_seq, id)-ordered LIMIT scan of idx_breadcrumbs_device_change per
+    # device, merged: only pageSize + 1 rows per device are read, never the
+    # user's whole history
+    B = models.Breadcrumb
+    device_ids = db.execute(select(models.Device.id).where(models.Device.user_id == user_id)).scalars().all()
+    if after_id is not None:
+        after = keyset_after((B.change_seq, B.id), (seq, after_id), descending=False)
+    else:
+        after = B.change_seq > seq
+    cols = (B.id, B.device_id, B.lat, B.lng, B.create_time, B.change_seq)
+    per_device = [
+        select(*cols).where(B.device_id == d, after, B.change_seq <= top).order_by(B.change_seq, B.id).limit(pageSize + 1)
+        for d in device_ids
+    ]
+    crumbs = []
+    if per_device:
+        merged = union_all(*[q.subquery().select() for q in per_device]).subquery()
+        crumbs = db.execute(select(merged).order_by(merged.c.change_seq, merged.c.id).limit(pageSize + 1)).all()
+    has_more = len(crumbs) > pageSize
+    if has_more:
+        crumbs = crumbs[:pageSize]
+        upto, token = crumbs[-1].change_seq, [crumbs[-1].change_seq, crumbs[-1].id]
+    else:
+        upto, token = top, [top, None]
+
+    def changed(model, owner):
+        return (
+            db.query(model)
+            .filter(owner == user_id, model.change_seq > seq, model.change_seq <= upto)
+            .order_by(model.change_seq)
+            .all()
+        )
+
+    devices = changed(models.Device, models.Device.user_id)
+    checkins = changed(models.CheckIn, models.CheckIn.user_id)
+    members = changed(models.FamilyMember, models.FamilyMember.user_id)
+    settings = changed(models.UserSetting, models.UserSetting.user_id)
+    T = models.ChangeTombstone
+    deleted = db.execute(
+        select(T.name).where(T.user_id == user_id, T.seq > seq, T.seq <= upto).order_by(T.seq)
+    ).scalars().all()
+
+    return schemas.SyncResponse(
+        devices=[_to_device_response(d, user_id) for d in devices],
+        checkIns=[to_checkin_response(c) for c in checkins],
+        familyMembers=[_family_response(m, user_id) for m in members],
+        settings=_settings_response(settings[0], user_id) if settings else None,
+        breadcrumbs=[_breadcrumb_response(b, user_id, b.device_id) for b in crumbs],
+        deleted=deleted,
+        syncToken=encode_page_token(token, _SYNC_FINGERPRINT),
+        hasMore=has_more,
+    )
@@ -22,6 +22,9 @@ class CheckInPayload(BaseModel):
     message: Optional[str] = None
     device_id: Optional[str] = Field(None, alias='deviceId')
     location: Optional[Location] = None
+    next_check_in_time: Optional[datetime] = Field(
+        None, alias='nextCheckInTime', description='When the user promises to check in again; missing it raises an alert'
+    )
 
     model_config = ConfigDict(populate_by_name=True)
 
@@ -61,6 +64,36 @@ class SOSStatusResponse(BaseModel):
     model_config = ConfigDict(populate_by_name=True)
 
 
+class ActiveSOSSession(BaseModel):
+    name: str
+    user_id: str = Field(..., alias='userId')
+    message: Optional[str] = None
+    start_time: datetime = Field(..., alias='startTime')
+    last_known_location: Optional[Location] = Field(None, alias='lastKnownLocation')
+
+    model_config = ConfigDict(populate_by_name=True)
+
+
+class ActiveSOSListResponse(BaseModel):
+    sessions: List[ActiveSOSSession]
+    version: int
+
+    model_config = ConfigDict(populate_by_name=True)
+
+
+class OverdueCheckIn(BaseModel):
+    name: str = Field(..., description='The check-in whose nextCheckInTime was missed')
+    user_id: str = Field(..., alias='userId')
+    due_time: datetime = Field(..., alias='dueTime')
+    alert_time: datetime = Field(..., alias='alertTime')
+
+    model_config = ConfigDict(populate_by_name=True)
+
+
+class OverdueCheckInListResponse(BaseModel):
+    overdueCheckIns: List[OverdueCheckIn]
+
+
 # Devices
 class DevicePayload(BaseModel):
     battery_percent: Optional[int] = Field(None, alias='batteryPercent')
@@ -96,6 +129,31 @@ class FirmwareInfoResponse(BaseModel):
     releaseNotes: Optional[str] = None
 
 
+class FirmwareUpdateDevice(BaseModel):
+    name: str
+    currentVersion: Optional[str] = None
+    targetVersion: str
+
+
+class FirmwareUpdateListResponse(BaseModel):
+    latestVersion: str
+    devices: List[FirmwareUpdateDevice]
+    nextPageToken: Optional[str] = None
+
+
+class FirmwareRolloutRequest(BaseModel):
+    targetVersion: Optional[str] = Field(None, description='Defaults to the latest release')
+    deviceIds: Optional[List[str]] = Field(None, max_length=10000, description="Defaults to all of the user's devices")
+
+
+class FirmwareRolloutResponse(BaseModel):
+    targetVersion: str
+    targetedCount: int
+    totalDevices: int
+    updatedDevices: int
+    pendingDevices: int
+
+
 # Breadcrumbs
 class LatLng(BaseModel):
     latitude: float
@@ -126,11 +184,44 @@ class BreadcrumbCreateRequest(BaseModel):
 
 
 class BreadcrumbBatchCreateRequest(BaseModel):
-    breadcrumbs: List[BreadcrumbPayload]
+    """Either ``breadcrumbs`` or the columnar ``lat``/``lng`` (plus optional ``t``/``acc``) arrays."""
+
+    breadcrumbs: Optional[List[BreadcrumbPayload]] = None
+    t: Optional[List[float]] = Field(None, description='Recorded time of each point, Unix seconds')
+    lat: Optional[List[float]] = None
+    lng: Optional[List[float]] = None
+    acc: Optional[List[Optional[float]]] = Field(None, description='Accuracy in meters; null when unknown')
 
 
 class BreadcrumbBatchCreateResponse(BaseModel):
     createdCount: int
+    droppedCount: int = Field(0, description='Points filtered out as inaccurate, speed spikes or jitter')
+
+
+class BreadcrumbImportResponse(BaseModel):
+    name: str
+    state: str = Field(..., description='RUNNING, SUCCEEDED or FAILED')
+    format: str
+    total_bytes: int = Field(..., alias='totalBytes')
+    bytes_read: int = Field(..., alias='bytesRead')
+    points_parsed: int = Field(..., alias='pointsParsed')
+    created_count: int = Field(..., alias='createdCount')
+    dropped_count: int = Field(..., alias='droppedCount')
+    error: Optional[str] = None
+    create_time: Optional[datetime] = Field(None, alias='createTime')
+    update_time: Optional[datetime] = Field(None, alias='updateTime')
+
+    model_config = ConfigDict(populate_by_name=True)
+
+
+class HeatmapTileResponse(BaseModel):
+    name: str
+    size: int
+    total: int
+    max: int
+    counts: Optional[str] = Field(
+        None, description='Base64 of size*size little-endian uint32 counts, row-major from the north-west corner'
+    )
 
 
 # Family
@@ -138,6 +229,7 @@ class FamilyMemberPayload(BaseModel):
     display_name: str = Field(..., alias='displayName')
     status: Optional[str] = None
     last_seen_time: Optional[datetime] = Field(None, alias='lastSeenTime')
+    member_user_id: Optional[str] = Field(None, alias='memberUserId')
 
     model_config = ConfigDict(populate_by_name=True)
 
@@ -152,6 +244,20 @@ class FamilyListResponse(BaseModel):
     model_config = ConfigDict(populate_by_name=True)
 
 
+class FamilyDashboardMember(FamilyMemberResponse):
+    device: Optional[DeviceResponse] = None
+    last_known_location: Optional[Location] = Field(None, alias='lastKnownLocation')
+    last_position_time: Optional[datetime] = Field(None, alias='lastPositionTime')
+    sos: Optional[SOSStatusResponse] = None
+
+
+class FamilyDashboardResponse(BaseModel):
+    name: str
+    familyMembers: List[FamilyDashboardMember]
+
+    model_config = ConfigDict(populate_by_name=True)
+
+
 # Settings
 class SettingsPayload(BaseModel):
     auto_alerts: Optional[bool] = Field(None, alias='autoAlerts')
@@ -164,3 +270,51 @@ class SettingsPayload(BaseModel):
 
 class SettingsResponse(SettingsPayload):
     name: str
+
+
+# Messages
+class MessagePayload(BaseModel):
+    text: str = Field(..., min_length=1, max_length=280)
+    device_id: Optional[str] = Field(None, alias='deviceId')
+    location: Optional[Location] = None
+
+    model_config = ConfigDict(populate_by_name=True)
+
+
+class MessageCreate(BaseModel):
+    message: MessagePayload
+
+
+class MessageResponse(MessagePayload):
+    name: str
+    create_time: datetime = Field(..., alias='createTime')
+
+
+class MessageBatchCreateRequest(BaseModel):
+    messages: List[MessagePayload] = Field(..., max_length=1000)
+
+
+class MessageBatchCreateResponse(BaseModel):
+    messages: List[MessageResponse]
+
+
+class MessageListResponse(BaseModel):
+    messages: List[MessageResponse]
+    nextPageToken: Optional[str] = None
+    watchToken: Optional[str] = None
+
+    model_config = ConfigDict(populate_by_name=True)
+
+
+# Sync
+class SyncResponse(BaseModel):
+    devices: List[DeviceResponse]
+    checkIns: List[CheckInResponse]
+    familyMembers: List[FamilyMemberResponse]
+    settings: Optional[SettingsResponse] = None
+    breadcrumbs: List[BreadcrumbResponse]
+    deleted: List[str]
+    syncToken: str
+    hasMore: bool
+
+    model_config = ConfigDict(populate_by_name=True)
@@ -0,0 +1,356 @@
+"""Hash sharding of per-user data.
+
+Every route is scoped under ``/v1/users/{user_id}``, so a user's rows (and
+their devices' breadcrumbs) live together on one shard. ``user_id`` hashes
+(crc32) to one of ``BUCKETS`` fixed virtual buckets and a bucket map assigns
+each bucket to a shard. The bucket count never changes: rebalancing moves
+whole buckets, so only the users of a moved bucket are copied.
+
+The map is a JSON file (``SHARD_MAP_PATH``) that every worker rereads when its
+mtime changes, at most every ``SHARD_MAP_CHECK_SECONDS``. Without a map file
+every bucket stays on shard 0, so adding a shard never reroutes users whose
+rows haven't been moved; ``--init`` spreads an empty fleet evenly instead.
+
+Fleet-wide tables (``sos_index_version``, ``heatmap_cells``) exist on every
+shard and are combined on read: the SOS index tracks one version per shard
+and heatmap tiles sum each shard's counts.
+
+    python -m trailguard_api.shards --status
+    python -m trailguard_api.shards --rebalance [--dry-run]
+    python -m trailguard_api.shards --move BUCKET SHARD
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, delete, func, insert, select, update
+from sqlalchemy.orm import Session, sessionmaker
+
+from . import models
+from .tracing import span
+
+BUCKETS = 1024
+SHARD_MAP_PATH = os.getenv('SHARD_MAP_PATH', 'data/shard_map.json')
+CHECK_SECONDS = float(os.getenv('SHARD_MAP_CHECK_SECONDS', '5'))
+_COPY_USERS = 500
+_COPY_ROWS = 5000
+
+logger = logging.getLogger(__name__)
+
+
+def bucket_of(user_id: str) -> int:
+    """Stable across processes and Python versions, unlike ``hash()``."""
+    return zlib.crc32(user_id.encode()) % BUCKETS
+
+
+def even_map(shards: int) -> List[int]:
+    return [b % shards for b in range(BUCKETS)]
+
+
+def read_map(path: Path, shards: int) -> List[int]:
+    data = json.loads(Path(path).read_text())
+    buckets = [int(s) for s in data['buckets']]
+    if len(buckets) != BUCKETS or any(not (0 <= s < shards) for s in buckets):
+        raise ValueError(f'shard map must assign {BUCKETS} buckets to shards 0..{shards - 1}')
+    return buckets
+
+
+def write_map(path: Path, buckets: Sequence[int]) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + '.tmp')
+    tmp.write_text(json.dumps({'buckets': list(buckets)}))
+    # Atomic, so a worker never reads a half-written map
+    os.replace(tmp, path)
+
+
+class ShardMap:
+    def __init__(self, engines: Sequence, path: str = SHARD_MAP_PATH, check_seconds: float = CHECK_SECONDS):
+        self.engines = list(engines)
+        self.sessionmakers = [sessionmaker(bind=e, autoflush=False, autocommit=False) for e in self.engines]
+        self.path = Path(path)
+        self.check_seconds = check_seconds
+        self._buckets = [0] * BUCKETS
+        self._mtime: Optional[int] = None
+        self._checked = float('-inf')
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.engines)
+
+    def buckets(self) -> List[int]:
+        now = time.monotonic()
+        if now - self._checked >= self.check_seconds:
+            with self._lock:
+                if now - self._checked >= self.check_seconds:
+                    self._checked = now
+                    self._reload_if_changed()
+        return self._buckets
+
+    def _reload_if_changed(self) -> None:
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            self._buckets = read_map(self.path, len(self.engines))
+        except (OSError, ValueError, KeyError, TypeError):
+            # Keep routing with the last good map rather than guess
+            logger.exception('ignoring invalid shard map %s', self.path)
+            return
+        self._mtime = mtime
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._checked = float('-inf')
+
+    def shard_of(self, user_id: Optional[str]) -> int:
+        """Shard holding ``user_id``'s rows; requests without a user use shard 0."""
+        if len(self.engines) == 1 or not user_id:
+            return 0
+        return self.buckets()[bucket_of(user_id)]
+
+
+class ShardSessions:
+    """Lazily opened sessions, one per shard, for work that spans users."""
+
+    def __init__(self, shard_map: ShardMap, factories: Optional[Sequence] = None):
+        self.shard_map = shard_map
+        self.factories = list(factories or shard_map.sessionmakers)
+        self._open: Dict[int, Session] = {}
+
+    def shard(self, i: int) -> Session:
+        db = self._open.get(i)
+        if db is None:
+            with span('get_db', shard=i):
+                db = self._open[i] = self.factories[i]()
+        return db
+
+    def for_user(self, user_id: str) -> Session:
+        return self.shard(self.shard_map.shard_of(user_id))
+
+    def group(self, user_ids: Iterable[str]) -> Dict[int, List[str]]:
+        """``user_ids`` by shard, so callers can run one query per shard."""
+        out: Dict[int, List[str]] = {}
+        for user_id in user_ids:
+            out.setdefault(self.shard_map.shard_of(user_id), []).append(user_id)
+        return out
+
+    def all(self) -> List[Session]:
+        return [self.shard(i) for i in range(len(self.factories))]
+
+    def rollback(self) -> None:
+        for db in self._open.values():
+            db.rollback()
+
+    def close(self) -> None:
+        for db in self._open.values():
+            db.close()
+        self._open.clear()
+
+
+def _user_filter(table, user_ids: Sequence[str], device_ids: Sequence[str]):
+    """Rows of ``table`` owned by ``user_ids``; None for fleet-wide tables."""
+    if 'user_id' in table.c:
+        return table.c.user_id.in_(user_ids)
+    if table.name == models.User.__tablename__:
+        return table.c.id.in_(user_ids)
+    if 'device_id' in table.c:
+        return table.c.device_id.in_(device_ids)
+    return None
+
+
+def _owned(db: Session, user_ids: Sequence[str]):
+    device_ids = db.execute(select(models.Device.id).where(models.Device.user_id.in_(user_ids))).scalars().all()
+    for table in models.Base.metadata.sorted_tables:
+        cond = _user_filter(table, user_ids, device_ids)
+        if cond is not None:
+            yield table, cond
+
+
+def copy_users(src: Session, dst: Session, user_ids: Sequence[str], mirror: bool = False) -> int:
+    """Copy every row owned by ``user_ids``; returns the number of rows written.
+
+    Rows already on ``dst`` are skipped, unless ``mirror`` is set: then they
+    are overwritten with the source's copy, and ``dst`` rows no longer on the
+    source are deleted, so writes made to the source since an earlier copy
+    (an SOS cancel, a removed family member) carry over.
+    """
+    copied = 0
+    for i in range(0, len(user_ids), _COPY_USERS):
+        chunk = user_ids[i:i + _COPY_USERS]
+        if mirror:
+            # Children first, so foreign keys hold throughout; owned rows are
+            # found via dst's devices, which include any deleted on src
+            for table, cond in reversed(list(_owned(dst, chunk))):
+                _drop_missing(src, dst, table, cond)
+        for table, cond in _owned(src, chunk):
+            (pk,) = table.primary_key.columns
+            result = src.execute(select(table).where(cond).execution_options(yield_per=_COPY_ROWS))
+            for part in result.partitions():
+                rows = [dict(r._mapping) for r in part]
+                present = set(dst.execute(select(pk).where(pk.in_([r[pk.name] for r in rows]))).scalars())
+                new = [r for r in rows if r[pk.name] not in present]
+                if new:
+                    dst.execute(insert(table), new)
+                    copied += len(new)
+                if mirror and present:
+                    # Core executemany: SET takes the columns named in each parameter set
+                    changed = [dict(r, _pk=r[pk.name]) for r in rows if r[pk.name] in present]
+                    dst.execute(update(table).where(pk == bindparam('_pk')), changed)
+                    copied += len(changed)
+        dst.commit()
+    return copied
+
+
+def _drop_missing(src: Session, dst: Session, table, cond) -> None:
+    (pk,) = table.primary_key.columns
+    result = dst.execute(select(pk).where(cond).execution_options(yield_per=_COPY_ROWS))
+    for part in result.partitions():
+        ids = [r[0] for r in part]
+        gone = set(ids) - set(src.execute(select(pk).where(pk.in_(ids))).scalars())
+        if gone:
+            dst.execute(delete(table).where(pk.in_(gone)))
+
+
+def delete_users(db: Session, user_ids: Sequence[str]) -> int:
+    deleted = 0
+    for i in range(0, len(user_ids), _COPY_USERS):
+        chunk = user_ids[i:i + _COPY_USERS]
+        # Children first, so foreign keys hold throughout
+        for table, cond in reversed(list(_owned(db, chunk))):
+            deleted += db.execute(delete(table).where(cond)).rowcount
+        db.commit()
+    return deleted
+
+
+def users_by_bucket(db: Session, buckets: Iterable[int]) -> Dict[int, List[str]]:
+    """Users of each of ``buckets``, from one pass over ``users``."""
+    out: Dict[int, List[str]] = {b: [] for b in buckets}
+    for user_id in db.execute(select(models.User.id).execution_options(yield_per=_COPY_ROWS)).scalars():
+        users = out.get(bucket_of(user_id))
+        if users is not None:
+            users.append(user_id)
+    return out
+
+
+def plan(buckets: Sequence[int], shards: int) -> List[Tuple[int, int, int]]:
+    """Fewest ``(bucket, src, dst)`` moves that even out buckets per shard."""
+    target = [BUCKETS // shards + (1 if s < BUCKETS % shards else 0) for s in range(shards)]
+    owned: Dict[int, List[int]] = {s: [] for s in range(shards)}
+    for b, s in enumerate(buckets):
+        owned[s].append(b)
+    surplus = [b for s in range(shards) for b in owned[s][target[s]:]]
+    moves = []
+    for dst in range(shards):
+        while len(owned[dst]) < target[dst]:
+            b = surplus.pop()
+            moves.append((b, buckets[b], dst))
+            owned[dst].append(b)
+    return moves
+
+
+def move_buckets(
+    shard_map: ShardMap, moves: Dict[int, int], settle: float = 2 * CHECK_SECONDS, sleep=time.sleep
+) -> int:
+    """Move buckets (``{bucket: dst shard}``) and their users; returns the number of users moved.
+
+    Rows are copied, the map is switched once for every bucket, and after
+    ``settle`` seconds (long enough for every worker to reload the map) the
+    source is copied again in ``mirror`` mode, which carries over the rows
+    written, changed or deleted there in the meantime, before the source rows
+    are deleted. Each source shard's users are listed once per pass, however
+    many of its buckets move. A write that reaches the source after the
+    second copy, from a worker that still hasn't reloaded the map, is lost.
+    """
+    buckets = list(shard_map.buckets())
+    by_src: Dict[int, Dict[int, int]] = {}
+    for bucket, dst in moves.items():
+        if buckets[bucket] != dst:
+            by_src.setdefault(buckets[bucket], {})[bucket] = dst
+    if not by_src:
+        return 0
+
+    def copy(mirror: bool) -> int:
+        n = 0
+        for src, targets in by_src.items():
+            s = shard_map.sessionmakers[src]()
+            try:
+                users = users_by_bucket(s, targets)
+                for dst in sorted(set(targets.values())):
+                    user_ids = [u for b, d in targets.items() if d == dst for u in users[b]]
+                    d = shard_map.sessionmakers[dst]()
+                    try:
+                        copy_users(s, d, user_ids, mirror=mirror)
+                    finally:
+                        d.close()
+                    if mirror:
+                        delete_users(s, user_ids)
+                    n += len(user_ids)
+            finally:
+                s.close()
+        return n
+
+    copy(mirror=False)
+    for bucket, dst in moves.items():
+        buckets[bucket] = dst
+    write_map(shard_map.path, buckets)
+    shard_map.invalidate()
+    sleep(settle)
+    return copy(mirror=True)
+
+
+def move_bucket(shard_map: ShardMap, bucket: int, dst: int, settle: float = 2 * CHECK_SECONDS, sleep=time.sleep) -> int:
+    """Move one bucket's users to shard ``dst``; see ``move_buckets``."""
+    return move_buckets(shard_map, {bucket: dst}, settle=settle, sleep=sleep)
+
+
+def main():  # pragma: no cover
+    from .database import shard_map
+
+    parser = argparse.ArgumentParser(description='Inspect and rebalance user shards.')
+    parser.add_argument('--status', action='store_true', help='Buckets and users per shard')
+    parser.add_argument('--init', action='store_true', help='Write an even map for an empty fleet')
+    parser.add_argument('--rebalance', action='store_true', help='Move buckets until shards hold equal shares')
+    parser.add_argument('--move', nargs=2, type=int, metavar=('BUCKET', 'SHARD'))
+    parser.add_argument('--settle', type=float, default=2 * CHECK_SECONDS)
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    if args.init:
+        if shard_map.path.exists():
+            raise SystemExit(f'{shard_map.path} exists; use --rebalance to move users')
+        write_map(shard_map.path, even_map(len(shard_map)))
+        print(f'wrote {shard_map.path} for {len(shard_map)} shards')
+    elif args.move or args.rebalance:
+        moves = plan(shard_map.buckets(), len(shard_map)) if args.rebalance else [
+            (args.move[0], shard_map.buckets()[args.move[0]], args.move[1])
+        ]
+        for bucket, src, dst in moves:
+            print(f'bucket {bucket}: shard {src} -> {dst}')
+        if not args.dry_run:
+            moved = move_buckets(shard_map, {bucket: dst for bucket, _, dst in moves}, settle=args.settle)
+            print(f'moved {moved} users in {len(moves)} buckets')
+    elif args.status:
+        buckets = shard_map.buckets()
+        for i, factory in enumerate(shard_map.sessionmakers):
+            db = factory()
+            try:
+                users = db.execute(select(func.count()).select_from(models.User)).scalar()
+            finally:
+                db.close()
+            print(f'shard {i}: {buckets.count(i)} buckets, {users} users')
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
@@ -0,0 +1,160 @@
+"""In-memory fleet-wide index of active SOS sessions.
+
+Dispatch needs "every active SOS, newest first" on every screen refresh. The
+index is rebuilt from the ``idx_sos_sessions_active`` partial index (only rows
+with ``cancel_time IS NULL``) and kept current by the SOS routes, so listings
+never scan ``sos_sessions``.
+
+Each SOS write also bumps a single-row counter in ``sos_index_version`` in the
+same transaction. A worker compares its local version with the DB before
+serving; if another worker has written in the meantime the versions differ and
+the index is rebuilt.
+
+With several shards each keeps its own counter, bumped in the same
+transaction as the shard's SOS rows; the index tracks one version per shard
+and reports their sum.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from . import models
+
+_VERSION_ROW = 1
+
+
+@dataclass(frozen=True)
+class ActiveSOS:
+    session_id: str
+    user_id: str
+    message: Optional[str]
+    start_time: datetime
+    last_lat: Optional[float]
+    last_lng: Optional[float]
+    last_accuracy_meters: Optional[float]
+
+    @classmethod
+    def from_row(cls, s: models.SOSSession) -> 'ActiveSOS':
+        return cls(
+            session_id=s.id,
+            user_id=s.user_id,
+            message=s.message,
+            start_time=s.start_time,
+            last_lat=s.last_lat,
+            last_lng=s.last_lng,
+            last_accuracy_meters=s.last_accuracy_meters,
+        )
+
+
+def _read_version(db: Session) -> int:
+    version = db.execute(
+        select(models.SOSIndexVersion.version).where(models.SOSIndexVersion.id == _VERSION_ROW)
+    ).scalar()
+    return version or 0
+
+
+def _read_versions(dbs: Sequence[Session]) -> List[int]:
+    return [_read_version(db) for db in dbs]
+
+
+def _as_list(dbs: Union[Session, Sequence[Session]]) -> List[Session]:
+    return [dbs] if isinstance(dbs, Session) else list(dbs)
+
+
+def bump_version(db: Session) -> int:
+    """Increment the shard's version inside the caller's transaction and return it."""
+    res = db.execute(
+        update(models.SOSIndexVersion)
+        .where(models.SOSIndexVersion.id == _VERSION_ROW)
+        .values(version=models.SOSIndexVersion.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if res.rowcount == 0:
+        # Tables created via create_all (SQLite/tests) have no seed row
+        db.add(models.SOSIndexVersion(id=_VERSION_ROW, version=1))
+        db.flush()
+        return 1
+    return _read_version(db)
+
+
+class ActiveSOSIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_user: Dict[str, ActiveSOS] = {}
+        self._sorted: Optional[List[ActiveSOS]] = None
+        self._versions: Optional[List[int]] = None
+        self._checked_at = 0.0
+
+    @property
+    def version(self) -> Optional[int]:
+        versions = self._versions
+        return None if versions is None else sum(versions)
+
+    def rebuild(self, dbs: Union[Session, Sequence[Session]]) -> None:
+        """Reload from ``dbs``, one session per shard in shard order."""
+        dbs = _as_list(dbs)
+        # Read the versions first: a write landing between the two reads leaves
+        # us with newer rows than version, which only causes one extra rebuild.
+        versions = _read_versions(dbs)
+        rows = [
+            s for db in dbs for s in db.query(models.SOSSession).filter(models.SOSSession.cancel_time.is_(None)).all()
+        ]
+        by_user: Dict[str, ActiveSOS] = {}
+        for s in rows:
+            cur = by_user.get(s.user_id)
+            if cur is None or s.start_time > cur.start_time:
+                by_user[s.user_id] = ActiveSOS.from_row(s)
+        with self._lock:
+            self._by_user = by_user
+            self._sorted = None
+            self._versions = versions
+            self._checked_at = time.monotonic()
+
+    def ensure_fresh(self, dbs: Union[Session, Sequence[Session]], max_staleness: float = 0.0) -> None:
+        """Rebuild if another worker changed the DB since our last sync.
+
+        ``max_staleness`` lets frequent callers (watchers) share one version
+        check per interval instead of each hitting the DB.
+        """
+        if self._versions is not None and time.monotonic() - self._checked_at < max_staleness:
+            return
+        dbs = _as_list(dbs)
+        if self._versions is not None and _read_versions(dbs) == self._versions:
+            self._checked_at = time.monotonic()
+            return
+        self.rebuild(dbs)
+
+    def _apply(self, version: int, user_id: str, entry: Optional[ActiveSOS], shard: int) -> None:
+        with self._lock:
+            versions = self._versions
+            if versions is None or shard >= len(versions) or version != versions[shard] + 1:
+                # We missed someone else's write; force a rebuild on next read
+                self._versions = None
+                return
+            if entry is None:
+                self._by_user.pop(user_id, None)
+            else:
+                self._by_user[user_id] = entry
+            self._sorted = None
+            self._versions = versions[:shard] + [version] + versions[shard + 1:]
+
+    def record_active(self, version: int, sess: models.SOSSession, shard: int = 0) -> None:
+        self._apply(version, sess.user_id, ActiveSOS.from_row(sess), shard)
+
+    def record_cancel(self, version: int, user_id: str, shard: int = 0) -> None:
+        self._apply(version, user_id, None, shard)
+
+    def snapshot(self) -> Tuple[Optional[int], List[ActiveSOS]]:
+        """Current version and active sessions, newest first."""
+        with self._lock:
+            if self._sorted is None:
+                self._sorted = sorted(self._by_user.values(), key=lambda e: e.start_time, reverse=True)
+            return self.version, self._sorted
+
+
+sos_index = ActiveSOSIndex()
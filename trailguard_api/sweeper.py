@@ -0,0 +1,138 @@
+"""Stale-device sweeper.
+
+Devices only change ``connection_state`` when they PATCH themselves, so a
+tracker whose battery died would stay ONLINE forever. The sweeper runs in the
+API process (started from the lifespan hook) and on every pass flips:
+
+    ONLINE              -> DEGRADED  after DEVICE_DEGRADED_AFTER_SECONDS without a heartbeat
+    ONLINE / DEGRADED   -> OFFLINE   after DEVICE_OFFLINE_AFTER_SECONDS
+
+A live device that never reported ``last_seen_time`` counts as stale, so it
+goes OFFLINE on the first pass.
+
+Each transition is a set-based ``UPDATE ... WHERE id IN (SELECT ... LIMIT n)``
+driven by the partial index ``idx_devices_live_last_seen`` (last_seen_time of
+non-OFFLINE devices), so a pass only reads stale live devices and never scans
+the table. On PostgreSQL the inner SELECT uses ``FOR UPDATE SKIP LOCKED``: a
+device whose heartbeat is in flight is skipped, and the outer WHERE is
+re-checked against the committed heartbeat, so a fresh device is never
+flipped.
+
+Transitions are returned via ``RETURNING``. The flipped devices then get
+their owners' next change sequence (see changes), which is how clients learn
+about them: delta sync returns the new state, and the owners' cached reads are
+invalidated.
+"""
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, List, NamedTuple, Optional
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Session
+
+from . import changes, models
+from .coalesce import read_coalescer
+
+DEGRADED_AFTER_SECONDS = float(os.getenv('DEVICE_DEGRADED_AFTER_SECONDS', '300'))
+OFFLINE_AFTER_SECONDS = float(os.getenv('DEVICE_OFFLINE_AFTER_SECONDS', '1800'))
+SWEEP_INTERVAL_SECONDS = float(os.getenv('DEVICE_SWEEP_INTERVAL_SECONDS', '60'))
+SWEEP_BATCH = int(os.getenv('DEVICE_SWEEP_BATCH', '5000'))
+
+logger = logging.getLogger(__name__)
+
+
+class DeviceTransition(NamedTuple):
+    device_id: str
+    user_id: str
+    from_state: str
+    to_state: str
+    last_seen_time: Optional[datetime]
+
+
+@dataclass
+class SweepReport:
+    degraded: int = 0
+    offline: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+
+
+def _transition(db: Session, from_state: str, to_state: str, cutoff: datetime, now: datetime, batch: int) -> List[DeviceTransition]:
+    """Move up to ``batch`` devices from ``from_state`` to ``to_state`` in one UPDATE."""
+    D = models.Device
+    stale = (D.connection_state == from_state, or_(D.last_seen_time < cutoff, D.last_seen_time.is_(None)))
+    ids = select(D.id).where(*stale).order_by(D.last_seen_time).limit(batch)
+    if db.get_bind().dialect.name == 'postgresql':
+        ids = ids.with_for_update(skip_locked=True)
+    rows = db.execute(
+        update(D)
+        .where(D.id.in_(ids.scalar_subquery()), *stale)
+        .values(connection_state=to_state, update_time=now)
+        .returning(D.id, D.user_id, D.last_seen_time),
+        execution_options={'synchronize_session': False},
+    ).all()
+    db.commit()
+    return [DeviceTransition(r.id, r.user_id, from_state, to_state, r.last_seen_time) for r in rows]
+
+
+def sweep(
+    db: Session,
+    now: Optional[datetime] = None,
+    degraded_after: float = DEGRADED_AFTER_SECONDS,
+    offline_after: float = OFFLINE_AFTER_SECONDS,
+    batch: int = SWEEP_BATCH,
+) -> SweepReport:
+    """One pass; OFFLINE first so a long-dead device goes straight there instead of via DEGRADED."""
+    started = time.perf_counter()
+    now = now or datetime.utcnow()
+    report = SweepReport()
+    steps = (
+        ('ONLINE', 'OFFLINE', now - timedelta(seconds=offline_after)),
+        ('DEGRADED', 'OFFLINE', now - timedelta(seconds=offline_after)),
+        ('ONLINE', 'DEGRADED', now - timedelta(seconds=degraded_after)),
+    )
+    for from_state, to_state, cutoff in steps:
+        while True:
+            transitions = _transition(db, from_state, to_state, cutoff, now, batch)
+            report.batches += 1
+            if transitions:
+                by_user = {}
+                for t in transitions:
+                    by_user.setdefault(t.user_id, []).append(t.device_id)
+                changes.stamp_devices(db, by_user)
+                for user_id in by_user:
+                    read_coalescer.invalidate(user_id)
+                if to_state == 'OFFLINE':
+                    report.offline += len(transitions)
+                else:
+                    report.degraded += len(transitions)
+            if len(transitions) < batch:
+                break
+    report.seconds = time.perf_counter() - started
+    if report.degraded or report.offline:
+        logger.info(
+            'device sweep: %d degraded, %d offline in %.2fs', report.degraded, report.offline, report.seconds
+        )
+    return report
+
+
+async def run_periodically(session_factory: Callable[[], Session], interval: float = SWEEP_INTERVAL_SECONDS):
+    """Background loop for the API lifespan; each pass runs in a worker thread."""
+
+    def once():
+        db = session_factory()
+        try:
+            return sweep(db)
+        finally:
+            db.close()
+
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(once)
+        except Exception:
+            logger.exception('device sweep failed')
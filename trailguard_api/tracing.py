@@ -0,0 +1,301 @@
+"""Lightweight request tracing.
+
+A sampled request gets one trace made of spans:
+
+    request            whole ASGI exchange, until the last body byte is sent
+      route            FastAPI route handler
+        route.prepare  body parsing, Pydantic validation, dependencies
+          get_db       session setup
+        route.endpoint the endpoint function
+          sql          one per statement, via engine events
+        route.encode   response_model validation and JSON encoding
+
+Sampling is decided once per request (head-based) with ``TRACE_SAMPLE_RATE``;
+an ``X-TrailGuard-Trace: 1`` request header forces it. Unsampled requests only
+pay for a ``random()`` call and a few ContextVar lookups.
+
+Finished traces go to an in-memory ring buffer (``GET /traces``, served only
+with ``TRACES_ENDPOINT_ENABLED``) and, when
+``TRACE_FILE`` is set, are appended to that file as JSON lines.
+"""
+import functools
+import inspect
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0'))
+TRACE_FILE = os.getenv('TRACE_FILE') or None
+TRACE_BUFFER_SIZE = int(os.getenv('TRACE_BUFFER_SIZE', '200'))
+# Traces carry SQL text, so GET /traces is off unless asked for
+TRACES_ENDPOINT_ENABLED = os.getenv('TRACES_ENDPOINT_ENABLED', '0') not in ('0', 'false', 'False')
+FORCE_HEADER = b'x-trailguard-trace'
+# Keeps a request that runs thousands of statements from growing without bound
+_MAX_SPANS = 2000
+_MAX_STATEMENT = 500
+
+
+def _new_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+class Trace:
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.trace_id = uuid.uuid4().hex
+        self.root_id = _new_id()
+        self.name = name
+        self.attrs = attrs
+        self.wall_start = datetime.utcnow()
+        self.start = time.perf_counter()
+        self.spans: List[dict] = []
+        self.dropped = 0
+        self.marks: Dict[str, Any] = {}
+
+    def add(self, name: str, parent_id: Optional[str], start: float, end: float, span_id: Optional[str] = None, **attrs) -> str:
+        span_id = span_id or _new_id()
+        if len(self.spans) >= _MAX_SPANS:
+            self.dropped += 1
+            return span_id
+        # list.append is atomic, so threadpool endpoints can add spans directly
+        self.spans.append(
+            {
+                'spanId': span_id,
+                'parentId': parent_id,
+                'name': name,
+                'startMs': round((start - self.start) * 1000, 3),
+                'durationMs': round((end - start) * 1000, 3),
+                'attrs': attrs,
+            }
+        )
+        return span_id
+
+    def to_dict(self, end: float) -> dict:
+        return {
+            'traceId': self.trace_id,
+            'name': self.name,
+            'startTime': self.wall_start.isoformat() + 'Z',
+            'durationMs': round((end - self.start) * 1000, 3),
+            'attrs': self.attrs,
+            'spans': sorted(self.spans, key=lambda s: s['startMs']),
+            'droppedSpans': self.dropped,
+        }
+
+
+_trace: ContextVar[Optional[Trace]] = ContextVar('trailguard_trace', default=None)
+_span: ContextVar[Optional[str]] = ContextVar('trailguard_span', default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+
+class TraceBuffer:
+    """Most recent finished traces, newest last."""
+
+    def __init__(self, maxlen: int):
+        self._traces: deque = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def append(self, trace: dict) -> None:
+        with self._lock:
+            self._traces.append(trace)
+
+    def recent(self, limit: int, min_duration_ms: float = 0) -> List[dict]:
+        with self._lock:
+            traces = list(self._traces)
+        out = [t for t in reversed(traces) if t['durationMs'] >= min_duration_ms]
+        return out[:limit]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._traces.clear()
+
+
+class Tracer:
+    def __init__(self, sample_rate: float, buffer: TraceBuffer, path: Optional[str] = None):
+        self.sample_rate = sample_rate
+        self.buffer = buffer
+        self.path = path
+        self._file_lock = threading.Lock()
+
+    def sampled(self, forced: bool) -> bool:
+        return forced or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def finish(self, trace: Trace) -> None:
+        data = trace.to_dict(time.perf_counter())
+        self.buffer.append(data)
+        if self.path:
+            line = json.dumps(data, default=str) + '\n'
+            with self._file_lock, open(self.path, 'a') as f:
+                f.write(line)
+
+
+tracer = Tracer(TRACE_SAMPLE_RATE, TraceBuffer(TRACE_BUFFER_SIZE), TRACE_FILE)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Record a child of the current span; a no-op outside a sampled request."""
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+    span_id = _new_id()
+    parent = _span.get()
+    token = _span.set(span_id)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _span.reset(token)
+        trace.add(name, parent, start, time.perf_counter(), span_id=span_id, **attrs)
+
+
+class TracingMiddleware:
+    """ASGI middleware that opens the root span and makes the sampling decision."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        forced = any(k == FORCE_HEADER and v == b'1' for k, v in scope.get('headers', ()))
+        if not tracer.sampled(forced):
+            return await self.app(scope, receive, send)
+
+        trace = Trace('request', {'method': scope['method'], 'path': scope['path']})
+        trace_token = _trace.set(trace)
+        span_token = _span.set(trace.root_id)
+
+        async def traced_send(message):
+            if message['type'] == 'http.response.start':
+                trace.attrs['status'] = message['status']
+                message['headers'] = list(message.get('headers', [])) + [(b'x-trace-id', trace.trace_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, traced_send)
+        finally:
+            _span.reset(span_token)
+            _trace.reset(trace_token)
+            route = scope.get('route')
+            if route is not None:
+                trace.attrs['route'] = getattr(route, 'path', None)
+            trace.add('request', None, trace.start, time.perf_counter(), span_id=trace.root_id, **trace.attrs)
+            tracer.finish(trace)
+
+
+def _wrap_endpoint(endpoint: Callable) -> Callable:
+    def mark(trace: Trace, start: float, end: float, span_id: str) -> None:
+        trace.marks['endpoint'] = (start, end)
+        trace.add('route.endpoint', trace.marks.get('route'), start, end, span_id=span_id)
+
+    if inspect.iscoroutinefunction(endpoint):
+
+        @functools.wraps(endpoint)
+        async def traced(*args, **kwargs):
+            trace = _trace.get()
+            if trace is None:
+                return await endpoint(*args, **kwargs)
+            span_id = _new_id()
+            token = _span.set(span_id)
+            start = time.perf_counter()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                _span.reset(token)
+                mark(trace, start, time.perf_counter(), span_id)
+
+        return traced
+
+    @functools.wraps(endpoint)
+    def traced(*args, **kwargs):
+        trace = _trace.get()
+        if trace is None:
+            return endpoint(*args, **kwargs)
+        span_id = _new_id()
+        token = _span.set(span_id)
+        start = time.perf_counter()
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            _span.reset(token)
+            mark(trace, start, time.perf_counter(), span_id)
+
+    return traced
+
+
+class TracedRoute(APIRoute):
+    """APIRoute that splits sampled requests into prepare / endpoint / encode spans.
+
+    FastAPI gives no hook between validation and serialization, so the
+    endpoint is wrapped and the other two spans are derived from its bounds.
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, _wrap_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        route_path = self.path
+
+        async def traced_handler(request):
+            trace = _trace.get()
+            if trace is None:
+                return await handler(request)
+            route_id, prepare_id = _new_id(), _new_id()
+            trace.marks['route'] = route_id
+            token = _span.set(prepare_id)
+            start = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                end = time.perf_counter()
+                _span.reset(token)
+                endpoint = trace.marks.pop('endpoint', None)
+                if endpoint is None:
+                    # Validation or a dependency failed before the endpoint ran
+                    trace.add('route.prepare', route_id, start, end, span_id=prepare_id)
+                else:
+                    trace.add('route.prepare', route_id, start, endpoint[0], span_id=prepare_id)
+                    trace.add('route.encode', route_id, endpoint[1], end)
+                trace.add('route', trace.root_id, start, end, span_id=route_id, route=route_path)
+
+        return traced_handler
+
+
+def instrument_engine(engine) -> None:
+    """Record a span per SQL statement run on ``engine`` during a sampled request."""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _trace.get() is not None:
+            context._tg_trace_start = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        trace = _trace.get()
+        start = getattr(context, '_tg_trace_start', None)
+        if trace is None or start is None:
+            return
+        trace.add(
+            'sql',
+            _span.get(),
+            start,
+            time.perf_counter(),
+            statement=statement[:_MAX_STATEMENT],
+            executemany=executemany,
+            rowcount=cursor.rowcount,
+        )
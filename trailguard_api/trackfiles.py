@@ -0,0 +1,218 @@
+"""Streaming GPX/KML parsers for breadcrumb imports.
+
+Runs inside the import process pool, so it imports nothing but NumPy and the
+standard library. Files are read with ``iterparse`` and every element is
+detached from its parent once read (points, tracks, but also waypoints,
+metadata and styles), so memory stays at one chunk of points however large
+the file is. Only the children of a GPX point wait for the point itself,
+which reads its ``<time>``. Two exceptions: a KML ``<coordinates>``
+list, which ElementTree hands over as a single string per element, and the
+``<when>`` times of a ``gx:Track``, which precede its coordinates and are
+held (as floats) until the matching ``<gx:coord>`` arrives.
+
+Points come out as chunks of NumPy columns: Unix seconds (NaN when the file
+has no time for the point), latitude and longitude.
+
+    GPX: <trkpt>/<rtept lat lon><time/></...>
+    KML: <coordinates>lng,lat[,alt] ...</coordinates> and <gx:Track> <when>/<gx:coord> pairs
+"""
+import queue
+import xml.etree.ElementTree as ET
+from collections import deque
+from datetime import datetime, timezone
+from typing import BinaryIO, Deque, Dict, Iterator, List, NamedTuple, Optional
+
+import numpy as np
+
+FORMATS = ('gpx', 'kml')
+# Waypoints (<wpt>) are points of interest, not a path, and are skipped
+_GPX_POINTS = {'trkpt', 'rtept'}
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_PUT_TIMEOUT_SECONDS = 0.5
+
+
+class Chunk(NamedTuple):
+    bytes_read: int
+    t: np.ndarray
+    lat: np.ndarray
+    lng: np.ndarray
+
+
+class TrackFileError(ValueError):
+    """The file is not well-formed GPX/KML."""
+
+
+class _CountingReader:
+    """File wrapper that tracks how far ``iterparse`` has read, for progress."""
+
+    def __init__(self, f: BinaryIO):
+        self._f = f
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._f.read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def sniff(head: bytes) -> Optional[str]:
+    """Format from the first bytes of a file: 'gpx', 'kml' or None."""
+    text = head.lstrip().lower()
+    if b'<gpx' in text:
+        return 'gpx'
+    if b'<kml' in text:
+        return 'kml'
+    return None
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def _unix(text: Optional[str]) -> float:
+    if not text:
+        return np.nan
+    try:
+        dt = datetime.fromisoformat(text.strip())
+    except ValueError:
+        return np.nan
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - _EPOCH).total_seconds()
+
+
+class _Points:
+    """Accumulates points and cuts them into chunks."""
+
+    def __init__(self, reader: _CountingReader, chunk_points: int):
+        self.reader = reader
+        self.chunk_points = chunk_points
+        self.t: List[float] = []
+        self.lat: List[float] = []
+        self.lng: List[float] = []
+
+    def add(self, t: float, lat: float, lng: float) -> None:
+        self.t.append(t)
+        self.lat.append(lat)
+        self.lng.append(lng)
+
+    def extend(self, t: np.ndarray, lat: np.ndarray, lng: np.ndarray) -> None:
+        self.t.extend(t.tolist())
+        self.lat.extend(lat.tolist())
+        self.lng.extend(lng.tolist())
+
+    def ready(self) -> Iterator[Chunk]:
+        while len(self.lat) >= self.chunk_points:
+            yield self._cut(self.chunk_points)
+
+    def rest(self) -> Iterator[Chunk]:
+        if self.lat:
+            yield self._cut(len(self.lat))
+
+    def _cut(self, n: int) -> Chunk:
+        chunk = Chunk(
+            bytes_read=self.reader.bytes_read,
+            t=np.array(self.t[:n], dtype=np.float64),
+            lat=np.array(self.lat[:n], dtype=np.float64),
+            lng=np.array(self.lng[:n], dtype=np.float64),
+        )
+        del self.t[:n], self.lat[:n], self.lng[:n]
+        return chunk
+
+
+def _kml_coordinates(text: Optional[str]):
+    """``lng,lat[,alt]`` tuples separated by whitespace, as lat and lng arrays."""
+    tuples = (text or '').split()
+    if not tuples:
+        return np.empty(0), np.empty(0)
+    dims = tuples[0].count(',') + 1
+    try:
+        values = np.array(','.join(tuples).split(','), dtype=np.float64)
+        if len(values) == dims * len(tuples):
+            values = values.reshape(-1, dims)
+        else:
+            # Some tuples carry an altitude and some don't
+            values = np.array([t.split(',')[:2] for t in tuples], dtype=np.float64)
+    except ValueError:
+        raise TrackFileError('KML coordinates must be lng,lat[,alt] tuples')
+    return values[:, 1], values[:, 0]
+
+
+def iter_chunks(f: BinaryIO, fmt: str, chunk_points: int = 5000) -> Iterator[Chunk]:
+    if fmt not in FORMATS:
+        raise TrackFileError(f'Unsupported format {fmt!r}')
+    reader = _CountingReader(f)
+    points = _Points(reader, chunk_points)
+    parents: List[ET.Element] = []
+    # Namespaced tag -> local name; a file uses a handful of tags millions of times
+    local: Dict[str, str] = {}
+    # gx:Track lists its <when> elements before the matching <gx:coord>s
+    track_times: Deque[float] = deque()
+    try:
+        for event, elem in ET.iterparse(reader, events=('start', 'end')):
+            if event == 'start':
+                if elem.tag not in local:
+                    local[elem.tag] = _local(elem.tag)
+                parents.append(elem)
+                continue
+            parents.pop()
+            tag = local[elem.tag]
+            parent = parents[-1] if parents else None
+            if fmt == 'gpx' and tag in _GPX_POINTS:
+                try:
+                    lat, lng = float(elem.get('lat')), float(elem.get('lon'))
+                except (TypeError, ValueError):
+                    raise TrackFileError(f'<{tag}> needs numeric lat and lon attributes')
+                points.add(_unix(elem.findtext(elem.tag[: -len(tag)] + 'time')), lat, lng)
+            elif fmt == 'kml' and tag == 'coordinates':
+                lat, lng = _kml_coordinates(elem.text)
+                points.extend(np.full(len(lat), np.nan), lat, lng)
+            elif fmt == 'kml' and tag == 'when':
+                track_times.append(_unix(elem.text))
+            elif fmt == 'kml' and tag == 'coord':
+                parts = (elem.text or '').split()
+                try:
+                    lng, lat = float(parts[0]), float(parts[1])
+                except (IndexError, ValueError):
+                    raise TrackFileError('gx:coord must be "lng lat [alt]"')
+                points.add(track_times.popleft() if track_times else np.nan, lat, lng)
+            elif tag == 'Track':
+                track_times.clear()
+            if parent is not None and not (fmt == 'gpx' and local[parent.tag] in _GPX_POINTS):
+                # Detach what has been read so the tree never grows with the file
+                parent.remove(elem)
+            if len(points.lat) >= chunk_points:
+                yield from points.ready()
+    except ET.ParseError as e:
+        raise TrackFileError(f'Malformed {fmt.upper()}: {e}')
+    yield from points.rest()
+
+
+def _put(out, item, stop) -> bool:
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=_PUT_TIMEOUT_SECONDS)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def parse_into(path: str, fmt: str, out, stop, chunk_points: int = 5000) -> int:
+    """Process pool entry point: parse ``path`` and put its chunks on ``out``.
+
+    ``out`` is a bounded queue, so a slow consumer holds the parser back
+    rather than letting chunks pile up. ``None`` marks the end, including
+    after an error (which the pool future then raises). Returns the number
+    of points parsed; stops early once ``stop`` is set.
+    """
+    parsed = 0
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter_chunks(f, fmt, chunk_points):
+                if not _put(out, chunk, stop):
+                    break
+                parsed += len(chunk.lat)
+    finally:
+        _put(out, None, stop)
+    return parsed